@@ -0,0 +1,210 @@
+from collections import namedtuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# The original check was round(percent) > 1, i.e. a move of at least 1.5%
+DEFAULT_CHANGE_PCT = 1.5
+
+# Closes AlertIndex keeps per symbol; a rule must look back fewer bars than this
+INDEX_CAPACITY = 64
+
+Alert = namedtuple('Alert', ['symbol', 'rule', 'value'])
+
+
+class ChangeRule:
+    # Close-to-close move over `days` bars, in percent
+    def __init__(self, days=1, threshold=DEFAULT_CHANGE_PCT, direction='both'):
+        self.days = days
+        self.threshold = threshold
+        self.direction = direction
+        self.name = f"change:{days}:{threshold}"
+        self.lookback = days
+
+    def evaluate(self, index):
+        current = index.close_at(0)
+        past = index.close_at(self.days)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change = (current / past - 1) * 100
+        return _fires(change, self.threshold, self.direction), change
+
+    def history(self, bars):
+        # The same test on every bar of a history at once, e.g. for backtests
+        change = np.full(len(bars), np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change[self.days:] = (bars.close[self.days:] / bars.close[:-self.days] - 1) * 100
+        return _fires(change, self.threshold, self.direction), change
+
+    def describe(self, value):
+        arrow = "⬆️" if value > 0 else "⬇️"
+        suffix = "" if self.days == 1 else f" over {self.days} days"
+        return f"{arrow}{round(value)}%{suffix}"
+
+
+class GapRule:
+    # Latest open against the previous close, in percent
+    def __init__(self, threshold=DEFAULT_CHANGE_PCT, direction='both'):
+        self.threshold = threshold
+        self.direction = direction
+        self.name = f"gap:{threshold}"
+        self.lookback = 1
+
+    def evaluate(self, index):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gap = (index.latest_open() / index.close_at(1) - 1) * 100
+        return _fires(gap, self.threshold, self.direction), gap
+
+    def history(self, bars):
+        gap = np.full(len(bars), np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gap[1:] = (bars.open[1:] / bars.close[:-1] - 1) * 100
+        return _fires(gap, self.threshold, self.direction), gap
+
+    def describe(self, value):
+        return f"gap {'⬆️' if value > 0 else '⬇️'}{round(value)}%"
+
+
+class ZScoreRule:
+    # Latest daily return measured in standard deviations of the previous `window` returns
+    def __init__(self, window=20, threshold=2.0, direction='both'):
+        self.window = window
+        self.threshold = threshold
+        self.direction = direction
+        self.name = f"zscore:{window}:{threshold}"
+        self.lookback = window + 1
+
+    def evaluate(self, index):
+        latest = index.return_at(0)
+        history = np.stack([index.return_at(k) for k in range(1, self.window + 1)], axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = (latest - history.mean(axis=1)) / history.std(axis=1, ddof=1)
+        return _fires(z, self.threshold, self.direction), z
+
+    def history(self, bars):
+        returns = np.full(len(bars), np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns[1:] = bars.close[1:] / bars.close[:-1] - 1
+        z = np.full(len(bars), np.nan)
+        if len(bars) > self.window:
+            history = sliding_window_view(returns[:-1], self.window)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                z[self.window:] = (returns[self.window:] - history.mean(axis=1)) / history.std(axis=1, ddof=1)
+        return _fires(z, self.threshold, self.direction), z
+
+    def describe(self, value):
+        return f"{'⬆️' if value > 0 else '⬇️'}{abs(value):.1f}σ move"
+
+
+RULES = {'change': ChangeRule, 'gap': GapRule, 'zscore': ZScoreRule}
+
+
+def parse_rules(spec):
+    # "change:1:1.5,gap:2,zscore:20:2.5" -> rule objects
+    rules = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        kind, *args = item.split(':')
+        if kind not in RULES:
+            raise ValueError(f"Unknown alert rule: {kind}")
+        numbers = [int(arg) if arg.isdigit() else float(arg) for arg in args]
+        rules.append(RULES[kind](*numbers))
+    return rules
+
+
+def _fires(values, threshold, direction):
+    valid = ~np.isnan(values)
+    if direction == 'up':
+        hit = values >= threshold
+    elif direction == 'down':
+        hit = values <= -threshold
+    else:
+        hit = np.abs(values) >= threshold
+    return valid & hit
+
+
+def check_lookback(rules, capacity=INDEX_CAPACITY):
+    for rule in rules:
+        if rule.lookback >= capacity:
+            raise ValueError(f"Rule {rule.name} needs more than {capacity} bars of history")
+
+
+class AlertIndex:
+    # Ring buffer of the most recent closes (and their returns) for every symbol,
+    # one row per symbol, so each tick only writes one column per symbol and
+    # rule evaluation is a handful of array operations over all rows
+    def __init__(self, capacity=INDEX_CAPACITY):
+        self.capacity = capacity
+        self.rows = {}
+        self.symbols = []
+        self.closes = np.full((0, capacity), np.nan)
+        self.returns = np.full((0, capacity), np.nan)
+        self.dates = np.full(0, np.datetime64('NaT'), dtype='datetime64[D]')
+        self.opens = np.full(0, np.nan)
+        self.head = np.zeros(0, dtype=np.int64)
+        self.count = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def _row(self, symbol):
+        row = self.rows.get(symbol)
+        if row is not None:
+            return row
+        row = len(self.symbols)
+        if row == len(self.head):
+            self._grow(max(16, row * 2))
+        self.rows[symbol] = row
+        self.symbols.append(symbol)
+        return row
+
+    def _grow(self, size):
+        extra = size - len(self.head)
+        self.closes = np.vstack([self.closes, np.full((extra, self.capacity), np.nan)])
+        self.returns = np.vstack([self.returns, np.full((extra, self.capacity), np.nan)])
+        self.dates = np.concatenate([self.dates, np.full(extra, np.datetime64('NaT'), dtype='datetime64[D]')])
+        self.opens = np.concatenate([self.opens, np.full(extra, np.nan)])
+        self.head = np.concatenate([self.head, np.zeros(extra, dtype=np.int64)])
+        self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+
+    def update(self, symbol, date, open, close):
+        # A bar for the latest stored date replaces it (intraday refresh); an older one is ignored
+        row = self._row(symbol)
+        date = np.datetime64(date, 'D')
+        if self.count[row] and date < self.dates[row]:
+            return
+        if not self.count[row] or date > self.dates[row]:
+            self.head[row] = (self.head[row] + 1) % self.capacity
+            self.count[row] += 1
+        head = self.head[row]
+        previous = self.closes[row, (head - 1) % self.capacity] if self.count[row] > 1 else np.nan
+        self.closes[row, head] = close
+        self.returns[row, head] = close / previous - 1
+        self.dates[row] = date
+        self.opens[row] = open
+
+    def load(self, symbol, bars):
+        # bars: Bars from OHLCVStore, oldest first
+        for bar in bars[-self.capacity:]:
+            self.update(symbol, bar.date, bar.open, bar.close)
+
+    def close_at(self, lag):
+        # Close `lag` bars back for every symbol, nan where the history is too short
+        n = len(self.symbols)
+        values = self.closes[np.arange(n), (self.head[:n] - lag) % self.capacity]
+        return np.where(self.count[:n] > lag, values, np.nan)
+
+    def return_at(self, lag):
+        n = len(self.symbols)
+        values = self.returns[np.arange(n), (self.head[:n] - lag) % self.capacity]
+        return np.where(self.count[:n] > lag + 1, values, np.nan)
+
+    def latest_open(self):
+        return self.opens[:len(self.symbols)]
+
+    def evaluate(self, rules):
+        alerts = []
+        check_lookback(rules, self.capacity)
+        for rule in rules:
+            fired, values = rule.evaluate(self)
+            for row in np.flatnonzero(fired):
+                alerts.append(Alert(self.symbols[row], rule, float(values[row])))
+        return alerts
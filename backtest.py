@@ -0,0 +1,302 @@
+import argparse
+import csv
+import math
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import metrics
+from alert_rules import DEFAULT_CHANGE_PCT, parse_rules
+from indicators import rolling_mean
+from metrics import timer
+
+# Backtests over whole histories with array operations. Each strategy turns a
+# symbol's bars into a (configs x days) matrix of positions (+1 long, -1 short,
+# 0 flat), decided at one close and held to the next, so a whole parameter grid
+# is scored at once: daily PnL, the equity curve, drawdown and hit rate are
+# products, running maxima and sums along the day axis. Symbols are the unit of
+# work for the process pool.
+
+TRADING_DAYS = 252
+# Charged on every unit of position change, in basis points of the close
+COST_BPS = float(os.getenv('BACKTEST_COST_BPS', '1'))
+# Configs scored per block, which bounds the size of the (configs x days) arrays
+CHUNK = 256
+SCORES = ('return', 'drawdown', 'hit_rate', 'sharpe', 'trades', 'exposure')
+
+
+class ProbabilityStrategy:
+    # Long while the model's next-day probability is above the threshold; with
+    # `short`, short while it is below 1 - threshold
+    needs_probabilities = True
+
+    def __init__(self, thresholds, short=False):
+        self.thresholds = np.asarray(thresholds, dtype=float)
+        self.short = short
+
+    def labels(self):
+        return [f"prob:{threshold:g}" for threshold in self.thresholds]
+
+    def positions(self, bars, probabilities):
+        p = np.nan_to_num(probabilities, nan=0.5)[None, :]
+        thresholds = self.thresholds[:, None]
+        positions = (p > thresholds).astype(np.int8)
+        if self.short:
+            positions -= p < 1 - thresholds
+        return positions
+
+
+class CrossoverStrategy:
+    # Long while the fast moving average is above the slow one, for every fast < slow pair
+    needs_probabilities = False
+
+    def __init__(self, fast, slow, short=False):
+        self.pairs = [(f, s) for f in fast for s in slow if f < s]
+        self.short = short
+
+    def labels(self):
+        return [f"ma:{fast}/{slow}" for fast, slow in self.pairs]
+
+    def positions(self, bars, probabilities):
+        windows = sorted({w for pair in self.pairs for w in pair})
+        # Each window's average is computed once and shared by every pair that uses it
+        averages = np.stack([rolling_mean(bars.close[None, :], window)[0] for window in windows])
+        row = {window: i for i, window in enumerate(windows)}
+        fast = averages[[row[f] for f, _ in self.pairs]]
+        slow = averages[[row[s] for _, s in self.pairs]]
+        positions = (fast > slow).astype(np.int8)
+        if self.short:
+            positions -= fast < slow
+        return positions
+
+
+class RuleStrategy:
+    # Follows an alert rule: when it fires, take the side of the move for `hold` days
+    needs_probabilities = False
+
+    def __init__(self, rules, holds, short=False):
+        self.rules = list(rules)
+        self.holds = list(holds)
+        self.short = short
+
+    def labels(self):
+        return [f"{rule.name}:hold{hold}" for rule in self.rules for hold in self.holds]
+
+    def positions(self, bars, probabilities):
+        days = np.arange(len(bars))
+        holds = np.asarray(self.holds)[:, None]
+        blocks = []
+        for rule in self.rules:
+            fired, values = rule.history(bars)
+            side = np.where(fired, np.sign(values), 0).astype(np.int8)
+            if not self.short:
+                side = np.maximum(side, 0)
+            # Index of the latest firing on or before each day, -1 before the first
+            last = np.maximum.accumulate(np.where(fired, days, -1))
+            active = (last >= 0) & (days - last < holds)
+            blocks.append(np.where(active, side[np.maximum(last, 0)], 0).astype(np.int8))
+        return np.concatenate(blocks) if blocks else np.zeros((0, len(bars)), dtype=np.int8)
+
+
+def online_probabilities(bars):
+    # The streaming model's next-day probability after each close; every value
+    # is made before the model learns from the following bar, so there is no lookahead
+    from online_model import OnlinePredictor
+
+    predictor = OnlinePredictor()
+    probabilities = np.full(len(bars), np.nan)
+    for i, bar in enumerate(bars):
+        predictor.update(bar.date, bar.close, bar.volume)
+        probabilities[i] = predictor.probability()
+    return probabilities
+
+
+def daily_pnl(closes, positions, cost_bps=COST_BPS):
+    # positions: (configs x days). The position on day t earns close[t+1] / close[t] - 1
+    # and pays the cost of moving to it; the last day's position has no outcome yet.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.nan_to_num(closes[1:] / closes[:-1] - 1)
+    held = positions[:, :-1]
+    turnover = np.abs(np.diff(positions, axis=1, prepend=0)[:, :-1])
+    return held * returns - turnover * (cost_bps / 1e4)
+
+
+def equity_curve(closes, positions, cost_bps=COST_BPS):
+    return np.cumprod(1 + daily_pnl(closes, np.atleast_2d(positions), cost_bps), axis=1)
+
+
+def score(closes, positions, cost_bps=COST_BPS):
+    # One row of SCORES per config. The hit rate counts days in the market that made money.
+    pnl = daily_pnl(closes, positions, cost_bps)
+    equity = np.cumprod(1 + pnl, axis=1)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), 1.0)
+    held = positions[:, :-1] != 0
+    days = held.sum(axis=1)
+    entries = (positions != 0) & (positions != np.concatenate(
+        [np.zeros((len(positions), 1), dtype=positions.dtype), positions[:, :-1]], axis=1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hit_rate = ((pnl > 0) & held).sum(axis=1) / days
+        sharpe = pnl.mean(axis=1) / pnl.std(axis=1) * math.sqrt(TRADING_DAYS)
+    return np.column_stack([
+        equity[:, -1] - 1 if pnl.shape[1] else np.zeros(len(positions)),
+        (1 - equity / peak).max(axis=1, initial=0.0),
+        hit_rate,
+        sharpe,
+        entries.sum(axis=1),
+        days / max(1, pnl.shape[1]),
+    ])
+
+
+def load_bars(symbol, start=None, end=None):
+    if symbol == 'stock_data':
+        from csv_bars import load_bars as load_csv_bars
+        return load_csv_bars('stock_data.csv')
+    from ohlcv_store import OHLCVStore
+    return OHLCVStore().read(symbol, start, end)
+
+
+def backtest_bars(bars, strategies, cost_bps=COST_BPS, probabilities=None):
+    # Every config of every strategy on one history; returns (configs x SCORES)
+    if probabilities is None and any(strategy.needs_probabilities for strategy in strategies):
+        probabilities = online_probabilities(bars)
+    results = []
+    for strategy in strategies:
+        positions = strategy.positions(bars, probabilities)
+        for i in range(0, len(positions), CHUNK):
+            results.append(score(bars.close, positions[i:i + CHUNK], cost_bps))
+    return np.concatenate(results) if results else np.zeros((0, len(SCORES)))
+
+
+def backtest_symbol(symbol, strategies, cost_bps=COST_BPS, start=None, end=None):
+    # Module level so it can run in a worker process
+    bars = load_bars(symbol, start, end)
+    if len(bars) < 2:
+        raise ValueError(f"Not enough stored bars for {symbol} ({len(bars)})")
+    return backtest_bars(bars, strategies, cost_bps)
+
+
+def run_backtests(symbols, strategies, cost_bps=COST_BPS, start=None, end=None, max_workers=None):
+    # symbol -> (configs x SCORES), plus symbol -> error for the ones that failed
+    results, errors = {}, {}
+    with timer('backtest'):
+        if max_workers == 1:
+            for symbol in symbols:
+                try:
+                    results[symbol] = backtest_symbol(symbol, strategies, cost_bps, start, end)
+                except Exception as e:
+                    errors[symbol] = e
+            return results, errors
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {symbol: pool.submit(backtest_symbol, symbol, strategies, cost_bps, start, end)
+                       for symbol in symbols}
+            for symbol, future in futures.items():
+                try:
+                    results[symbol] = future.result()
+                except Exception as e:
+                    errors[symbol] = e
+    return results, errors
+
+
+def summarize(labels, results):
+    # Mean of each score across symbols, per config
+    stacked = np.stack(list(results.values()))
+    with warnings.catch_warnings():
+        # A config that never traded has no hit rate or Sharpe ratio on any symbol
+        warnings.simplefilter('ignore', RuntimeWarning)
+        means = np.nanmean(stacked, axis=0)
+    return [dict(config=label, **dict(zip(SCORES, row))) for label, row in zip(labels, means)]
+
+
+def write_results(path, labels, results):
+    with open(path, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Symbol', 'Config', *SCORES])
+        for symbol, scores in sorted(results.items()):
+            for label, row in zip(labels, scores):
+                writer.writerow([symbol, label, *(f"{value:.6g}" for value in row)])
+
+
+def grid(text, kind=float):
+    # "0.5,0.6" or "0.5:0.7:0.05" (inclusive) or a mix of both -> list of values
+    values = []
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        if ':' in item:
+            start, stop, step = (kind(part) for part in item.split(':'))
+            count = int(math.floor((stop - start) / step + 1e-9)) + 1
+            values.extend(kind(start + i * step) if kind is int else round(start + i * step, 10)
+                          for i in range(count))
+        else:
+            values.append(kind(item))
+    return sorted(set(values))
+
+
+def build_strategies(args):
+    strategies = []
+    if args.thresholds:
+        strategies.append(ProbabilityStrategy(grid(args.thresholds), args.short))
+    if args.ma_fast and args.ma_slow:
+        strategies.append(CrossoverStrategy(grid(args.ma_fast, int), grid(args.ma_slow, int), args.short))
+    if args.rules:
+        strategies.append(RuleStrategy(parse_rules(args.rules), grid(args.hold, int), args.short))
+    return strategies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest model and rule signals over stored histories")
+    parser.add_argument("symbols", nargs="*", help="stored symbols; stock_data.csv is used when omitted")
+    parser.add_argument("--watchlist", help="CSV of Symbol,Company Name to backtest instead of listing symbols")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--thresholds", default="0.5:0.7:0.02",
+                        help="probability thresholds for the online model, e.g. 0.5,0.55 or 0.5:0.7:0.02")
+    parser.add_argument("--ma-fast", default="5,10,20,50", help="fast moving-average windows")
+    parser.add_argument("--ma-slow", default="50,100,200", help="slow moving-average windows")
+    parser.add_argument("--rules", default=f"change:1:{DEFAULT_CHANGE_PCT}", help="alert rules to trade on")
+    parser.add_argument("--hold", default="1,5", help="days to hold after a rule fires")
+    parser.add_argument("--short", action="store_true", help="take short positions on bearish signals")
+    parser.add_argument("--cost", type=float, default=COST_BPS, help="cost per unit of turnover in basis points")
+    parser.add_argument("--workers", type=int, help="worker processes (1 runs in this process)")
+    parser.add_argument("--top", type=int, default=20, help="configs to print, best Sharpe ratio first")
+    parser.add_argument("--out", metavar="CSV", help="write every symbol and config's scores to CSV")
+    parser.add_argument("--metrics-json", default=metrics.METRICS_JSON, metavar="PATH",
+                        help="write stage timings and counters to PATH after the run")
+    parser.add_argument("--profile", default=metrics.PROFILE_PATH, metavar="PATH",
+                        help="write a cProfile dump of the run to PATH")
+    args = parser.parse_args()
+
+    if args.watchlist:
+        from watchlist import load_watchlist
+        symbols = list(load_watchlist(args.watchlist))
+    else:
+        symbols = [symbol.upper() for symbol in args.symbols] or ['stock_data']
+    strategies = build_strategies(args)
+    labels = [label for strategy in strategies for label in strategy.labels()]
+    if not labels:
+        parser.error("no configs to test")
+
+    start = time.perf_counter()
+    try:
+        with metrics.profiled(args.profile):
+            results, errors = run_backtests(symbols, strategies, args.cost, args.start, args.end, args.workers)
+    finally:
+        metrics.finish(args.metrics_json)
+    elapsed = time.perf_counter() - start
+    for symbol, e in sorted(errors.items()):
+        print(f"{symbol}: An error occurred: {e}")
+    if not results:
+        return
+    print(f"{len(labels)} configs x {len(results)} symbols in {elapsed:.2f}s")
+    if args.out:
+        write_results(args.out, labels, results)
+    rows = sorted(summarize(labels, results), key=lambda row: (math.isnan(row['sharpe']), -row['sharpe']))
+    print(f"{'config':<28}{'return':>9}{'drawdown':>10}{'hit rate':>10}{'sharpe':>8}{'trades':>8}{'exposure':>10}")
+    for row in rows[:args.top]:
+        print(f"{row['config']:<28}{row['return']:>8.1%} {row['drawdown']:>9.1%} {row['hit_rate']:>9.1%} "
+              f"{row['sharpe']:>7.2f} {row['trades']:>7.0f} {row['exposure']:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import numpy as np
+
+# Compact daily bars. Alpha Vantage sends a dict of date string -> dict of
+# string prices; kept as parsed JSON that is about 1 KB of str/dict/float
+# objects per bar. Bars holds the same history as parallel typed arrays, 44
+# bytes per bar: int32 day numbers (days since 1970-01-01, what datetime64[D]
+# counts), float64 open/high/low/close and int64 volume, oldest first.
+
+# Record layout of the on-disk bar store
+BAR_DTYPE = np.dtype([
+    ('date', 'datetime64[D]'),
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('volume', 'i8'),
+])
+
+SERIES_KEY = "Time Series (Daily)"
+SERIES_FIELDS = ("1. open", "2. high", "3. low", "4. close", "5. volume")
+PRICE_COLUMNS = ('open', 'high', 'low', 'close')
+
+
+class Bar:
+    # A view of one row; nothing is copied out of the columns until a field is read
+    __slots__ = ('bars', 'i')
+
+    def __init__(self, bars, i):
+        self.bars = bars
+        self.i = i
+
+    @property
+    def date(self):
+        return np.datetime64(int(self.bars.days[self.i]), 'D')
+
+    @property
+    def open(self):
+        return float(self.bars.open[self.i])
+
+    @property
+    def high(self):
+        return float(self.bars.high[self.i])
+
+    @property
+    def low(self):
+        return float(self.bars.low[self.i])
+
+    @property
+    def close(self):
+        return float(self.bars.close[self.i])
+
+    @property
+    def volume(self):
+        return int(self.bars.volume[self.i])
+
+    def __repr__(self):
+        return (f"Bar({self.date}, open={self.open}, high={self.high}, low={self.low}, "
+                f"close={self.close}, volume={self.volume})")
+
+
+class Bars:
+    __slots__ = ('days', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, days=(), open=(), high=(), low=(), close=(), volume=()):
+        self.days = np.asarray(days, dtype=np.int32)
+        self.open = np.asarray(open, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+        self.volume = np.asarray(volume, dtype=np.int64)
+
+    @classmethod
+    def from_series(cls, series, after=None):
+        # series: Alpha Vantage "Time Series (Daily)" dict, any order; with
+        # `after` (an ISO date) only later bars are converted
+        after = str(after) if after is not None else ""
+        dates = [date for date in series if date > after]
+        if not dates:
+            return cls()
+        # Straight from the strings into one float block, no per-bar lists
+        values = np.fromiter((float(series[date][field]) for date in dates for field in SERIES_FIELDS),
+                             np.float64, len(dates) * len(SERIES_FIELDS)).reshape(len(dates), len(SERIES_FIELDS))
+        days = np.array(dates, dtype='datetime64[D]').astype(np.int32)
+        order = np.argsort(days, kind='stable')
+        # Each column gets its own contiguous array so the block can be freed
+        return cls(days[order], *(values[order, j] for j in range(len(SERIES_FIELDS))))
+
+    @classmethod
+    def from_records(cls, records):
+        # records: structured array in BAR_DTYPE, e.g. straight from the bar store
+        return cls(records['date'].astype(np.int64), records['open'], records['high'], records['low'],
+                   records['close'], records['volume'])
+
+    def to_records(self):
+        records = np.empty(len(self), dtype=BAR_DTYPE)
+        records['date'] = self.dates
+        for column in PRICE_COLUMNS + ('volume',):
+            records[column] = getattr(self, column)
+        return records
+
+    @property
+    def dates(self):
+        return self.days.astype('datetime64[D]')
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, column).nbytes for column in self.__slots__)
+
+    def __len__(self):
+        return len(self.days)
+
+    def __iter__(self):
+        for i in range(len(self.days)):
+            yield Bar(self, i)
+
+    def __getitem__(self, key):
+        # bars[i] is a row view, bars[a:b] or bars[mask] more Bars, bars['close'] a column
+        if isinstance(key, str):
+            return self.dates if key == 'date' else getattr(self, key)
+        if isinstance(key, (int, np.integer)):
+            if not -len(self) <= key < len(self):
+                raise IndexError("bar index out of range")
+            return Bar(self, key % len(self))
+        return Bars(*(getattr(self, column)[key] for column in self.__slots__))
+
+    def __repr__(self):
+        if not len(self):
+            return "Bars([])"
+        return f"Bars({len(self)} bars, {self.dates[0]} to {self.dates[-1]})"
+
+    def latest_change(self):
+        # (close - previous close, percent change) for the two most recent bars
+        if len(self) < 2:
+            raise ValueError("Not enough data to compare stock prices.")
+        previous, latest = float(self.close[-2]), float(self.close[-1])
+        difference = latest - previous
+        return difference, difference / previous * 100
+
+    def frame(self):
+        import pandas as pd
+
+        return pd.DataFrame({
+            'Date': self.dates.astype('datetime64[ns]'),
+            'Open': self.open,
+            'High': self.high,
+            'Low': self.low,
+            'Close': self.close,
+            'Volume': self.volume,
+        })
+
+
+def daily_bars(data):
+    # Decoder for a TIME_SERIES_DAILY response; refusals become errors instead of empty history
+    from fetch_cache import ERROR_KEYS
+
+    for key in ERROR_KEYS:
+        if key in data:
+            raise ValueError(f"Alpha Vantage: {data[key]}")
+    return Bars.from_series(data.get(SERIES_KEY, {}))
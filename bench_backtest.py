@@ -0,0 +1,87 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+# Store location is read at import time, so point it at scratch space first
+os.environ['OHLCV_STORE_DIR'] = tempfile.mkdtemp()
+
+from alert_rules import parse_rules
+from backtest import (COST_BPS, CrossoverStrategy, ProbabilityStrategy, RuleStrategy, backtest_bars, grid,
+                      run_backtests)
+from bars import Bars
+from ohlcv_store import OHLCVStore
+
+# Parameter sweep over a synthetic universe of random-walk histories in a
+# scratch bar store: every config of the grid for every symbol, in worker
+# processes. For reference, a few crossover configs are also scored with a plain
+# Python loop over days, the way a per-config backtest would be written.
+
+parser = argparse.ArgumentParser(description="Benchmark a backtest parameter sweep")
+parser.add_argument("--symbols", type=int, default=50)
+parser.add_argument("--days", type=int, default=2500, help="bars per symbol (2500 is about 10 years)")
+parser.add_argument("--thresholds", default="0.5:0.7:0.01")
+parser.add_argument("--ma-fast", default="2:50:2")
+parser.add_argument("--ma-slow", default="20:250:10")
+parser.add_argument("--rules", default="change:1:1,change:1:2,change:5:5,gap:1,zscore:20:2")
+parser.add_argument("--hold", default="1:10:1")
+parser.add_argument("--workers", type=int)
+
+
+def loop_score(closes, positions, cost_bps=COST_BPS):
+    closes, positions = closes.tolist(), positions.tolist()
+    equity, peak, drawdown, previous = 1.0, 1.0, 0.0, 0
+    for t in range(len(closes) - 1):
+        equity *= 1 + positions[t] * (closes[t + 1] / closes[t] - 1) - abs(positions[t] - previous) * cost_bps / 1e4
+        peak = max(peak, equity)
+        drawdown = max(drawdown, 1 - equity / peak)
+        previous = positions[t]
+    return equity - 1, drawdown
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    rng = np.random.default_rng(7)
+    store = OHLCVStore()
+    symbols = [f"S{i}" for i in range(args.symbols)]
+    days = np.arange(args.days) + np.datetime64('2010-01-04', 'D').astype(np.int64)
+    for symbol in symbols:
+        closes = 100 * np.exp(np.cumsum(rng.normal(0.0002, 0.015, args.days)))
+        opens = closes * (1 + rng.normal(0, 0.005, args.days))
+        store.append(symbol, Bars(days, opens, np.maximum(opens, closes), np.minimum(opens, closes), closes,
+                                  rng.integers(10 ** 5, 10 ** 6, args.days)))
+
+    strategies = [
+        ProbabilityStrategy(grid(args.thresholds)),
+        CrossoverStrategy(grid(args.ma_fast, int), grid(args.ma_slow, int)),
+        RuleStrategy(parse_rules(args.rules), grid(args.hold, int)),
+    ]
+    configs = sum(len(strategy.labels()) for strategy in strategies)
+    print(f"{configs} configs x {args.symbols} symbols x {args.days} bars")
+
+    start = time.perf_counter()
+    results, errors = run_backtests(symbols, strategies, max_workers=args.workers)
+    elapsed = time.perf_counter() - start
+    assert not errors, errors
+    runs = configs * len(results)
+    print(f"sweep: {elapsed:.2f}s, {runs / elapsed:,.0f} symbol-configs/s, {elapsed / runs * 1e6:.1f} µs each")
+
+    # The online model replays each history once per symbol whatever the grid size
+    start = time.perf_counter()
+    run_backtests(symbols, strategies[1:], max_workers=args.workers)
+    rule_time = time.perf_counter() - start
+    rule_runs = runs - len(strategies[0].labels()) * len(results)
+    print(f"without the model replay: {rule_time:.2f}s, {rule_time / rule_runs * 1e6:.1f} µs per symbol-config")
+
+    bars = store.read(symbols[0])
+    crossover = CrossoverStrategy([10, 20], [50, 100, 200])
+    positions = crossover.positions(bars, None)
+    start = time.perf_counter()
+    expected = [loop_score(bars.close, row) for row in positions]
+    loop_time = (time.perf_counter() - start) / len(positions)
+    scores = backtest_bars(bars, [crossover])[:, :2]
+    assert np.allclose(expected, scores), (expected, scores)
+    print(f"python loop: {loop_time * 1e6:,.0f} µs per symbol-config, "
+          f"{loop_time * runs:,.0f}s for the same sweep ({loop_time * runs / elapsed:.0f}x slower)")
@@ -0,0 +1,44 @@
+import argparse
+import json
+import time
+import tracemalloc
+
+from bars import daily_bars
+from stub_server import daily_series
+
+# Memory held by daily histories kept as the parsed Alpha Vantage JSON versus
+# as Bars, for a watchlist of full ("outputsize=full", ~20 years) responses.
+# tracemalloc sees numpy's buffers as well as Python objects.
+
+parser = argparse.ArgumentParser(description="Benchmark memory of parsed JSON histories against Bars")
+parser.add_argument("--symbols", type=int, default=200)
+parser.add_argument("--days", type=int, default=5000, help="bars per symbol (5000 is about 20 years)")
+args = parser.parse_args()
+
+payloads = [
+    json.dumps({"Meta Data": {"2. Symbol": f"SYM{i}"}, "Time Series (Daily)": daily_series(f"SYM{i}", args.days)})
+    for i in range(args.symbols)
+]
+bars_total = args.symbols * args.days
+
+
+def measure(label, load):
+    # Timed untraced first; tracemalloc slows every allocation down
+    start = time.perf_counter()
+    kept = [load(payload) for payload in payloads]
+    elapsed = time.perf_counter() - start
+    del kept
+    tracemalloc.start()
+    kept = [load(payload) for payload in payloads]
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<22} {held / 1e6:>9.1f} MB held {held / bars_total:>7.0f} B/bar "
+          f"{peak / 1e6:>9.1f} MB peak {elapsed / bars_total * 1e6:>6.2f} µs/bar")
+    return kept, held
+
+
+print(f"{args.symbols} symbols x {args.days} bars")
+kept, json_held = measure("parsed JSON", json.loads)
+del kept
+kept, bars_held = measure("Bars", lambda payload: daily_bars(json.loads(payload)))
+print(f"Bars hold {json_held / bars_held:.0f}x less ({sum(b.nbytes for b in kept) / bars_total:.0f} B/bar of column data)")
@@ -0,0 +1,51 @@
+import argparse
+import os
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from charts import render_symbols
+from ohlcv_store import OHLCVStore
+from stub_server import daily_series
+
+# Render N fake symbols with the batch renderer and compare with one new pyplot
+# figure per symbol, the way the interactive plot used to be drawn
+
+parser = argparse.ArgumentParser(description="Benchmark the batch chart renderer")
+parser.add_argument("--symbols", type=int, default=100)
+parser.add_argument("--days", type=int, default=250)
+parser.add_argument("--workers", type=int, help="rendering processes (default: one per CPU)")
+parser.add_argument("--format", default='png')
+parser.add_argument("--baseline", type=int, default=10, help="symbols drawn the old way")
+args = parser.parse_args()
+
+root = tempfile.mkdtemp()
+out = tempfile.mkdtemp()
+store = OHLCVStore(root)
+symbols = [f"SYM{i}" for i in range(args.symbols)]
+for symbol in symbols:
+    store.append_series(symbol, daily_series(symbol, args.days))
+
+start = time.perf_counter()
+paths, errors = render_symbols(symbols, out, args.format, max_workers=args.workers, store_root=root)
+elapsed = time.perf_counter() - start
+
+start = time.perf_counter()
+for symbol in symbols[:args.baseline]:
+    bars = store.read(symbol)
+    plt.figure(figsize=(12, 6))
+    plt.plot(bars.dates, bars.close, marker='o', linestyle='-', color='b')
+    plt.title(f'{symbol} Stock Prices')
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    plt.grid(True)
+    plt.savefig(os.path.join(out, f"baseline.{args.format}"))
+    plt.close()
+baseline = (time.perf_counter() - start) / max(1, min(args.baseline, len(symbols)))
+
+print(f"Rendered {len(paths)} charts ({len(errors)} errors) in {elapsed:.2f}s "
+      f"with {args.workers or os.cpu_count()} workers")
+print(f"Per chart: {elapsed / max(1, len(paths)) * 1000:.0f} ms, new figure per chart: {baseline * 1000:.0f} ms")
@@ -0,0 +1,59 @@
+import argparse
+import csv
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from csv_bars import load_bars, load_csv
+
+# Rows per second for the bulk CSV loader on a synthetic multi-million-row history,
+# against the per-row DictReader/strptime parse and pandas.read_csv
+
+parser = argparse.ArgumentParser(description="Benchmark the bulk CSV loader")
+parser.add_argument("--rows", type=int, default=2_000_000)
+parser.add_argument("--baseline", type=int, default=200_000, help="rows parsed the per-row way")
+args = parser.parse_args()
+
+filename = os.path.join(tempfile.mkdtemp(), "history.csv")
+rng = np.random.default_rng(42)
+dates = np.datetime64('1900-01-01') + np.arange(args.rows)
+closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, args.rows)))
+volumes = rng.integers(1_000, 1_000_000, args.rows)
+with open(filename, 'w') as file:
+    file.write('Date,Open,High,Low,Close,Volume\n')
+    for i in range(0, args.rows, 100_000):
+        window = slice(i, i + 100_000)
+        file.writelines(f"{d},{c:.4f},{c * 1.01:.4f},{c * 0.99:.4f},{c:.4f},{v}\n"
+                        for d, c, v in zip(dates[window].astype(str), closes[window], volumes[window]))
+size = os.path.getsize(filename) / 1e6
+
+
+def timed(label, rows, load):
+    start = time.perf_counter()
+    load()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {rows / elapsed:>12,.0f} rows/s ({elapsed:.2f}s)")
+
+
+def per_row(limit):
+    with open(filename) as file:
+        for i, row in enumerate(csv.DictReader(file)):
+            if i == limit:
+                break
+            datetime.strptime(row['Date'], '%Y-%m-%d')
+            float(row['Close'])
+
+
+print(f"{args.rows:,} rows, {size:.0f} MB")
+timed("load_bars (all columns)", args.rows, lambda: load_bars(filename))
+timed("load_csv (Date, Close)", args.rows, lambda: load_csv(filename, ('Date', 'Close')))
+timed("DictReader + strptime", min(args.baseline, args.rows), lambda: per_row(args.baseline))
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+if pd is not None:
+    timed("pandas.read_csv", args.rows, lambda: pd.read_csv(filename, parse_dates=['Date']))
@@ -0,0 +1,62 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+# Store locations are read at import time, so point them at scratch space first
+scratch = tempfile.mkdtemp()
+os.environ['OHLCV_STORE_DIR'] = os.path.join(scratch, 'bars')
+os.environ['FEATURE_STORE_DIR'] = os.path.join(scratch, 'features')
+
+from bars import Bars
+from feature_store import FeatureStore, build_features
+from indicators import FEATURES
+from model_training import prepare_frame
+from ohlcv_store import OHLCVStore
+
+# Feature matrices for a synthetic universe: derived from scratch per symbol
+# with the pandas path (prepare_frame), built once into the feature store, then
+# kept current after one new bar per symbol, read back for a date range, and
+# extended with a feature no stored column has yet.
+
+parser = argparse.ArgumentParser(description="Benchmark the feature store against rebuilding feature frames")
+parser.add_argument("--symbols", type=int, default=100)
+parser.add_argument("--days", type=int, default=5000, help="bars per symbol (5000 is about 20 years)")
+parser.add_argument("--workers", type=int)
+
+
+def timed(label, work, count):
+    start = time.perf_counter()
+    work()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed:8.3f}s {elapsed / count * 1000:9.2f} ms/symbol")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    rng = np.random.default_rng(11)
+    bars_store, features = OHLCVStore(), FeatureStore()
+    symbols = [f"S{i}" for i in range(args.symbols)]
+    days = np.arange(args.days + 1) + np.datetime64('2004-01-02', 'D').astype(np.int64)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0.0002, 0.015, (args.symbols, args.days + 1)), axis=1))
+    volumes = rng.integers(10 ** 5, 10 ** 6, (args.symbols, args.days + 1))
+    for i, symbol in enumerate(symbols):
+        c = closes[i, :-1]
+        bars_store.append(symbol, Bars(days[:-1], c, c, c, c, volumes[i, :-1]))
+    print(f"{args.symbols} symbols x {args.days} bars, {len(FEATURES)} features")
+
+    timed("rebuild frames (prepare_frame)",
+          lambda: [prepare_frame(bars_store.read_frame(symbol).set_index('Date')) for symbol in symbols], args.symbols)
+    timed("first build (feature store)", lambda: build_features(symbols, max_workers=args.workers), args.symbols)
+    for i, symbol in enumerate(symbols):
+        c = closes[i, -1:]
+        bars_store.append(symbol, Bars(days[-1:], c, c, c, c, volumes[i, -1:]))
+    timed("update after one new bar", lambda: [features.update(symbol) for symbol in symbols], args.symbols)
+    timed("read 2 columns, last 250 days",
+          lambda: [features.read(symbol, ['RSI', '50 Day MA'], days[-250].astype('datetime64[D]'))
+                   for symbol in symbols], args.symbols)
+    timed("read all columns, full history", lambda: [features.read(symbol) for symbol in symbols], args.symbols)
+    timed("add one new feature column",
+          lambda: [features.update(symbol, FEATURES + ['20 Day StdDev']) for symbol in symbols], args.symbols)
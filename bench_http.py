@@ -0,0 +1,64 @@
+import argparse
+import os
+import tempfile
+import time
+
+# Throttled calls are retried after this long; shortened so the benchmark finishes quickly
+os.environ.setdefault('HTTP_THROTTLE_BACKOFF', '1')
+
+import http_client
+import metrics
+from fetch_cache import FetchCache
+from rate_limit import RateLimiter
+from stub_server import start_stub_server
+from watchlist import cycle_deadline, scan_watchlist
+
+# Watchlist scans against a stub provider with a slow tail: a share of calls
+# stall far longer than the read timeout, and a share are answered with Alpha
+# Vantage's HTTP-200 throttling note. Compares timeouts and retries alone, the
+# same with hedged requests, and a scan against a provider that is down, where
+# the circuit breaker fails the remaining symbols at once.
+
+parser = argparse.ArgumentParser(description="Benchmark scan time with slow, throttling and failing providers")
+parser.add_argument("--symbols", type=int, default=200)
+parser.add_argument("--workers", type=int, default=16)
+parser.add_argument("--latency", type=float, default=0.05, help="seconds per normal stub response")
+parser.add_argument("--stall-rate", type=float, default=0.03, help="share of calls that stall")
+parser.add_argument("--stall", type=float, default=20.0, help="seconds a stalled call takes")
+parser.add_argument("--throttle-rate", type=float, default=0.02)
+parser.add_argument("--read-timeout", type=float, default=2.0)
+parser.add_argument("--hedge-after", type=float, default=0.3)
+parser.add_argument("--cycle-deadline", type=float, default=10.0)
+args = parser.parse_args()
+
+http_client.READ_TIMEOUT = args.read_timeout
+
+
+def scan(label, endpoint, **options):
+    metrics.METRICS.reset()
+    http_client.configure(endpoint, **options)
+    # A throwaway cache so every run measures real round trips
+    cache = FetchCache(tempfile.mkdtemp())
+    symbols = [f"SYM{i}" for i in range(args.symbols)]
+    start = time.perf_counter()
+    results, errors = scan_watchlist(symbols, "demo", RateLimiter(1e6), args.workers, endpoint, cache=cache,
+                                     deadline=cycle_deadline(args.cycle_deadline))
+    elapsed = time.perf_counter() - start
+    counters = {}
+    for item in metrics.METRICS.snapshot()['counters']:
+        counters[item['name']] = counters.get(item['name'], 0) + item['value']
+    print(f"{label:<22} {elapsed:6.2f}s  {len(results):>5} ok {len(errors):>5} failed  "
+          f"{counters.get('api_calls', 0):>5.0f} calls {counters.get('http_retries', 0):>4.0f} retries "
+          f"{counters.get('hedged_requests', 0):>4.0f} hedged {counters.get('api_throttled', 0):>4.0f} throttled "
+          f"{counters.get('circuit_rejected', 0):>5.0f} rejected")
+
+
+server, base_url = start_stub_server(latency=args.latency, throttle_rate=args.throttle_rate,
+                                     stall_rate=args.stall_rate, stall=args.stall)
+print(f"{args.symbols} symbols, {args.stall_rate:.0%} of calls stall {args.stall:.0f}s, "
+      f"{args.throttle_rate:.0%} throttled, read timeout {args.read_timeout:.1f}s")
+scan("retries", f"{base_url}/query", hedge_after=0)
+scan("retries + hedging", f"{base_url}/query", hedge_after=args.hedge_after)
+server.shutdown()
+# Nothing listens on port 9: every connection is refused
+scan("provider down", "http://127.0.0.1:9/query")
@@ -0,0 +1,65 @@
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import metrics
+from intraday import REPLAY_COLUMNS, IntradayMonitor, ReplayFeed, run_intraday
+from notifier import Outbox, TwilioDispatcher
+from stub_server import start_stub_server
+from subscriptions import SubscriptionRegistry
+
+# Latency from a minute bar's close to its alert, replaying a synthetic session
+# of random-walk bars with occasional jumps. Every bar counts as closed when the
+# replay hands it over, so "detect" is the in-process cost and "sent" adds the
+# SMS round trip to the local stub.
+
+parser = argparse.ArgumentParser(description="Benchmark intraday detection latency on a replayed session")
+parser.add_argument("--symbols", type=int, default=500)
+parser.add_argument("--minutes", type=int, default=390, help="bars per symbol (390 is one regular session)")
+parser.add_argument("--subscribers", type=int, default=3, help="phones per symbol")
+parser.add_argument("--threshold", type=float, default=1.0)
+parser.add_argument("--latency", type=float, default=0.0, help="seconds the stub waits per SMS")
+args = parser.parse_args()
+
+state = tempfile.mkdtemp()
+replay = os.path.join(state, "session.csv")
+rng = np.random.default_rng(7)
+returns = rng.normal(0, 0.0008, (args.minutes, args.symbols))
+jumps = rng.random((args.minutes, args.symbols)) < 0.002
+returns[jumps] += rng.choice([-0.02, 0.02], jumps.sum())
+closes = 100 * np.exp(np.cumsum(returns, axis=0))
+opened = datetime(2024, 1, 2, 9, 30)
+with open(replay, 'w') as file:
+    file.write(",".join(REPLAY_COLUMNS) + "\n")
+    for minute in range(args.minutes):
+        label = (opened + timedelta(minutes=minute)).strftime("%Y-%m-%d %H:%M:%S")
+        file.writelines(f"{label},S{i},{c:.4f},{c:.4f},{c:.4f},{c:.4f},1000\n" for i, c in enumerate(closes[minute]))
+
+registry = SubscriptionRegistry()
+for i in range(args.symbols):
+    for k in range(args.subscribers):
+        registry.subscribe(f"+1555{(i * args.subscribers + k) % 10000:07d}", f"S{i}")
+server, base_url = start_stub_server(latency=args.latency)
+dispatcher = TwilioDispatcher("bench", "bench", Outbox(os.path.join(state, "outbox.sqlite3")), rate=1e9,
+                              base_url=base_url)
+
+start = time.perf_counter()
+run_intraday(ReplayFeed(replay), IntradayMonitor(threshold=args.threshold), registry, dispatcher)
+elapsed = time.perf_counter() - start
+server.shutdown()
+
+snapshot = metrics.METRICS.snapshot()
+latency = {item['labels']['stage']: item for item in snapshot['histograms'] if item['name'] == 'alert_latency_seconds'}
+counters = {item['name']: item['value'] for item in snapshot['counters'] if not item['labels']}
+bars = args.symbols * args.minutes
+print(f"{args.symbols} symbols x {args.minutes} bars, {bars / elapsed:,.0f} bars/s, "
+      f"{counters.get('alerts_fired', 0):.0f} alerts, {dispatcher.outbox.counts().get('sent', 0)} SMS")
+for stage in ('detect', 'sent'):
+    item = latency.get(stage)
+    if item:
+        print(f"bar close -> {stage:<6} p50 {item['p50'] * 1000:8.1f} ms  p99 {item['p99'] * 1000:8.1f} ms  "
+              f"max {item['max'] * 1000:8.1f} ms")
@@ -0,0 +1,36 @@
+import argparse
+import os
+import tempfile
+import time
+
+import notifier
+from notifier import Outbox, TwilioDispatcher
+from stub_server import start_stub_server
+
+# Push N alerts through the dispatcher against the fake Twilio endpoint
+
+parser = argparse.ArgumentParser(description="Benchmark the Twilio dispatcher")
+parser.add_argument("--messages", type=int, default=500)
+parser.add_argument("--senders", type=int, default=10, help="distinct from-numbers")
+parser.add_argument("--rate", type=float, default=10, help="messages per second per sender")
+parser.add_argument("--workers", type=int, default=16)
+parser.add_argument("--latency", type=float, default=0.1, help="seconds per stub response")
+parser.add_argument("--fail-rate", type=float, default=0.05)
+args = parser.parse_args()
+
+notifier.BACKOFF_BASE = 0.05
+server, base_url = start_stub_server(latency=args.latency, fail_rate=args.fail_rate)
+outbox = Outbox(os.path.join(tempfile.mkdtemp(), "outbox.sqlite3"))
+dispatcher = TwilioDispatcher("ACbench", "token", outbox, args.workers, args.rate, base_url=base_url)
+
+for i in range(args.messages):
+    outbox.enqueue(f"+1555000{i % args.senders:04d}", f"+1666{i:07d}", f"Alert {i}")
+
+start = time.perf_counter()
+counts = dispatcher.flush()
+elapsed = time.perf_counter() - start
+server.shutdown()
+
+print(f"Outbox: {counts}, delivered to stub: {len(server.messages)}")
+print(f"Sent in {elapsed:.2f}s, {counts.get('sent', 0) / elapsed:.1f} messages/s")
+print(f"Rate-limit floor: {args.messages / (args.senders * args.rate):.2f}s")
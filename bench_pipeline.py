@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fixtures import FixtureSet, synthesize
+from stub_server import start_stub_server
+
+# End-to-end fetch -> store -> rules -> news -> SMS benchmark. Recorded responses
+# are replayed by the stub server in this process; every run is a fresh child
+# process with empty state directories, so peak RSS and timings belong to that
+# run alone. The child drives main.alert_cycle exactly as a cron run would.
+# Shard and pool workers are its own children: their peak is reported apart
+# (the largest single worker, as getrusage gives it), since a sharded run's
+# memory is mostly there.
+
+
+def child(size, rules, shards):
+    # Runs in a fresh interpreter whose environment points every service at the stub
+    import metrics
+    from alert_rules import parse_rules
+    from main import alert_cycle
+    from rate_limit import RateLimiter
+
+    watchlist = {f"SYM{i}": f"Benchmark Company {i}" for i in range(size)}
+    start = time.perf_counter()
+    if shards > 1:
+        from rate_limit import ProcessRateLimiter
+        limiter = ProcessRateLimiter(1e9, burst=1000)
+    else:
+        limiter = RateLimiter(1e9, burst=1000)
+    counts = alert_cycle(watchlist, parse_rules(rules), limiter, shards=shards)
+    elapsed = time.perf_counter() - start
+    snapshot = metrics.METRICS.snapshot()
+    stages = {item['labels'].get('stage'): item for item in snapshot['histograms']}
+    totals = {}
+    for counter in snapshot['counters']:
+        totals[counter['name']] = totals.get(counter['name'], 0) + counter['value']
+    print(json.dumps({
+        'elapsed': elapsed,
+        'sent': counts.get('sent', 0),
+        'api_calls': totals.get('api_calls', 0),
+        'bytes': totals.get('bytes_downloaded', 0),
+        'fetch_p50': stages.get('fetch', {}).get('p50', 0.0),
+        'fetch_p99': stages.get('fetch', {}).get('p99', 0.0),
+        'send_p50': stages.get('send', {}).get('p50', 0.0),
+        'send_p99': stages.get('send', {}).get('p99', 0.0),
+        # Linux reports kilobytes; workers count once they have exited, which
+        # alert_cycle waits for
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'worker_peak_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }))
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def run(size, base_url, args):
+    state = tempfile.mkdtemp()
+    env = dict(
+        os.environ,
+        STOCK_ENDPOINT=f"{base_url}/query",
+        NEWS_ENDPOINT=f"{base_url}/v2/everything",
+        TWILIO_API=base_url,
+        STOCK_API_KEY="bench",
+        NEWS_API_KEY="bench",
+        TWILIO_SID="bench",
+        TWILIO_AUTH_TOKEN="bench",
+        STOCK_API_RATE="1e9",
+        TWILIO_RATE="1e9",
+        OHLCV_STORE_DIR=os.path.join(state, "ohlcv"),
+        FETCH_CACHE_DIR=os.path.join(state, "cache"),
+        OUTBOX_PATH=os.path.join(state, "outbox.sqlite3"),
+        SEEN_ARTICLES_PATH=os.path.join(state, "seen.sqlite3"),
+        MODEL_DIR=os.path.join(state, "models"),
+        HEADLESS="1",
+        METRICS_JSON="",
+        PROFILE_PATH="",
+    )
+    command = [sys.executable, os.path.abspath(__file__), "--child", str(size), "--rules", args.rules,
+               "--shards", str(args.shards)]
+    output = subprocess.run(command, capture_output=True, text=True, env=env)
+    if output.returncode:
+        raise RuntimeError(output.stderr.strip().splitlines()[-1] if output.stderr.strip() else "child failed")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the alert pipeline against recorded API responses")
+    parser.add_argument("--sizes", default="1,100,5000", help="watchlist sizes, comma separated")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size")
+    parser.add_argument("--fixtures", help="directory written by fixtures.py (generated when omitted)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the stub waits per response")
+    parser.add_argument("--rules", default="change:1:1.5")
+    parser.add_argument("--shards", type=int, default=1, help="worker processes per run")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to PATH")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        child(args.child, args.rules, args.shards)
+        sys.exit(0)
+
+    fixture_dir = args.fixtures
+    if fixture_dir is None:
+        fixture_dir = tempfile.mkdtemp()
+        synthesize(fixture_dir)
+    server, base_url = start_stub_server(latency=args.latency, fixtures=FixtureSet(fixture_dir))
+
+    report = []
+    print(f"{'symbols':>8} {'cycle p50':>10} {'cycle p99':>10} {'symbols/s':>10} {'fetch p50/p99 ms':>17} "
+          f"{'send p50/p99 ms':>16} {'SMS':>6} {'MB in':>7} {'peak RSS':>9} {'worker RSS':>11}")
+    for size in [int(value) for value in args.sizes.split(',')]:
+        runs = [run(size, base_url, args) for _ in range(args.repeat)]
+        cycles = [r['elapsed'] for r in runs]
+        row = {
+            'symbols': size,
+            'cycle_p50': statistics.median(cycles),
+            'cycle_p99': percentile(cycles, 0.99),
+            'throughput': size / statistics.median(cycles),
+            'fetch_p50': statistics.median(r['fetch_p50'] for r in runs),
+            'fetch_p99': max(r['fetch_p99'] for r in runs),
+            'send_p50': statistics.median(r['send_p50'] for r in runs),
+            'send_p99': max(r['send_p99'] for r in runs),
+            'sent': runs[0]['sent'],
+            'api_calls': runs[0]['api_calls'],
+            'mb_downloaded': runs[0]['bytes'] / 1e6,
+            'peak_rss_mb': max(r['peak_rss_mb'] for r in runs),
+            'worker_peak_rss_mb': max(r['worker_peak_rss_mb'] for r in runs),
+        }
+        report.append(row)
+        print(f"{size:>8} {row['cycle_p50']:>9.2f}s {row['cycle_p99']:>9.2f}s {row['throughput']:>10.1f} "
+              f"{row['fetch_p50'] * 1000:>8.1f}/{row['fetch_p99'] * 1000:<8.1f} "
+              f"{row['send_p50'] * 1000:>7.1f}/{row['send_p99'] * 1000:<8.1f} {row['sent']:>6} "
+              f"{row['mb_downloaded']:>7.1f} {row['peak_rss_mb']:>7.0f}MB {row['worker_peak_rss_mb']:>9.0f}MB")
+    server.shutdown()
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2)
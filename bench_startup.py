@@ -0,0 +1,47 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Time a cold `import` of each entry point in a fresh interpreter and fail when
+# it gets slower than the budget or pulls in a module only some paths need
+
+HEAVY_MODULES = ['matplotlib', 'twilio', 'sklearn', 'imblearn', 'pandas', 'joblib', 'notifier', 'news']
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = sorted({{name.split('.')[0] for name in sys.modules}} & set({heavy!r}))
+print(json.dumps([elapsed, heavy]))
+"""
+
+parser = argparse.ArgumentParser(description="Benchmark and guard entry-point import time")
+parser.add_argument("modules", nargs="*", default=["main", "daemon", "prediction_model"])
+parser.add_argument("--runs", type=int, default=7)
+parser.add_argument("--budget-ms", type=float, default=float(os.getenv('STARTUP_BUDGET_MS', '400')),
+                    help="fail when the median import takes longer")
+args = parser.parse_args()
+
+# Probes run as a headless alert host would
+env = dict(os.environ, HEADLESS='1', MPLBACKEND='Agg')
+failed = False
+for module in args.modules:
+    code = PROBE.format(module=module, heavy=HEAVY_MODULES)
+    times, heavy = [], []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+        elapsed, heavy = json.loads(output.stdout.strip().splitlines()[-1])
+        times.append(elapsed * 1000)
+    median = statistics.median(times)
+    status = "ok"
+    if median > args.budget_ms:
+        status = f"over budget ({args.budget_ms:.0f} ms)"
+    if heavy:
+        status = f"loads {', '.join(heavy)}"
+    failed = failed or status != "ok"
+    print(f"{module}: median {median:.0f} ms, min {min(times):.0f} ms over {args.runs} runs - {status}")
+
+sys.exit(1 if failed else 0)
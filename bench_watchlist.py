@@ -0,0 +1,35 @@
+import argparse
+import tempfile
+import time
+
+from fetch_cache import FetchCache
+from rate_limit import RateLimiter
+from stub_server import start_stub_server
+from watchlist import scan_watchlist
+
+# Scan N fake symbols against the local stub and compare with the rate-limit floor
+
+parser = argparse.ArgumentParser(description="Benchmark the concurrent watchlist scanner")
+parser.add_argument("--symbols", type=int, default=200)
+parser.add_argument("--rate", type=float, default=600, help="calls per minute")
+parser.add_argument("--workers", type=int, default=16)
+parser.add_argument("--latency", type=float, default=0.25, help="seconds per stub response")
+args = parser.parse_args()
+
+server, base_url = start_stub_server(latency=args.latency)
+symbols = [f"SYM{i}" for i in range(args.symbols)]
+limiter = RateLimiter(args.rate)
+
+# A throwaway cache so every run measures real round trips
+cache = FetchCache(tempfile.mkdtemp())
+
+start = time.perf_counter()
+results, errors = scan_watchlist(symbols, "demo", limiter, args.workers, f"{base_url}/query", cache=cache)
+elapsed = time.perf_counter() - start
+server.shutdown()
+
+floor = (args.symbols - 1) / (args.rate / 60)
+serial = args.symbols * args.latency
+print(f"Fetched {len(results)} symbols ({len(errors)} errors) in {elapsed:.2f}s")
+print(f"Rate-limit floor: {floor:.2f}s, sequential estimate: {serial:.2f}s")
+print(f"Throughput: {len(results) / elapsed:.1f} symbols/s")
@@ -0,0 +1,137 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib.dates as mdates
+import numpy as np
+from matplotlib import ticker
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import metrics
+from ohlcv_store import STORE_DIR, OHLCVStore
+from watchlist import load_watchlist
+
+# Closing-price charts drawn straight from the bar store. Batch rendering goes
+# through the Agg canvas (no pyplot, no display) and keeps one figure per worker
+# process, only swapping the line data and labels between symbols.
+
+CHART_DIR = os.getenv('CHART_DIR', 'charts')
+CHART_SIZE = (12, 6)
+CHART_DPI = 100
+CHART_FORMATS = ('png', 'svg')
+PNG_COMPRESSION = 1
+
+
+class ChartRenderer:
+    def __init__(self, figure=None, size=CHART_SIZE, dpi=CHART_DPI):
+        # Pass a pyplot figure to draw for plt.show(); without one the chart is off-screen
+        if figure is None:
+            figure = Figure(figsize=size, dpi=dpi)
+            FigureCanvasAgg(figure)
+            # Fixed margins instead of tight_layout, which re-measures every label on each save
+            figure.subplots_adjust(left=0.08, right=0.98, top=0.93, bottom=0.18)
+        self.figure = figure
+        self.axes = figure.add_subplot()
+        self.line, = self.axes.plot([], [], marker='o', linestyle='-', color='b')
+        self.axes.set_xlabel('Date')
+        self.axes.set_ylabel('Closing Price')
+        self.axes.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
+        self.axes.tick_params(axis='x', labelrotation=45)
+        self.axes.grid(True)
+
+    def draw(self, symbol, dates, closes):
+        # Many-point series drop the markers, they only blur into the line
+        self.line.set_data(dates, closes)
+        self.line.set_marker('o' if len(closes) <= 250 else '')
+        self.axes.set_title(f'{symbol} Stock Prices')
+        # Tick objects dominate the draw time, so their density follows the date span
+        days = int((dates[-1] - dates[0]) / np.timedelta64(1, 'D')) if len(dates) else 0
+        if days <= 120:
+            major, minor = mdates.MonthLocator(), mdates.WeekdayLocator()
+        elif days <= 2 * 365:
+            major, minor = mdates.MonthLocator(), ticker.NullLocator()
+        else:
+            major, minor = mdates.YearLocator(), ticker.NullLocator()
+        self.axes.xaxis.set_major_locator(major)
+        self.axes.xaxis.set_minor_locator(minor)
+        self.axes.relim()
+        self.axes.autoscale_view()
+
+    def save(self, path):
+        # zlib's default level spends more time compressing than drawing the chart
+        options = {'pil_kwargs': {'compress_level': PNG_COMPRESSION}} if path.endswith('.png') else {}
+        self.figure.savefig(path, **options)
+
+
+def chart_path(symbol, out_dir=CHART_DIR, fmt='png'):
+    return os.path.join(out_dir, f"{symbol.upper()}.{fmt}")
+
+
+_worker = None
+
+
+def _init_worker(store_root):
+    # One store handle and one figure for every symbol this process renders
+    global _worker
+    _worker = (OHLCVStore(store_root), ChartRenderer())
+
+
+def render_symbol(symbol, out_dir=CHART_DIR, fmt='png', start=None, end=None):
+    store, renderer = _worker
+    bars = store.read(symbol, start, end)
+    if not len(bars):
+        raise ValueError(f"No stored bars for {symbol}")
+    renderer.draw(symbol, bars.dates, bars.close)
+    path = chart_path(symbol, out_dir, fmt)
+    renderer.save(path)
+    return path
+
+
+def render_symbols(symbols, out_dir=CHART_DIR, fmt='png', start=None, end=None, max_workers=None,
+                   store_root=STORE_DIR):
+    # Returns (paths, errors) keyed by symbol, like scan_watchlist
+    if fmt not in CHART_FORMATS:
+        raise ValueError(f"Unsupported chart format: {fmt}")
+    os.makedirs(out_dir, exist_ok=True)
+    symbols = [symbol.upper() for symbol in symbols]
+    with metrics.timer('render'):
+        return _render_all(symbols, out_dir, fmt, start, end, max_workers, store_root)
+
+
+def _render_all(symbols, out_dir, fmt, start, end, max_workers, store_root):
+    paths, errors = {}, {}
+    if max_workers == 1:
+        _init_worker(store_root)
+        for symbol in symbols:
+            try:
+                paths[symbol] = render_symbol(symbol, out_dir, fmt, start, end)
+            except Exception as e:
+                errors[symbol] = e
+        return paths, errors
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(store_root,)) as pool:
+        futures = {symbol: pool.submit(render_symbol, symbol, out_dir, fmt, start, end) for symbol in symbols}
+        for symbol, future in futures.items():
+            try:
+                paths[symbol] = future.result()
+            except Exception as e:
+                errors[symbol] = e
+    return paths, errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render closing-price charts for stored symbols")
+    parser.add_argument("symbols", nargs="*", help="symbols to render; all stored symbols when omitted")
+    parser.add_argument("--watchlist", help="CSV of Symbol,Company Name to render")
+    parser.add_argument("--out", default=CHART_DIR)
+    parser.add_argument("--format", choices=CHART_FORMATS, default='png')
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--workers", type=int, help="rendering processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    symbols = args.symbols or (list(load_watchlist(args.watchlist)) if args.watchlist else OHLCVStore().symbols())
+    paths, errors = render_symbols(symbols, args.out, args.format, args.start, args.end, args.workers)
+    print(f"Rendered {len(paths)} charts to {args.out}")
+    for symbol, e in sorted(errors.items()):
+        print(f"{symbol}: An error occurred: {e}")
@@ -0,0 +1,2 @@
+# test_2.py is the Tk desktop app, not a test module
+collect_ignore = ['test_2.py']
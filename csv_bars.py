@@ -0,0 +1,78 @@
+import io
+import mmap
+import os
+
+import numpy as np
+
+import metrics
+from bars import Bars
+
+# Bulk loader for Date,Open,High,Low,Close,Volume files such as stock_data.csv.
+# The file is memory-mapped and parsed in newline-aligned chunks by numpy's
+# tokenizer, only the wanted columns, with ISO dates cast to datetime64 in bulk,
+# so no per-row Python objects are created on multi-million-row histories.
+
+CSV_COLUMNS = ('Date', 'Open', 'High', 'Low', 'Close', 'Volume')
+CHUNK_BYTES = 16 * 1024 * 1024
+
+
+# Parsed as text first: ISO dates convert to datetime64 in one cast, and volumes
+# written as floats ("1000.0") still load
+_RAW_TYPES = {'Date': 'S10', 'Volume': 'f8'}
+_TYPES = {'Date': 'datetime64[D]', 'Volume': 'i8'}
+
+
+def _parse_chunk(data, positions):
+    # numpy's C tokenizer reads only the wanted columns straight into typed fields
+    raw = np.dtype([(column, _RAW_TYPES.get(column, 'f8')) for column in positions])
+    records = np.loadtxt(io.BytesIO(data), delimiter=',', dtype=raw, usecols=list(positions.values()), ndmin=1)
+    return {column: records[column].astype(_TYPES.get(column, 'f8')) for column in positions}
+
+
+def load_csv(filename, columns=CSV_COLUMNS, chunk_bytes=CHUNK_BYTES):
+    # Returns {column: array} for the requested columns, in file order;
+    # Date is datetime64[D], Volume int64, everything else float64
+    with metrics.timer('csv_read'), open(filename, 'rb') as file:
+        header = file.readline().decode().strip().split(',')
+        missing = [column for column in columns if column not in header]
+        if missing:
+            raise ValueError(f"{filename} has no column(s) {', '.join(missing)}")
+        positions = {column: header.index(column) for column in columns}
+        start = file.tell()
+        size = os.fstat(file.fileno()).st_size
+        if size <= start:
+            return {column: np.empty(0, dtype=_TYPES.get(column, 'f8')) for column in columns}
+
+        parts = {column: [] for column in columns}
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            while start < size:
+                end = min(start + chunk_bytes, size)
+                if end < size:
+                    # Cut after the last full line in this window
+                    end = view.rfind(b'\n', start, end) + 1 or view.find(b'\n', end) + 1 or size
+                try:
+                    chunk = _parse_chunk(view[start:end], positions)
+                except ValueError as e:
+                    # numpy counts rows from the start of the chunk
+                    line = view[:start].count(b'\n') + 1
+                    raise ValueError(f"{filename}: malformed row at or after line {line}: {e}") from e
+                for column, values in chunk.items():
+                    parts[column].append(values)
+                start = end
+    return {column: np.concatenate(values) for column, values in parts.items()}
+
+
+def load_bars(filename, chunk_bytes=CHUNK_BYTES):
+    # The whole file as Bars, sorted by date
+    columns = load_csv(filename, CSV_COLUMNS, chunk_bytes)
+    order = np.argsort(columns['Date'], kind='stable')
+    return Bars(columns['Date'][order].astype(np.int64), *(columns[column][order] for column in CSV_COLUMNS[1:]))
+
+
+def load_frame(filename, columns=CSV_COLUMNS):
+    # Date-indexed DataFrame, the shape pd.read_csv(..., parse_dates=['Date']).set_index('Date') gives
+    import pandas as pd
+
+    values = load_csv(filename, tuple(dict.fromkeys(('Date',) + tuple(columns))))
+    dates = pd.DatetimeIndex(values.pop('Date').astype('datetime64[ns]'), name='Date')
+    return pd.DataFrame(values, index=dates)
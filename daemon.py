@@ -0,0 +1,282 @@
+import argparse
+import os
+import socket
+import socketserver
+import threading
+from datetime import datetime, timedelta
+
+import metrics
+from alert_rules import DEFAULT_CHANGE_PCT, AlertIndex, parse_rules
+from fetch_cache import MARKET_TZ
+from main import alert_cycle, new_dispatcher
+from rate_limit import ProcessRateLimiter, RateLimiter
+from sharded import SHARDS
+from subscriptions import DEFAULT_RECIPIENT, SUBSCRIPTIONS_PATH, SubscriptionRegistry
+from watchlist import STOCK_API_RATE, load_watchlist, save_watchlist
+
+# Resident alert process: imports, sessions, caches and the alert index stay warm
+# between cycles instead of being rebuilt by a cron-started main.py
+
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = int(os.getenv('DAEMON_PORT', '8765'))
+
+# Cycles run after the close, once the daily bar is final. The store leaves out
+# the bar of a session still trading, so a slot during market hours would only
+# see yesterday's bars again; intraday.py covers moves during the session.
+DAEMON_TIMES = os.getenv('DAEMON_TIMES', '16:15')
+
+# Alpha Vantage calls per day allowed by the plan behind STOCK_API_KEY
+STOCK_API_DAILY = int(os.getenv('STOCK_API_DAILY', '25'))
+
+
+def parse_times(spec):
+    return sorted(tuple(int(part) for part in item.split(':')) for item in spec.split(',') if item.strip())
+
+
+def next_run(times, now=None):
+    # Next scheduled weekday time in market time
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    day = now.replace(second=0, microsecond=0)
+    for offset in range(8):
+        candidate_day = day + timedelta(days=offset)
+        if candidate_day.weekday() >= 5:
+            continue
+        for hour, minute in times:
+            candidate = candidate_day.replace(hour=hour, minute=minute)
+            if candidate > now:
+                return candidate
+    raise ValueError("No schedule times configured.")
+
+
+class AlertDaemon:
+    def __init__(self, watchlist_path, rules, times, port=DAEMON_PORT, shards=SHARDS,
+                 subscriptions_path=SUBSCRIPTIONS_PATH):
+        self.watchlist_path = watchlist_path
+        self.watchlist = load_watchlist(watchlist_path) if os.path.exists(watchlist_path) else {}
+        self.subscriptions_path = subscriptions_path
+        if os.path.exists(subscriptions_path):
+            self.registry = SubscriptionRegistry.load(subscriptions_path, rules)
+        else:
+            self.registry = SubscriptionRegistry(rules)
+        self.rules = rules
+        self.times = times
+        self.port = port
+        self.shards = shards
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.cycle_lock = threading.Lock()
+        # Shared across cycles so the per-minute budget holds between runs too
+        self.limiter = ProcessRateLimiter(STOCK_API_RATE) if shards > 1 else RateLimiter(STOCK_API_RATE)
+        self.index = AlertIndex()
+        self.dispatcher = None
+        self.rotation = 0
+        self.last_cycle = None
+        self.last_result = None
+
+    def add(self, symbol, company):
+        with self.lock:
+            self.watchlist[symbol.upper()] = company or symbol.upper()
+            save_watchlist(self.watchlist_path, self.watchlist)
+
+    def remove(self, symbol):
+        with self.lock:
+            removed = self.watchlist.pop(symbol.upper(), None) is not None
+            if removed:
+                save_watchlist(self.watchlist_path, self.watchlist)
+        return removed
+
+    def subscribe(self, phone, symbol, rules=""):
+        with self.lock:
+            symbol = symbol.upper()
+            company = self.registry.companies.get(symbol) or self.watchlist.get(symbol)
+            self.registry.subscribe(phone, symbol, company, rules)
+            self.registry.save(self.subscriptions_path)
+
+    def unsubscribe(self, phone, symbol=None):
+        with self.lock:
+            removed = self.registry.unsubscribe(phone, symbol)
+            if removed:
+                self.registry.save(self.subscriptions_path)
+        return removed
+
+    def audience(self):
+        # Subscriptions plus the plain watchlist (for DEFAULT_RECIPIENT), copied so
+        # commands can change them while a cycle runs
+        with self.lock:
+            registry = self.registry.copy()
+            registry.add_watchlist(self.watchlist, DEFAULT_RECIPIENT)
+        return registry
+
+    def status(self):
+        count = len(self.audience().watchlist())
+        with self.lock:
+            subscriptions, users = len(self.registry), len(self.registry.users())
+        calls = count * len(self.times)
+        lines = [
+            f"symbols: {count}",
+            f"subscriptions: {subscriptions} for {users} users",
+            f"next run: {next_run(self.times):%Y-%m-%d %H:%M %Z}",
+            f"cycle length at {STOCK_API_RATE:g}/min: {min(count, self.cycle_budget()) / STOCK_API_RATE:.1f} min",
+            f"daily calls: {min(calls, STOCK_API_DAILY)} of {STOCK_API_DAILY}"
+            + (f", rotating {self.cycle_budget()} symbols per slot" if calls > STOCK_API_DAILY else ""),
+            f"last cycle: {self.last_cycle or 'never'} {self.last_result or ''}".rstrip(),
+        ]
+        return "\n".join(lines)
+
+    def cycle_budget(self):
+        return max(1, STOCK_API_DAILY // len(self.times))
+
+    def next_batch(self, watchlist):
+        # When the watchlist needs more calls than the daily quota allows, each slot
+        # takes the next round-robin slice so every symbol is still refreshed in turn
+        with self.lock:
+            symbols = sorted(watchlist)
+            budget = self.cycle_budget()
+            if len(symbols) <= budget:
+                return dict(watchlist)
+            start = self.rotation % len(symbols)
+            chosen = (symbols + symbols)[start:start + budget]
+            self.rotation = start + budget
+            return {symbol: watchlist[symbol] for symbol in chosen}
+
+    def cycle(self):
+        # Only one cycle at a time; a slot that comes up mid-cycle is skipped
+        if not self.cycle_lock.acquire(blocking=False):
+            print("Previous cycle still running, skipping this slot")
+            return
+        try:
+            if self.dispatcher is None:
+                self.dispatcher = new_dispatcher()
+            # Each symbol is fetched once however many users watch it
+            registry = self.audience()
+            watchlist = self.next_batch(registry.watchlist())
+            print(f"Cycle started for {len(watchlist)} symbols, {len(registry.users())} recipients")
+            self.last_cycle = datetime.now(MARKET_TZ).strftime('%Y-%m-%d %H:%M')
+            with metrics.timer('cycle'):
+                self.last_result = alert_cycle(watchlist, self.rules, self.limiter, self.index, self.dispatcher,
+                                               self.shards, registry)
+        except Exception as e:
+            self.last_result = f"error: {e}"
+            print(f"An error occurred: {e}")
+        finally:
+            self.cycle_lock.release()
+
+    def run_now(self):
+        threading.Thread(target=self.cycle, daemon=True).start()
+
+    def serve(self):
+        server = ControlServer((DAEMON_HOST, self.port), ControlHandler)
+        server.daemon_ref = self
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Control interface on {DAEMON_HOST}:{self.port}")
+        try:
+            while not self.stopping.is_set():
+                due = next_run(self.times)
+                print(f"Next cycle at {due:%Y-%m-%d %H:%M %Z}")
+                delay = (due - datetime.now(MARKET_TZ)).total_seconds()
+                # Sleep until the slot, waking early if the schedule or stop flag changes
+                if self.wake.wait(max(0.0, delay)):
+                    self.wake.clear()
+                    continue
+                self.run_now()
+        finally:
+            server.shutdown()
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+
+
+class ControlServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class ControlHandler(socketserver.StreamRequestHandler):
+    # One command per line: add SYMBOL [Company Name], remove SYMBOL, list, subscribe PHONE SYMBOL [RULES],
+    # unsubscribe PHONE [SYMBOL], subscribers SYMBOL, run, status, metrics, stop
+    def handle(self):
+        daemon = self.server.daemon_ref
+        for raw in self.rfile:
+            command, _, rest = raw.decode().strip().partition(' ')
+            command = command.lower()
+            if command == 'add' and rest:
+                symbol, _, company = rest.partition(' ')
+                daemon.add(symbol, company.strip())
+                reply = f"added {symbol.upper()}"
+            elif command == 'remove' and rest:
+                reply = f"removed {rest.upper()}" if daemon.remove(rest.strip()) else f"{rest.upper()} not watched"
+            elif command == 'list':
+                with daemon.lock:
+                    reply = "\n".join(f"{s},{c}" for s, c in sorted(daemon.watchlist.items())) or "(empty)"
+            elif command == 'subscribe' and len(rest.split()) >= 2:
+                phone, symbol, *spec = rest.split()
+                try:
+                    daemon.subscribe(phone, symbol, "".join(spec))
+                    reply = f"subscribed {phone} to {symbol.upper()}"
+                except ValueError as e:
+                    reply = f"error: {e}"
+            elif command == 'unsubscribe' and rest:
+                phone, _, symbol = rest.partition(' ')
+                reply = f"removed {daemon.unsubscribe(phone, symbol.strip() or None)} subscriptions"
+            elif command == 'subscribers' and rest:
+                with daemon.lock:
+                    subscribers = daemon.registry.subscribers(rest.strip())
+                reply = "\n".join(f"{phone} {','.join(sorted(names))}" for phone, names in sorted(subscribers.items()))
+                reply = reply or "(none)"
+            elif command == 'run':
+                daemon.run_now()
+                reply = "cycle started"
+            elif command == 'status':
+                reply = daemon.status()
+            elif command == 'metrics':
+                snapshot = metrics.METRICS.snapshot()
+                counters = [f"{c['name']} {','.join(f'{k}={v}' for k, v in c['labels'].items())} {c['value']:g}"
+                            for c in snapshot['counters']]
+                reply = "\n".join(counters + [metrics.METRICS.summary()]).strip() or "(no data yet)"
+            elif command == 'stop':
+                daemon.stop()
+                reply = "stopping"
+            else:
+                reply = ("commands: add SYMBOL [Company Name] | remove SYMBOL | list | subscribe PHONE SYMBOL [RULES] | "
+                         "unsubscribe PHONE [SYMBOL] | subscribers SYMBOL | run | status | metrics | stop")
+            self.wfile.write((reply + "\n.\n").encode())
+
+
+def send_command(command, port=DAEMON_PORT):
+    with socket.create_connection((DAEMON_HOST, port), timeout=10) as conn:
+        conn.sendall((command + "\n").encode())
+        reply = b""
+        while not reply.endswith(b"\n.\n"):
+            chunk = conn.recv(4096)
+            if not chunk:
+                break
+            reply += chunk
+    return reply.decode().rsplit("\n.\n", 1)[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resident stock alert scheduler")
+    parser.add_argument("--watchlist", default="watchlist.csv", help="CSV of Symbol,Company Name, updated by add/remove")
+    parser.add_argument("--rules", default=os.getenv('ALERT_RULES', f"change:1:{DEFAULT_CHANGE_PCT}"))
+    parser.add_argument("--subscriptions", default=SUBSCRIPTIONS_PATH,
+                        help="CSV of Phone,Symbol,Company Name,Rules, updated by subscribe/unsubscribe")
+    parser.add_argument("--times", default=DAEMON_TIMES, help="HH:MM market-time slots, comma separated")
+    parser.add_argument("--port", type=int, default=DAEMON_PORT)
+    parser.add_argument("--ctl", metavar="COMMAND", help="send a command to a running daemon and exit")
+    parser.add_argument("--metrics-port", type=int, default=metrics.METRICS_PORT,
+                        help="serve Prometheus metrics on this port (0 disables)")
+    parser.add_argument("--shards", type=int, default=SHARDS, help="scan in this many worker processes")
+    args = parser.parse_args()
+
+    if args.ctl:
+        print(send_command(args.ctl, args.port))
+    else:
+        daemon = AlertDaemon(args.watchlist, parse_rules(args.rules), parse_times(args.times), args.port, args.shards,
+                             args.subscriptions)
+        if args.metrics_port:
+            metrics.serve(args.metrics_port)
+            print(f"Metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+        print(daemon.status())
+        daemon.serve()
@@ -0,0 +1,179 @@
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import metrics
+from indicators import FEATURE_LOOKBACK, FEATURES, compute_feature, feature_version
+from ohlcv_store import OHLCVStore
+
+# Model features kept on disk next to the bar store. Each symbol has a
+# directory with one raw float64 file per feature column, named after the
+# column and its definition hash (indicators.feature_version), and row i is
+# bar i of the symbol's bar file. Since both only ever grow, an update computes
+# just the rows for bars added since the last one (plus the few earlier bars a
+# rolling window needs), a new or changed feature computes only its own column,
+# and reads map just the requested columns and date range. A rewritten last
+# bar only costs its own row.
+
+FEATURE_DIR = os.getenv('FEATURE_STORE_DIR', 'features')
+
+
+def read_bytes(path):
+    try:
+        with open(path, 'rb') as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+class FeatureStore:
+    def __init__(self, root=FEATURE_DIR, bars=None):
+        self.root = root
+        self.bars = bars or OHLCVStore()
+        os.makedirs(root, exist_ok=True)
+
+    def directory(self, symbol):
+        return os.path.join(self.root, symbol.upper())
+
+    def path(self, symbol, name):
+        slug = re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')
+        return os.path.join(self.directory(symbol), f"{slug}-{feature_version(name)}.f8")
+
+    def _column(self, symbol, name):
+        path = self.path(symbol, name)
+        if not os.path.exists(path):
+            return np.empty(0)
+        # A torn trailing value from an interrupted append is ignored
+        count = os.path.getsize(path) // 8
+        if count == 0:
+            return np.empty(0)
+        return np.memmap(path, dtype=np.float64, mode='r', shape=(count,))
+
+    def _check(self, symbol, bars):
+        # The columns are only valid for the bar file they were computed from. A
+        # copy of its dates is kept; if the bars were rebuilt, start over. The bar
+        # store may rewrite its last bar, so a copy of that record is kept too and
+        # if it changed, every column's last row is computed again.
+        directory = self.directory(symbol)
+        path = os.path.join(directory, 'dates.d')
+        count = os.path.getsize(path) // 8 if os.path.exists(path) else 0
+        if count:
+            stored = np.memmap(path, dtype='datetime64[D]', mode='r', shape=(count,))
+            if count > len(bars) or stored[0] != bars['date'][0] or stored[-1] != bars['date'][count - 1]:
+                del stored
+                shutil.rmtree(directory)
+                count = 0
+        os.makedirs(directory, exist_ok=True)
+        last = os.path.join(directory, 'last.bar')
+        if count and read_bytes(last) != bars[count - 1:count].tobytes():
+            count -= 1
+            for name in os.listdir(directory):
+                column = os.path.join(directory, name)
+                if name.endswith('.f8') and os.path.getsize(column) > count * 8:
+                    os.truncate(column, count * 8)
+        if count < len(bars):
+            with open(path, mode='r+b' if os.path.exists(path) else 'wb') as file:
+                file.seek(count * 8)
+                file.write(np.ascontiguousarray(bars['date'][count:]).tobytes())
+            with open(last, 'wb') as file:
+                file.write(bars[-1:].tobytes())
+
+    def update(self, symbol, features=FEATURES):
+        # Brings every requested column up to the stored bars; returns feature -> rows computed
+        bars = self.bars.records(symbol)
+        self._check(symbol, bars)
+        computed = {}
+        for name in features:
+            path = self.path(symbol, name)
+            # A torn trailing value from an interrupted append doesn't count as a row
+            done = min(os.path.getsize(path) // 8 if os.path.exists(path) else 0, len(bars))
+            if done == len(bars):
+                continue
+            start = max(0, done - FEATURE_LOOKBACK[name])
+            window = bars[start:]
+            with metrics.timer('features'):
+                values = compute_feature(name, window['close'].astype(float), window['volume'].astype(float),
+                                         window['date'].astype(np.int64))[0][done - start:]
+            # Drop any torn value (or rows past a shrunken bar file) so the column stays aligned
+            if os.path.exists(path) and os.path.getsize(path) != done * 8:
+                os.truncate(path, done * 8)
+            with open(path, mode='ab') as file:
+                file.write(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+            computed[name] = len(values)
+        return computed
+
+    def read(self, symbol, features=FEATURES, start=None, end=None, update=True):
+        # (dates, values): the bar dates in [start, end] and a (rows x features)
+        # matrix of just those columns, raw (nan where a window is not full yet)
+        if update:
+            self.update(symbol, features)
+        with metrics.timer('feature_read'):
+            bars = self.bars.records(symbol)
+            lo, hi = 0, len(bars)
+            if start is not None:
+                lo = np.searchsorted(bars['date'], np.datetime64(start, 'D'), side='left')
+            if end is not None:
+                hi = np.searchsorted(bars['date'], np.datetime64(end, 'D'), side='right')
+            values = np.empty((hi - lo, len(features)))
+            for j, name in enumerate(features):
+                column = self._column(symbol, name)
+                if len(column) < hi:
+                    raise ValueError(f"Feature {name} of {symbol} is not up to date; call update() first")
+                values[:, j] = column[lo:hi]
+            return np.array(bars['date'][lo:hi]), values
+
+    def drop_stale(self, symbol, features=FEATURES):
+        # Removes column files from older feature definitions; returns their names
+        keep = {os.path.basename(self.path(symbol, name)) for name in features} | {'dates.d', 'last.bar'}
+        directory = self.directory(symbol)
+        if not os.path.isdir(directory):
+            return []
+        removed = [name for name in sorted(os.listdir(directory)) if name not in keep]
+        for name in removed:
+            os.remove(os.path.join(directory, name))
+        return removed
+
+
+def update_symbol(symbol, features=FEATURES, root=FEATURE_DIR, bars_root=None):
+    # Module level so it can run in a worker process
+    bars = OHLCVStore(bars_root) if bars_root else OHLCVStore()
+    return FeatureStore(root, bars).update(symbol, features)
+
+
+def build_features(symbols, features=FEATURES, max_workers=None, root=FEATURE_DIR, bars_root=None):
+    # Updates many symbols side by side, one process per symbol at a time
+    results, errors = {}, {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {symbol: pool.submit(update_symbol, symbol, features, root, bars_root) for symbol in symbols}
+        for symbol, future in futures.items():
+            try:
+                results[symbol] = future.result()
+            except Exception as e:
+                errors[symbol] = e
+    return results, errors
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compute stored model features for stored symbols")
+    parser.add_argument("symbols", nargs="*", help="symbols to update (default: every symbol in the bar store)")
+    parser.add_argument("--features", default=",".join(FEATURES), help="comma-separated feature names")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--prune", action="store_true", help="delete columns of older feature definitions")
+    args = parser.parse_args()
+
+    features = [name.strip() for name in args.features.split(",") if name.strip()]
+    symbols = [symbol.upper() for symbol in args.symbols] or OHLCVStore().symbols()
+    results, errors = build_features(symbols, features, args.workers)
+    for symbol, computed in sorted(results.items()):
+        rows = sum(computed.values())
+        print(f"{symbol}: {rows} values in {len(computed)} columns" if computed else f"{symbol}: up to date")
+        if args.prune:
+            for name in FeatureStore().drop_stale(symbol, features):
+                print(f"{symbol}: removed {name}")
+    for symbol, e in sorted(errors.items()):
+        print(f"{symbol}: An error occurred: {e}")
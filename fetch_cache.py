@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+import http_client
+import metrics
+from bars import SERIES_KEY
+
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_OPEN = (9, 30)
+MARKET_CLOSE = (16, 0)
+
+CACHE_DIR = os.getenv('FETCH_CACHE_DIR', '.fetch_cache')
+CACHE_SIZE = int(os.getenv('FETCH_CACHE_SIZE', '256'))
+
+DAILY_OPEN_TTL = 15 * 60
+NEWS_OPEN_TTL = 30 * 60
+NEWS_CLOSED_TTL = 2 * 60 * 60
+
+# Alpha Vantage "compact" returns the latest 100 bars; leave headroom for holidays
+COMPACT_BARS = 95
+
+# Payload keys Alpha Vantage uses for errors and throttling, never worth caching
+ERROR_KEYS = ("Note", "Information", "Error Message")
+
+
+def market_is_open(now=None):
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    if now.weekday() >= 5:
+        return False
+    return MARKET_OPEN <= (now.hour, now.minute) < MARKET_CLOSE
+
+
+def market_ttl(open_ttl, closed_ttl=None, now=None):
+    # While the session runs data can change any minute; after the close prices
+    # are fixed until the next open, so by default cache them until then
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    if market_is_open(now):
+        return open_ttl
+    if closed_ttl is not None:
+        return closed_ttl
+    next_open = now.replace(hour=MARKET_OPEN[0], minute=MARKET_OPEN[1], second=0, microsecond=0)
+    if (now.hour, now.minute) >= MARKET_OPEN:
+        next_open += timedelta(days=1)
+    while next_open.weekday() >= 5:
+        next_open += timedelta(days=1)
+    return max(open_ttl, (next_open - now).total_seconds())
+
+
+def last_session(now=None):
+    # Date of the latest session that has closed (holidays are not known)
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    day = now.date()
+    if now.weekday() >= 5 or (now.hour, now.minute) < MARKET_CLOSE:
+        day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def daily_ttl(data, now=None):
+    # TTL for a TIME_SERIES_DAILY payload. Outside market hours it is kept until
+    # the next open only once it has the last closed session's bar; a fetch
+    # soon after the close may not have it yet and is refreshed like one
+    # made during the session.
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    series = data.get(SERIES_KEY) if isinstance(data, dict) else None
+    if market_is_open(now) or not series or max(series) < last_session(now).isoformat():
+        return DAILY_OPEN_TTL
+    return market_ttl(DAILY_OPEN_TTL, now=now)
+
+
+class FetchCache:
+    # In-memory LRU in front of a JSON-file tier that survives restarts. With a
+    # decode function the memory tier keeps the decoded value (e.g. Bars instead
+    # of the parsed JSON) and the file tier the raw payload. A file's mtime is
+    # set to its expiry, so expired entries are found without reading them.
+    def __init__(self, directory=CACHE_DIR, maxsize=CACHE_SIZE):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.purge()
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def _remember(self, key, expires, value):
+        self.entries[key] = (expires, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def get(self, key, decode=None):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get((key, decode))
+            if entry is not None:
+                if entry[0] > now:
+                    self.entries.move_to_end((key, decode))
+                    return entry[1]
+                del self.entries[(key, decode)]
+        path = self._path(key)
+        try:
+            if os.path.getmtime(path) <= now:
+                return None
+            with open(path, mode='r') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if entry["expires"] <= now:
+            return None
+        value = decode(entry["value"]) if decode is not None else entry["value"]
+        with self.lock:
+            self._remember((key, decode), entry["expires"], value)
+        return value
+
+    def set(self, key, value, ttl, decode=None):
+        # Returns what get() will hand back for this key
+        expires = time.time() + ttl
+        decoded = decode(value) if decode is not None else value
+        with self.lock:
+            self._remember((key, decode), expires, decoded)
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, mode='w') as file:
+            json.dump({"expires": expires, "value": value}, file)
+        os.utime(tmp, (expires, expires))
+        os.replace(tmp, path)
+        return decoded
+
+    def purge(self):
+        # One stat per file; entries written before expiries went into the mtime
+        # (and stray .tmp files) look expired and are dropped
+        now = time.time()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime <= now:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+
+
+_default_cache = None
+
+
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = FetchCache()
+    return _default_cache
+
+
+def cache_key(endpoint, params):
+    # API keys are left out so rotating a key does not invalidate the cache
+    return endpoint + "?" + "&".join(f"{k}={v}" for k, v in sorted(params.items()) if k != "apikey")
+
+
+def cached_get_json(endpoint, params, ttl, cache=None, limiter=None, decode=None, deadline=None):
+    # ttl: seconds, or a function of the payload returning them (see daily_ttl).
+    # decode turns the payload into what callers keep (see bars.daily_bars), so
+    # the parsed JSON is dropped as soon as the response is read. Network calls
+    # go through the provider's shared client (timeouts, retries, circuit
+    # breaker); limiter and deadline are handed to it.
+    if cache is None:
+        cache = default_cache()
+    key = cache_key(endpoint, params)
+    data = cache.get(key, decode)
+    host = urlsplit(endpoint).netloc
+    if data is not None:
+        metrics.count('cache_hits', api=host)
+        return data
+    # Only real network calls spend rate-limit budget
+    data = http_client.client(endpoint).get_json(endpoint, params, limiter, deadline)
+    if any(k in data for k in ERROR_KEYS):
+        metrics.count('api_errors', api=host)
+        return decode(data) if decode is not None else data
+    if callable(ttl):
+        ttl = ttl(data)
+    with metrics.timer('parse'):
+        return cache.set(key, data, ttl, decode)
+
+
+def daily_outputsize(symbol, store=None):
+    # Once the store holds recent history, the last 100 bars are enough to catch up
+    if store is None:
+        return "full"
+    last = store.last_date(symbol)
+    if last is None:
+        return "full"
+    today = np.datetime64(datetime.now(MARKET_TZ).date(), 'D')
+    return "compact" if np.busday_count(last, today) < COMPACT_BARS else "full"
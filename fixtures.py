@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import re
+import zlib
+
+import requests
+
+from stub_server import daily_series, news_articles
+
+# Recorded API responses for offline runs. A fixture directory holds raw
+# payloads as the services returned them:
+#   daily/<SYMBOL>.json   Alpha Vantage TIME_SERIES_DAILY
+#   news/<company>.json   NewsAPI /v2/everything for one quoted company
+#   twilio/message.json   a Messages.json create response
+# Requests for symbols or companies that were never recorded are answered from
+# a recorded one (picked by a stable hash of the name) with the name swapped in,
+# so a handful of recordings can stand in for thousands of tickers.
+
+FIXTURE_DIR = os.getenv('FIXTURE_DIR', 'fixtures')
+STOCK_ENDPOINT = "https://www.alphavantage.co/query"
+NEWS_ENDPOINT = "https://newsapi.org/v2/everything"
+
+TWILIO_TEMPLATE = {
+    "sid": "SM00000000000000000000000000000000",
+    "from": None,
+    "to": None,
+    "body": None,
+    "status": "queued",
+    "num_segments": "1",
+    "price": None,
+    "error_code": None,
+}
+
+
+def _slug(name):
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+def _pick(items, name):
+    return items[zlib.crc32(name.encode()) % len(items)]
+
+
+def _write(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(payload, file)
+
+
+def record(watchlist, directory=FIXTURE_DIR, stock_key=None, news_key=None):
+    # watchlist: symbol -> company name; calls the live services once per entry
+    for symbol, company in watchlist.items():
+        response = requests.get(STOCK_ENDPOINT, params={
+            "function": "TIME_SERIES_DAILY", "symbol": symbol, "outputsize": "compact", "apikey": stock_key,
+        }, timeout=30)
+        response.raise_for_status()
+        _write(os.path.join(directory, "daily", f"{symbol.upper()}.json"), response.json())
+        response = requests.get(NEWS_ENDPOINT, params={
+            "qInTitle": f'"{company}"', "sortBy": "publishedAt", "pageSize": 100, "apikey": news_key,
+        }, timeout=30)
+        response.raise_for_status()
+        # The company is kept so replays can swap another name into the titles
+        _write(os.path.join(directory, "news", f"{_slug(company)}.json"), dict(response.json(), company=company))
+    _write(os.path.join(directory, "twilio", "message.json"), TWILIO_TEMPLATE)
+
+
+def synthesize(directory, count=20, days=100):
+    # Stand-in recordings in the same layout, for machines without API keys
+    for i in range(count):
+        symbol, company = f"FIX{i}", f"Fixture Company {i}"
+        _write(os.path.join(directory, "daily", f"{symbol}.json"), {
+            "Meta Data": {"2. Symbol": symbol},
+            "Time Series (Daily)": daily_series(symbol, days),
+        })
+        articles = news_articles(f'"{company}"')
+        _write(os.path.join(directory, "news", f"{_slug(company)}.json"),
+               {"status": "ok", "totalResults": len(articles), "articles": articles, "company": company})
+    _write(os.path.join(directory, "twilio", "message.json"), TWILIO_TEMPLATE)
+
+
+class FixtureSet:
+    def __init__(self, directory=FIXTURE_DIR):
+        self.daily = {}
+        self.news = {}
+        for name in sorted(os.listdir(os.path.join(directory, "daily"))):
+            with open(os.path.join(directory, "daily", name)) as file:
+                self.daily[name[:-5].upper()] = json.load(file)
+        for name in sorted(os.listdir(os.path.join(directory, "news"))):
+            with open(os.path.join(directory, "news", name)) as file:
+                self.news[name[:-5]] = json.load(file)
+        with open(os.path.join(directory, "twilio", "message.json")) as file:
+            self.message = json.load(file)
+        if not self.daily or not self.news:
+            raise ValueError(f"No recorded responses under {directory}")
+        self.daily_names = sorted(self.daily)
+        self.news_names = sorted(self.news)
+
+    def daily_response(self, symbol):
+        symbol = symbol.upper()
+        payload = self.daily.get(symbol)
+        if payload is None:
+            payload = dict(self.daily[_pick(self.daily_names, symbol)])
+            payload["Meta Data"] = dict(payload.get("Meta Data", {}), **{"2. Symbol": symbol})
+        return payload
+
+    def news_response(self, query, page_size=100):
+        # Articles for every quoted company in the query, in query order
+        articles = []
+        for company in re.findall(r'"([^"]+)"', query) or [query]:
+            recorded = self.news.get(_slug(company))
+            if recorded is not None:
+                articles.extend(recorded.get("articles", []))
+                continue
+            template = self.news[_pick(self.news_names, company)]
+            original = template.get("company", "")
+            for article in template.get("articles", []):
+                article = dict(article)
+                # Titles must name the company for the per-company match in news.py
+                title = article.get("title") or ""
+                article["title"] = title.replace(original, company) if original and original in title \
+                    else f"{company}: {title}"
+                article["url"] = f"{article.get('url', '')}#{_slug(company)}"
+                articles.append(article)
+        articles = articles[:page_size]
+        return {"status": "ok", "totalResults": len(articles), "articles": articles}
+
+    def message_response(self, sid, sender, recipient, body):
+        return dict(self.message, sid=sid, **{"from": sender, "to": recipient, "body": body})
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    from watchlist import load_watchlist
+
+    parser = argparse.ArgumentParser(description="Record API responses for the stub server")
+    parser.add_argument("--out", default=FIXTURE_DIR)
+    parser.add_argument("--watchlist", help="CSV of Symbol,Company Name to record from the live APIs")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="write N generated recordings instead")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        synthesize(args.out, args.synthetic)
+    elif args.watchlist:
+        load_dotenv()
+        record(load_watchlist(args.watchlist), args.out, os.getenv('STOCK_API_KEY'), os.getenv('NEWS_API_KEY'))
+    else:
+        parser.error("pass --watchlist or --synthetic")
+    print(f"Fixtures written to {args.out}")
@@ -0,0 +1,88 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Task:
+    # Handed to a job running on a worker thread; report() and cancelled() are thread-safe
+    def __init__(self, key, events):
+        self.key = key
+        self.events = events
+        self.cancel_event = threading.Event()
+
+    def report(self, step, total, stage):
+        if self.cancel_event.is_set():
+            raise Cancelled(f"{self.key} cancelled")
+        self.events.put(("progress", self.key, (step, total, stage)))
+
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+
+class RequestWorker:
+    # Runs jobs off the Tk mainloop thread. Callbacks are delivered back on the
+    # Tk thread by polling a queue with root.after, since Tk is not thread-safe.
+    def __init__(self, root, max_workers=4, poll_ms=100):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.events = queue.Queue()
+        self.tasks = {}
+        self.root.after(self.poll_ms, self._poll)
+
+    def running(self):
+        return list(self.tasks)
+
+    def submit(self, key, job, on_progress=None, on_done=None, on_error=None):
+        # A second submit for the same key while the first is running is rejected
+        if key in self.tasks:
+            return False
+        task = Task(key, self.events)
+        self.tasks[key] = (task, on_progress, on_done, on_error)
+        self.pool.submit(self._run, task, job)
+        return True
+
+    def cancel(self, key):
+        entry = self.tasks.get(key)
+        if entry is None:
+            return False
+        entry[0].cancel_event.set()
+        return True
+
+    def shutdown(self):
+        for task, *_ in self.tasks.values():
+            task.cancel_event.set()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, task, job):
+        # Cancelling only stops a job at its next report(); once it has returned,
+        # its work is done and the result is delivered as it is
+        try:
+            result = job(task)
+            self.events.put(("done", task.key, result))
+        except Exception as e:
+            self.events.put(("error", task.key, e))
+
+    def _poll(self):
+        while True:
+            try:
+                kind, key, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            entry = self.tasks.get(key)
+            if entry is None:
+                continue
+            task, on_progress, on_done, on_error = entry
+            if kind == "progress":
+                if on_progress:
+                    on_progress(key, *payload)
+                continue
+            del self.tasks[key]
+            callback = on_done if kind == "done" else on_error
+            if callback:
+                callback(key, payload)
+        self.root.after(self.poll_ms, self._poll)
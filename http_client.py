@@ -0,0 +1,260 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import requests
+
+import metrics
+
+# Shared HTTP layer for the data providers. Every call has a deadline covering
+# all of its attempts, and each attempt's connect/read timeouts are capped by
+# what is left of it. Timeouts, connection errors, 5xx, 429 and Alpha Vantage's
+# throttle "Note" (sent with HTTP 200) are retried after a jittered backoff.
+# Each provider host has a circuit breaker: after a run of failures its calls
+# fail at once until a cool-down has passed and one trial call has succeeded,
+# so a provider that is down costs a cycle milliseconds instead of a timeout
+# per symbol. Sessions keep their connections alive, one per thread.
+
+CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05'))
+READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+# Budget for one call, retries included
+REQUEST_DEADLINE = float(os.getenv('HTTP_DEADLINE', '30'))
+MAX_ATTEMPTS = int(os.getenv('HTTP_MAX_ATTEMPTS', '3'))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+# Alpha Vantage's limits are per minute, so a throttled call waits longer before it is repeated
+THROTTLE_BACKOFF = float(os.getenv('HTTP_THROTTLE_BACKOFF', '12'))
+BREAKER_FAILURES = int(os.getenv('HTTP_BREAKER_FAILURES', '5'))
+BREAKER_RESET = float(os.getenv('HTTP_BREAKER_RESET', '30'))
+# A request still unanswered after this many seconds is sent a second time and
+# the first answer wins; 0 turns hedging off. Every hedge spends API quota.
+HEDGE_AFTER = float(os.getenv('HTTP_HEDGE_AFTER', '0'))
+HEDGE_WORKERS = 16
+
+# Phrases Alpha Vantage uses in "Note" / "Information" payloads when a key is over its limit
+THROTTLE_PHRASES = ("call frequency", "rate limit", "requests per")
+
+_local = threading.local()
+_clients = {}
+_clients_lock = threading.Lock()
+_hedge_pool = None
+
+
+class CircuitOpenError(requests.ConnectionError):
+    pass
+
+
+class DeadlineExceeded(requests.Timeout):
+    pass
+
+
+class ThrottledError(requests.RequestException):
+    pass
+
+
+class RetryableStatus(requests.HTTPError):
+    pass
+
+
+def session():
+    # requests sessions are not shared between threads, one keep-alive pool per worker
+    current = getattr(_local, "session", None)
+    if current is None:
+        current = _local.session = requests.Session()
+    return current
+
+
+def throttle_message(data):
+    # The provider's explanation when a 200 response is really a throttling refusal
+    if not isinstance(data, dict):
+        return None
+    if "Note" in data:
+        return data["Note"]
+    message = data.get("Information")
+    if isinstance(message, str) and any(phrase in message.lower() for phrase in THROTTLE_PHRASES):
+        return message
+    return None
+
+
+def backoff(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    # "Full jitter": anywhere up to the exponential step, so retries from many threads spread out
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    # closed: calls go through. open: calls fail fast for `reset_after` seconds.
+    # half-open: one trial call goes through; it closes the circuit or reopens it.
+    def __init__(self, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET):
+        self.failures = failures
+        self.reset_after = reset_after
+        self.lock = threading.Lock()
+        self.consecutive = 0
+        self.opened = None
+        self.trial = False
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened is None:
+                return 'closed'
+            if self.trial or time.monotonic() - self.opened >= self.reset_after:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        with self.lock:
+            if self.opened is None:
+                return True
+            if self.trial or time.monotonic() - self.opened < self.reset_after:
+                return False
+            self.trial = True
+            return True
+
+    def success(self):
+        with self.lock:
+            self.consecutive = 0
+            self.opened = None
+            self.trial = False
+
+    def failure(self):
+        # Returns True when this failure opened the circuit
+        with self.lock:
+            self.consecutive += 1
+            if not self.trial and (self.opened is not None or self.consecutive < self.failures):
+                return False
+            self.opened = time.monotonic()
+            self.trial = False
+            return True
+
+
+class HttpClient:
+    # One per provider host; see client()
+    def __init__(self, host, deadline=REQUEST_DEADLINE, max_attempts=MAX_ATTEMPTS, hedge_after=HEDGE_AFTER,
+                 breaker=None):
+        self.host = host
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker()
+
+    def get_json(self, url, params=None, limiter=None, deadline=None):
+        # deadline: a time.monotonic() value the whole call must finish by; the
+        # earlier of it and this client's own budget applies. Each attempt first
+        # takes a token from `limiter`, since every attempt spends provider quota.
+        end = time.monotonic() + self.deadline
+        if deadline is not None:
+            end = min(end, deadline)
+        for attempt in range(self.max_attempts):
+            # Waiting for a token and checking the deadline come before the
+            # breaker, so a call that never reaches the provider takes no trial
+            if limiter is not None:
+                with metrics.timer('rate_limit_wait'):
+                    acquired = limiter.acquire(timeout=max(0.0, end - time.monotonic()))
+                if not acquired:
+                    raise DeadlineExceeded(f"{self.host}: no rate-limit token before the deadline")
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"{self.host}: deadline passed")
+            if not self.breaker.allow():
+                metrics.count('circuit_rejected', api=self.host)
+                raise CircuitOpenError(f"{self.host}: circuit open after repeated failures")
+            # Every attempt let through settles the breaker, whatever way it ends;
+            # otherwise a half-open trial that raised would keep the circuit open for good
+            settled = False
+            try:
+                response = self._send(url, params, remaining)
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise RetryableStatus(f"HTTP {response.status_code} from {self.host}", response=response)
+                # Any other answer means the provider is up, even a 4xx for a bad request
+                if response.status_code >= 400:
+                    settled = True
+                    self.breaker.success()
+                    response.raise_for_status()
+                with metrics.timer('parse_json'):
+                    data = response.json()
+                message = throttle_message(data)
+                if message:
+                    metrics.count('api_throttled', api=self.host)
+                    raise ThrottledError(f"{self.host} throttled: {message}")
+                settled = True
+                self.breaker.success()
+                return data
+            # ValueError: a truncated or non-JSON body, usually a proxy or provider error page
+            except (requests.ConnectionError, requests.Timeout, RetryableStatus, ThrottledError, ValueError) as e:
+                settled = True
+                self._failure()
+                if isinstance(e, ThrottledError):
+                    delay = THROTTLE_BACKOFF * random.uniform(1.0, 1.5)
+                else:
+                    delay = backoff(attempt)
+                if attempt + 1 == self.max_attempts:
+                    raise
+                if time.monotonic() + delay >= end:
+                    raise DeadlineExceeded(f"{self.host}: no time left to retry after: {e}") from e
+                metrics.count('http_retries', api=self.host)
+                time.sleep(delay)
+            finally:
+                if not settled:
+                    self._failure()
+
+    def _failure(self):
+        if self.breaker.failure():
+            metrics.count('circuit_opened', api=self.host)
+
+    def _send(self, url, params, remaining):
+        timeout = (min(CONNECT_TIMEOUT, remaining), min(READ_TIMEOUT, remaining))
+        if not self.hedge_after or remaining <= self.hedge_after:
+            return self._request(url, params, timeout)
+        pool = hedge_pool()
+        first = pool.submit(self._request, url, params, timeout)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done:
+            return first.result()
+        metrics.count('hedged_requests', api=self.host)
+        pending = {first, pool.submit(self._request, url, params, timeout)}
+        error = None
+        # The first response wins; a failure only counts once both copies have failed
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except requests.RequestException as e:
+                    error = e
+        raise error
+
+    def _request(self, url, params, timeout):
+        with metrics.timer('fetch'):
+            response = session().get(url, params=params, timeout=timeout)
+        metrics.count('api_calls', api=self.host)
+        metrics.count('bytes_downloaded', len(response.content), api=self.host)
+        return response
+
+
+def hedge_pool():
+    global _hedge_pool
+    with _clients_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+        return _hedge_pool
+
+
+def client(url):
+    # The shared client (and circuit breaker) for the provider behind `url`
+    host = urlsplit(url).netloc
+    with _clients_lock:
+        current = _clients.get(host)
+        if current is None:
+            current = _clients[host] = HttpClient(host)
+        return current
+
+
+def configure(url, **options):
+    # Replaces the shared client for a provider, e.g. configure(NEWS_ENDPOINT, hedge_after=0.5)
+    host = urlsplit(url).netloc
+    with _clients_lock:
+        current = _clients[host] = HttpClient(host, **options)
+        return current
@@ -0,0 +1,288 @@
+import hashlib
+import math
+from collections import deque
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Column names match the feature block prediction_model.py used to build with pandas
+INDICATOR_COLUMNS = ['Prev Close', '50 Day MA', '200 Day MA', 'RSI', '20 Day MA',
+                     '20 Day StdDev', 'Upper Band', 'Lower Band', 'Volume Change']
+
+MA_WINDOWS = (50, 200)
+RSI_WINDOW = 14
+BAND_WINDOW = 20
+BAND_WIDTH = 2
+
+# Model inputs: a subset of the indicators plus the weekday of the bar
+FEATURES = ['Prev Close', '50 Day MA', '200 Day MA', 'RSI', 'Upper Band',
+            'Lower Band', 'Day of Week', 'Volume Change']
+
+
+# Earlier bars one new value of each column depends on, for incremental updates
+FEATURE_LOOKBACK = {'Prev Close': 1, 'RSI': RSI_WINDOW, '20 Day MA': BAND_WINDOW, '20 Day StdDev': BAND_WINDOW,
+                    'Upper Band': BAND_WINDOW, 'Lower Band': BAND_WINDOW, 'Volume Change': 1, 'Day of Week': 0,
+                    **{f'{window} Day MA': window for window in MA_WINDOWS}}
+
+
+def feature_hash(features=FEATURES):
+    # Changes whenever the feature list or an indicator window changes
+    spec = repr((features, MA_WINDOWS, RSI_WINDOW, BAND_WINDOW, BAND_WIDTH))
+    return hashlib.sha1(spec.encode()).hexdigest()[:12]
+
+
+class RollingMean:
+    # Running sum over a fixed window; nan until the window is full
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+
+    def update(self, x):
+        self.values.append(x)
+        self.total += x
+        if len(self.values) > self.window:
+            self.total -= self.values.popleft()
+        return self.total / self.window if len(self.values) == self.window else math.nan
+
+
+class RollingStd:
+    # Welford mean/variance over a sliding window (add the new value, drop the oldest)
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, x):
+        self.values.append(x)
+        if len(self.values) <= self.window:
+            n = len(self.values)
+            delta = x - self.mean
+            self.mean += delta / n
+            self.m2 += delta * (x - self.mean)
+        else:
+            old = self.values.popleft()
+            old_mean = self.mean
+            self.mean += (x - old) / self.window
+            self.m2 += (x - old) * (x - self.mean + old - old_mean)
+        if len(self.values) < self.window:
+            return self.mean, math.nan
+        return self.mean, math.sqrt(max(self.m2, 0.0) / (self.window - 1))
+
+
+class RollingRSI:
+    # "sma" averages gains/losses over the window like the original pandas code;
+    # "wilder" uses Wilder's exponential smoothing seeded with that first average
+    def __init__(self, window=RSI_WINDOW, smoothing='sma'):
+        if smoothing not in ('sma', 'wilder'):
+            raise ValueError(f"Unknown RSI smoothing: {smoothing}")
+        self.window = window
+        self.smoothing = smoothing
+        self.gains = RollingMean(window)
+        self.losses = RollingMean(window)
+        self.avg_gain = self.avg_loss = math.nan
+        self.prev = None
+
+    def update(self, close):
+        # The first bar has no delta and counts as zero gain and zero loss
+        delta = 0.0 if self.prev is None else close - self.prev
+        self.prev = close
+        gain, loss = max(delta, 0.0), max(-delta, 0.0)
+        if self.smoothing == 'wilder' and not math.isnan(self.avg_gain):
+            self.avg_gain += (gain - self.avg_gain) / self.window
+            self.avg_loss += (loss - self.avg_loss) / self.window
+        else:
+            self.avg_gain = self.gains.update(gain)
+            self.avg_loss = self.losses.update(loss)
+        return rsi_from_averages(self.avg_gain, self.avg_loss)
+
+
+def rsi_from_averages(avg_gain, avg_loss):
+    if math.isnan(avg_gain) or math.isnan(avg_loss) or (avg_gain == 0 and avg_loss == 0):
+        return math.nan
+    if avg_loss == 0:
+        return 100.0
+    return 100 - 100 / (1 + avg_gain / avg_loss)
+
+
+class IndicatorState:
+    # O(1) per-bar state for one symbol
+    def __init__(self, rsi_smoothing='sma'):
+        self.moving_averages = [RollingMean(window) for window in MA_WINDOWS]
+        self.rsi = RollingRSI(RSI_WINDOW, rsi_smoothing)
+        self.band = RollingStd(BAND_WINDOW)
+        self.prev_close = math.nan
+        self.prev_volume = math.nan
+
+    def update(self, close, volume=math.nan):
+        close, volume = float(close), float(volume)
+        ma_50, ma_200 = (ma.update(close) for ma in self.moving_averages)
+        band_mean, band_std = self.band.update(close)
+        band_ma = band_mean if not math.isnan(band_std) else math.nan
+        if self.prev_volume == 0:
+            volume_change = math.nan if volume == 0 else math.copysign(math.inf, volume)
+        else:
+            volume_change = volume / self.prev_volume - 1
+        row = {
+            'Prev Close': self.prev_close,
+            '50 Day MA': ma_50,
+            '200 Day MA': ma_200,
+            'RSI': self.rsi.update(close),
+            '20 Day MA': band_ma,
+            '20 Day StdDev': band_std,
+            'Upper Band': band_ma + band_std * BAND_WIDTH,
+            'Lower Band': band_ma - band_std * BAND_WIDTH,
+            'Volume Change': volume_change,
+        }
+        self.prev_close, self.prev_volume = close, volume
+        return row
+
+
+class IndicatorEngine:
+    def __init__(self, rsi_smoothing='sma'):
+        self.rsi_smoothing = rsi_smoothing
+        self.states = {}
+
+    def update(self, symbol, close, volume=math.nan):
+        state = self.states.get(symbol)
+        if state is None:
+            state = self.states[symbol] = IndicatorState(self.rsi_smoothing)
+        return state.update(close, volume)
+
+    def warm_up(self, symbol, closes, volumes=None):
+        # Replay stored history to seed the state; returns the last row
+        row = None
+        if volumes is None:
+            volumes = [math.nan] * len(closes)
+        for close, volume in zip(closes, volumes):
+            row = self.update(symbol, close, volume)
+        return row
+
+
+def _shift(values, periods=1):
+    shifted = np.full_like(values, np.nan)
+    shifted[:, periods:] = values[:, :-periods]
+    return shifted
+
+
+def rolling_mean(values, window):
+    # Cumulative sums over a (symbols x days) array; a window containing nan
+    # (e.g. padding before a symbol's first bar) stays nan like pandas
+    valid = ~np.isnan(values)
+    sums = np.cumsum(np.where(valid, values, 0.0), axis=1)
+    counts = np.cumsum(valid, axis=1)
+    sums = np.concatenate([np.zeros((values.shape[0], 1)), sums], axis=1)
+    counts = np.concatenate([np.zeros((values.shape[0], 1), dtype=counts.dtype), counts], axis=1)
+    out = np.full(values.shape, np.nan)
+    if values.shape[1] >= window:
+        full = counts[:, window:] - counts[:, :-window] == window
+        means = (sums[:, window:] - sums[:, :-window]) / window
+        out[:, window - 1:] = np.where(full, means, np.nan)
+    return out
+
+
+def rolling_std(values, window):
+    out = np.full(values.shape, np.nan)
+    if values.shape[1] >= window:
+        out[:, window - 1:] = sliding_window_view(values, window, axis=1).std(axis=-1, ddof=1)
+    return out
+
+
+def compute_indicators(closes, volumes=None, rsi_smoothing='sma'):
+    # Batched path: every indicator for a (symbols x days) array in one call.
+    # Rows may be left-padded with nan for symbols with shorter histories.
+    closes = np.atleast_2d(np.asarray(closes, dtype=float))
+    result = {'Prev Close': _shift(closes)}
+    for window in MA_WINDOWS:
+        result[f'{window} Day MA'] = rolling_mean(closes, window)
+    result['RSI'] = _rsi(closes, rsi_smoothing)
+
+    band_ma = rolling_mean(closes, BAND_WINDOW)
+    band_std = rolling_std(closes, BAND_WINDOW)
+    result['20 Day MA'] = band_ma
+    result['20 Day StdDev'] = band_std
+    result['Upper Band'] = band_ma + band_std * BAND_WIDTH
+    result['Lower Band'] = band_ma - band_std * BAND_WIDTH
+    result['Volume Change'] = _volume_change(volumes, closes.shape)
+    return result
+
+
+def feature_version(name):
+    # Hash of what one column's values depend on, so changing a window only invalidates that column
+    if name not in FEATURE_LOOKBACK:
+        raise ValueError(f"Unknown feature: {name}")
+    params = {
+        'RSI': (RSI_WINDOW,),
+        '20 Day MA': (BAND_WINDOW,),
+        '20 Day StdDev': (BAND_WINDOW,),
+        'Upper Band': (BAND_WINDOW, BAND_WIDTH),
+        'Lower Band': (BAND_WINDOW, BAND_WIDTH),
+    }.get(name, ())
+    return hashlib.sha1(repr((name, params)).encode()).hexdigest()[:12]
+
+
+def day_of_week(days):
+    # Monday is 0 like pandas' dayofweek; 1970-01-01 was a Thursday. days: a
+    # date, or day numbers (days since 1970-01-01), scalar or array
+    return (np.asarray(days, dtype='datetime64[D]').astype(np.int64) + 3) % 7
+
+
+def compute_feature(name, closes, volumes=None, days=None):
+    # One column of compute_indicators, or 'Day of Week' from day numbers
+    # (days since 1970-01-01), for a (symbols x days) array
+    closes = np.atleast_2d(np.asarray(closes, dtype=float))
+    if name == 'Prev Close':
+        return _shift(closes)
+    if name.endswith(' Day MA') and int(name.split()[0]) in MA_WINDOWS:
+        return rolling_mean(closes, int(name.split()[0]))
+    if name == 'RSI':
+        return _rsi(closes)
+    if name in ('20 Day MA', '20 Day StdDev', 'Upper Band', 'Lower Band'):
+        band_ma = rolling_mean(closes, BAND_WINDOW)
+        if name == '20 Day MA':
+            return band_ma
+        band_std = rolling_std(closes, BAND_WINDOW)
+        if name == '20 Day StdDev':
+            return band_std
+        return band_ma + band_std * BAND_WIDTH * (1 if name == 'Upper Band' else -1)
+    if name == 'Volume Change':
+        return _volume_change(volumes, closes.shape)
+    if name == 'Day of Week':
+        return day_of_week(np.atleast_2d(np.asarray(days, dtype=np.int64))).astype(float)
+    raise ValueError(f"Unknown feature: {name}")
+
+
+def _rsi(closes, rsi_smoothing='sma'):
+    delta = closes - _shift(closes)
+    gains = np.where(delta > 0, delta, 0.0)
+    losses = np.where(delta < 0, -delta, 0.0)
+    # RSI needs RSI_WINDOW real closes, so padding never produces an early value
+    has_history = ~np.isnan(rolling_mean(closes, RSI_WINDOW))
+    avg_gain = np.where(has_history, rolling_mean(gains, RSI_WINDOW), np.nan)
+    avg_loss = np.where(has_history, rolling_mean(losses, RSI_WINDOW), np.nan)
+    if rsi_smoothing == 'wilder':
+        avg_gain, avg_loss = _wilder(avg_gain, gains), _wilder(avg_loss, losses)
+    elif rsi_smoothing != 'sma':
+        raise ValueError(f"Unknown RSI smoothing: {rsi_smoothing}")
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100 - 100 / (1 + avg_gain / avg_loss)
+
+
+def _volume_change(volumes, shape):
+    if volumes is None:
+        return np.full(shape, np.nan)
+    volumes = np.atleast_2d(np.asarray(volumes, dtype=float))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return volumes / _shift(volumes) - 1
+
+
+def _wilder(seed, values):
+    # Recursive smoothing runs along days but stays vectorized across symbols
+    out = np.full(seed.shape, np.nan)
+    current = np.full(seed.shape[0], np.nan)
+    for day in range(seed.shape[1]):
+        started = ~np.isnan(current)
+        current = np.where(started, current + (values[:, day] - current) / RSI_WINDOW, seed[:, day])
+        out[:, day] = current
+    return out
@@ -0,0 +1,277 @@
+import argparse
+import csv
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import requests
+
+import http_client
+import metrics
+from fetch_cache import ERROR_KEYS, MARKET_TZ, market_is_open
+from rate_limit import RateLimiter
+from subscriptions import DEFAULT_RECIPIENT, SubscriptionRegistry, alert_section, digest_messages
+from watchlist import STOCK_API_RATE, STOCK_ENDPOINT
+
+# Intraday alerts. Minute bars come from TIME_SERIES_INTRADAY, polled a couple
+# of seconds after each bar closes, or from a replay file. Each symbol keeps its
+# last `window` closes in a bounded deque, and an alert fires the moment the move
+# across the window crosses the threshold. It re-arms once the move falls back
+# below half the threshold. A poll asks for the compact response (latest 100
+# bars) and only bars newer than the last one seen are parsed.
+
+INTERVALS = {'1min': 60, '5min': 300, '15min': 900, '30min': 1800, '60min': 3600}
+INTRADAY_INTERVAL = os.getenv('INTRADAY_INTERVAL', '1min')
+INTRADAY_WINDOW = int(os.getenv('INTRADAY_WINDOW', '15'))
+INTRADAY_THRESHOLD = float(os.getenv('INTRADAY_THRESHOLD', '1.0'))
+# Seconds after a bar's close before polling, so the provider has published it
+POLL_DELAY = float(os.getenv('INTRADAY_POLL_DELAY', '2'))
+REARM_FRACTION = 0.5
+
+REPLAY_COLUMNS = ['Timestamp', 'Symbol', 'Open', 'High', 'Low', 'Close', 'Volume']
+
+# start: the provider's bar label (market time); closed_at: epoch seconds the bar was final
+IntradayBar = namedtuple('IntradayBar', ['symbol', 'start', 'open', 'high', 'low', 'close', 'volume', 'closed_at'])
+IntradayAlert = namedtuple('IntradayAlert', ['symbol', 'move', 'bars', 'bar'])
+
+
+def bar_close_time(start, interval_seconds):
+    # "2024-01-02 10:31:00" is the bar that opens then and is final a full interval later
+    opened = datetime.strptime(start, "%Y-%m-%d %H:%M:%S").replace(tzinfo=MARKET_TZ)
+    return opened.timestamp() + interval_seconds
+
+
+class IntradayMonitor:
+    def __init__(self, window=INTRADAY_WINDOW, threshold=INTRADAY_THRESHOLD, interval=INTRADAY_INTERVAL):
+        self.window = window
+        self.threshold = threshold
+        self.interval = interval
+        self.closes = {}
+        self.armed = {}
+
+    def update(self, bar):
+        # O(1) per bar; returns an IntradayAlert when this bar takes the move across the threshold
+        closes = self.closes.get(bar.symbol)
+        if closes is None:
+            closes = self.closes[bar.symbol] = deque(maxlen=self.window + 1)
+        closes.append(bar.close)
+        if len(closes) < 2:
+            return None
+        move = (bar.close / closes[0] - 1) * 100
+        if abs(move) >= self.threshold:
+            if self.armed.get(bar.symbol, True):
+                self.armed[bar.symbol] = False
+                return IntradayAlert(bar.symbol, move, len(closes) - 1, bar)
+        elif abs(move) < self.threshold * REARM_FRACTION:
+            self.armed[bar.symbol] = True
+        return None
+
+    def describe(self, alert):
+        minutes = alert.bars * INTERVALS[self.interval] // 60
+        arrow = "⬆️" if alert.move > 0 else "⬇️"
+        return f"{alert.symbol}: {arrow}{abs(alert.move):.1f}% in {minutes} min, {alert.bar.close:g} at {alert.bar.start[11:16]}"
+
+
+class AlphaVantageFeed:
+    # Yields the bars that closed since the previous poll, one list per bar interval
+    def __init__(self, symbols, api_key, interval=INTRADAY_INTERVAL, limiter=None, endpoint=STOCK_ENDPOINT,
+                 max_workers=8, poll_delay=POLL_DELAY, market_hours_only=True):
+        self.symbols = list(symbols)
+        self.api_key = api_key
+        self.interval = interval
+        self.seconds = INTERVALS[interval]
+        self.limiter = limiter if limiter is not None else RateLimiter(STOCK_API_RATE)
+        self.endpoint = endpoint
+        self.max_workers = max_workers
+        self.poll_delay = poll_delay
+        self.market_hours_only = market_hours_only
+        self.last = {}
+
+    def fetch(self, symbol, now=None, deadline=None):
+        params = {
+            "function": "TIME_SERIES_INTRADAY",
+            "symbol": symbol,
+            "interval": self.interval,
+            "outputsize": "compact",
+            "apikey": self.api_key,
+        }
+        data = http_client.client(self.endpoint).get_json(self.endpoint, params, self.limiter, deadline)
+        for key in ERROR_KEYS:
+            if key in data:
+                metrics.count('api_errors', api=urlsplit(self.endpoint).netloc)
+                raise ValueError(f"Alpha Vantage: {data[key]}")
+        return self.new_bars(symbol, data.get(f"Time Series ({self.interval})", {}), now)
+
+    def new_bars(self, symbol, series, now=None):
+        # Only labels after the last one taken are parsed, and a bar still forming is left for the next poll
+        now = time.time() if now is None else now
+        last = self.last.get(symbol, "")
+        bars = []
+        for start in sorted(label for label in series if label > last):
+            closed_at = bar_close_time(start, self.seconds)
+            if closed_at > now:
+                break
+            entry = series[start]
+            bars.append(IntradayBar(symbol, start, float(entry["1. open"]), float(entry["2. high"]),
+                                    float(entry["3. low"]), float(entry["4. close"]),
+                                    int(float(entry["5. volume"])), closed_at))
+        if bars:
+            self.last[symbol] = bars[-1].start
+        return bars
+
+    def poll(self):
+        # A poll gives up on symbols still outstanding when the next bar is due
+        deadline = time.monotonic() + self.seconds
+        bars = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self.fetch, symbol, None, deadline): symbol for symbol in self.symbols}
+            for future in as_completed(futures):
+                try:
+                    bars.extend(future.result())
+                except (requests.RequestException, ValueError) as e:
+                    print(f"{futures[future]}: API request error: {e}")
+        bars.sort(key=lambda bar: bar.closed_at)
+        return bars
+
+    def __iter__(self):
+        # The first poll runs at once to fill the windows; later ones just after each bar boundary
+        due = time.time()
+        while True:
+            time.sleep(max(0.0, due - time.time()))
+            if not self.market_hours_only or market_is_open():
+                yield self.poll()
+            due = (time.time() // self.seconds + 1) * self.seconds + self.poll_delay
+
+
+class ReplayFeed:
+    # Bars from a Timestamp,Symbol,Open,High,Low,Close,Volume file in time order. Each
+    # timestamp's bars arrive together, `speed` times faster than real time (0: no waiting),
+    # and count as closed the moment they arrive.
+    def __init__(self, path, speed=0.0):
+        self.path = path
+        self.speed = speed
+
+    def __iter__(self):
+        previous = None
+        batch = []
+        with open(self.path, newline='') as file:
+            for row in csv.DictReader(file):
+                if batch and row['Timestamp'] != batch[0][0]:
+                    previous = yield from self._deliver(batch, previous)
+                    batch = []
+                batch.append((row['Timestamp'], row))
+        if batch:
+            yield from self._deliver(batch, previous)
+
+    def _deliver(self, batch, previous):
+        start = batch[0][0]
+        opened = datetime.strptime(start, "%Y-%m-%d %H:%M:%S").timestamp()
+        if previous is not None and self.speed > 0:
+            time.sleep(max(0.0, (opened - previous) / self.speed))
+        now = time.time()
+        yield [IntradayBar(row['Symbol'].upper(), start, float(row['Open']), float(row['High']), float(row['Low']),
+                           float(row['Close']), int(float(row['Volume'])), now) for _, row in batch]
+        return opened
+
+
+class ReplayRecorder:
+    # Appends every bar a live feed yields, so a session can be replayed later
+    def __init__(self, path):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.writer(self.file)
+        if new:
+            self.writer.writerow(REPLAY_COLUMNS)
+
+    def write(self, bars):
+        for bar in bars:
+            self.writer.writerow([bar.start, bar.symbol, bar.open, bar.high, bar.low, bar.close, bar.volume])
+        self.file.flush()
+
+
+def run_intraday(feed, monitor, registry, dispatcher=None, recorder=None, stale_after=None):
+    # Feeds every batch through the monitor and texts each subscriber one digest per batch.
+    # Bars more than an interval old when they arrive (the first poll's backlog) only warm the windows.
+    stale_after = stale_after if stale_after is not None else INTERVALS[monitor.interval]
+    for bars in feed:
+        received = time.time()
+        if recorder is not None:
+            recorder.write(bars)
+        alerts = []
+        with metrics.timer('detect'):
+            for bar in bars:
+                alert = monitor.update(bar)
+                if alert is not None and received - bar.closed_at <= stale_after:
+                    alerts.append(alert)
+        metrics.count('bars_processed', len(bars))
+        if not alerts:
+            continue
+        metrics.count('alerts_fired', len(alerts))
+        digests = {}
+        for alert in alerts:
+            section = alert_section(monitor.describe(alert), [])
+            for phone in registry.subscribers(alert.symbol):
+                digests.setdefault(phone, []).append(section)
+        detected = time.time()
+        for alert in alerts:
+            metrics.observe('alert_latency_seconds', detected - alert.bar.closed_at, stage='detect')
+        if dispatcher is None:
+            for alert in alerts:
+                print(monitor.describe(alert))
+            continue
+        for phone, sections in sorted(digests.items()):
+            for body in digest_messages(sections):
+                dispatcher.outbox.enqueue('TWILIO_ACC_NUMBER', phone, body)
+        print("Outbox:", dispatcher.flush())
+        sent = time.time()
+        for alert in alerts:
+            metrics.observe('alert_latency_seconds', sent - alert.bar.closed_at, stage='sent')
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    from watchlist import load_watchlist
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Intraday threshold alerts from minute bars")
+    parser.add_argument("--watchlist", help="CSV of Symbol,Company Name; alerts go to ALERT_PHONE")
+    parser.add_argument("--subscriptions", metavar="CSV", help="Phone,Symbol,Company Name,Rules subscribers")
+    parser.add_argument("--interval", default=INTRADAY_INTERVAL, choices=sorted(INTERVALS, key=INTERVALS.get))
+    parser.add_argument("--window", type=int, default=INTRADAY_WINDOW, help="bars the move is measured over")
+    parser.add_argument("--threshold", type=float, default=INTRADAY_THRESHOLD, help="percent move that alerts")
+    parser.add_argument("--replay", metavar="CSV", help="read bars from a Timestamp,Symbol,OHLCV file instead")
+    parser.add_argument("--speed", type=float, default=0.0, help="replay speed-up (0 replays without waiting)")
+    parser.add_argument("--record", metavar="CSV", help="append every polled bar to a replay file")
+    parser.add_argument("--any-time", action="store_true", help="poll outside regular market hours too")
+    parser.add_argument("--dry-run", action="store_true", help="print alerts instead of sending SMS")
+    parser.add_argument("--metrics-json", default=metrics.METRICS_JSON, metavar="PATH")
+    args = parser.parse_args()
+
+    # Daily rule specs in the subscriptions don't apply here; every subscriber of a symbol gets its alerts
+    registry = SubscriptionRegistry.load(args.subscriptions) if args.subscriptions else SubscriptionRegistry()
+    if args.watchlist:
+        registry.add_watchlist(load_watchlist(args.watchlist), DEFAULT_RECIPIENT)
+    if args.replay:
+        feed = ReplayFeed(args.replay, args.speed)
+    elif registry.watchlist():
+        feed = AlphaVantageFeed(registry.watchlist(), os.getenv('STOCK_API_KEY'), args.interval,
+                                market_hours_only=not args.any_time)
+    else:
+        parser.error("pass --watchlist, --subscriptions or --replay")
+
+    dispatcher = None
+    if not args.dry_run:
+        from notifier import TwilioDispatcher
+        dispatcher = TwilioDispatcher(os.getenv('TWILIO_SID'), os.getenv('TWILIO_AUTH_TOKEN'))
+    monitor = IntradayMonitor(args.window, args.threshold, args.interval)
+    try:
+        run_intraday(feed, monitor, registry, dispatcher, ReplayRecorder(args.record) if args.record else None)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(metrics.METRICS.summary())
+        metrics.finish(args.metrics_json)
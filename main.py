@@ -1,11 +1,16 @@
 import requests
-from twilio.rest import Client
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+import math
 import os
 from dotenv import load_dotenv
-from datetime import datetime
-import csv
+import argparse
+
+from alert_rules import DEFAULT_CHANGE_PCT, AlertIndex, parse_rules
+from bars import daily_bars
+import metrics
+from fetch_cache import cached_get_json, daily_outputsize, daily_ttl
+from ohlcv_store import OHLCVStore
+from subscriptions import DEFAULT_RECIPIENT, SubscriptionRegistry, alert_section, digest_messages
+from watchlist import cycle_deadline, load_watchlist, scan_watchlist
 
 #load environment variables 
 load_dotenv()
@@ -14,14 +19,57 @@ load_dotenv()
 STOCK_NAME = "TSLA" 
 COMPANY_NAME = "Tesla Inc" 
 
-STOCK_ENDPOINT = "https://www.alphavantage.co/query"
-NEWS_ENDPOINT = "https://newsapi.org/v2/everything"
+STOCK_ENDPOINT = os.getenv('STOCK_ENDPOINT', "https://www.alphavantage.co/query")
 
 News_api = os.getenv('NEWS_API_KEY')
 Stock_api = os.getenv('STOCK_API_KEY')
 twilio_SID = os.getenv('TWILIO_SID')
 AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
 
+# Skip plotting entirely on hosts without a display
+HEADLESS = os.getenv('HEADLESS', '') not in ('', '0')
+
+store = OHLCVStore()
+_news_stage = None
+
+
+def get_news_stage():
+    # Created on first use so runs that never alert don't open the seen-article index
+    global _news_stage
+    if _news_stage is None:
+        from news import NewsStage, SeenArticles
+        _news_stage = NewsStage(News_api, SeenArticles())
+    return _news_stage
+
+
+_online_models = None
+
+
+def get_online_models():
+    # Kept for the life of the process so a daemon scores from models already in memory
+    global _online_models
+    if _online_models is None:
+        from online_model import OnlineModels
+        _online_models = OnlineModels()
+    return _online_models
+
+
+def direction_suffix(symbol):
+    # The model catches up on the new bar here; a failure never blocks the alert
+    from online_model import direction_text
+    try:
+        return direction_text(get_online_models().probability(symbol, store))
+    except Exception as e:
+        print(f"{symbol}: No direction estimate: {e}")
+        return ""
+
+
+def new_dispatcher():
+    # The notifier (and its outbox) only loads when an alert actually goes out
+    from notifier import TwilioDispatcher
+    return TwilioDispatcher(twilio_SID, AUTH_TOKEN)
+
+
 #key parameters 
 Stock_params = {
     "function": "Time_Series_Daily",
@@ -29,94 +77,212 @@ Stock_params = {
     "apikey": Stock_api,
 }
 
-NEWS_params = {
-    "apikey": News_api,
-    "qInTitle": COMPANY_NAME,
-}
+def plot_history(symbol, chart_dir=None):
+    # matplotlib costs more to import than the rest of a run, so it loads here
+    from charts import ChartRenderer, render_symbols
 
-try:
-    response = requests.get(STOCK_ENDPOINT, params=Stock_params)
-    response.raise_for_status()
-    data = response.json()
-
-    print("api response",data)
-
-    data_list=[value for(key,value)in sorted(data.get("Time Series (Daily)", {}).items(), reverse=True)]
-
- # Write stock data to CSV
-    with open('stock_data.csv', mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(['Date', 'Open', 'High', 'Low', 'Close', 'Volume'])
-        
-        for date, entry in sorted(data.get("Time Series (Daily)", {}).items()):
-            writer.writerow([
-                date,
-                entry.get("1. open"),
-                entry.get("2. high"),
-                entry.get("3. low"),
-                entry.get("4. close"),
-                entry.get("5. volume"),
-            ])
-    
-    if len(data_list) < 2:
-        raise ValueError("Not enough data to compare stock prices.")
-
-    yesterdaydata = data_list[0]
-    day_before_yesterday = data_list[1]
-
-    yesterdaydataprice = float(yesterdaydata["4. close"])
-    day_before_yesterday_price = float(day_before_yesterday["4. close"])
-
-    positive_difference = yesterdaydataprice - day_before_yesterday_price
-    up_down = "⬆️" if positive_difference > 0 else "⬇️"
-    diff_percent = round((positive_difference / day_before_yesterday_price) * 100)
-
-    if abs(diff_percent) > 1:
-        # Fetch news articles
-        news = requests.get(NEWS_ENDPOINT, params=NEWS_params)
-        news.raise_for_status()
-        articles = news.json().get("articles", [])[:3]
-
-        new_news = [f"{STOCK_NAME}: {up_down}{diff_percent}%\nHeadline: {article['title']}. \n Brief: {article['description']}" for article in articles]
-
-        # Send messages
-        client = Client(twilio_SID, AUTH_TOKEN)
-        for article in new_news:
-            message = client.messages.create(
-                from_='TWILIO_ACC_NUMBER',
-                body=article,
-                to='YOUR_REAL_NUMBER'
-            )
-
-    # Read data from CSV and plot
-    dates = []
-    closes = []
-    
-    with open('stock_data.csv', mode='r') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            dates.append(datetime.strptime(row['Date'], '%Y-%m-%d'))
-            closes.append(float(row['Close']))
-
-    plt.figure(figsize=(12, 6))
-    plt.plot(dates, closes, marker='o', linestyle='-', color='b')
-    plt.xlabel('Date')
-    plt.ylabel('Closing Price')
-    plt.title(f'{STOCK_NAME} Stock Prices')
-    
-    # Formatting the x-axis
-    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
-    plt.gca().xaxis.set_major_locator(mdates.MonthLocator())
-    plt.gca().xaxis.set_minor_locator(mdates.WeekdayLocator())
-    plt.xticks(rotation=45)
-    
+    # With a chart directory the chart is written off-screen instead of shown
+    if chart_dir:
+        paths, errors = render_symbols([symbol], chart_dir, max_workers=1, store_root=store.root)
+        for e in errors.values():
+            print(f"Chart not rendered: {e}")
+        return paths.get(symbol.upper())
+
+    import matplotlib.pyplot as plt
+
+    bars = store.read(symbol)
+    renderer = ChartRenderer(plt.figure(figsize=(12, 6)))
+    renderer.draw(symbol, bars.dates, bars.close)
     plt.tight_layout()
-    plt.grid(True)
     plt.show()
 
-except requests.RequestException as e:
-    print(f"API request error: {e}")
-except ValueError as e:
-    print(e)
-except Exception as e:
-    print(f"An error occurred: {e}")
+def check_stock(headless=HEADLESS, chart_dir=None):
+    try:
+        Stock_params["outputsize"] = daily_outputsize(STOCK_NAME, store)
+        bars = cached_get_json(STOCK_ENDPOINT, Stock_params, daily_ttl, decode=daily_bars)
+
+        print("api response", bars)
+
+        # Only bars newer than the stored ones are written (and a changed last bar)
+        new_bars = store.append(STOCK_NAME, bars)
+        print(f"Stored {new_bars} new bars for {STOCK_NAME}")
+
+        positive_difference, diff_percent = bars.latest_change()
+        up_down = "⬆️" if positive_difference > 0 else "⬇️"
+
+        # Exact threshold on the unrounded move; rounding is only for the message
+        if abs(diff_percent) >= DEFAULT_CHANGE_PCT:
+            diff_percent = round(diff_percent)
+            # Articles already sent on an earlier run are skipped
+            articles = get_news_stage().articles(COMPANY_NAME)
+
+            direction = direction_suffix(STOCK_NAME)
+            # All fresh headlines go out as one digest
+            section = alert_section(f"{STOCK_NAME}: {up_down}{diff_percent}%", articles, direction)
+            new_news = digest_messages([section]) if articles else []
+
+            # Send messages
+            print("Outbox:", new_dispatcher().send(new_news, DEFAULT_RECIPIENT))
+
+        if chart_dir or not headless:
+            plot_history(STOCK_NAME, chart_dir)
+
+    except requests.RequestException as e:
+        print(f"API request error: {e}")
+    except ValueError as e:
+        print(e)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+
+def alert_cycle(watchlist, rules, limiter=None, index=None, dispatcher=None, shards=1, registry=None,
+                deadline=None):
+    # watchlist: symbol -> company name, the symbols scanned this cycle. Alerts go
+    # to the subscribers in `registry`; without one, every symbol goes to
+    # DEFAULT_RECIPIENT on `rules`. A long-running caller passes its own
+    # limiter, index and dispatcher so quota, history and connections carry over.
+    # With shards > 1 the scan and rules run in worker processes (limiter must then
+    # be a ProcessRateLimiter, or None for a fresh one). Price fetches still
+    # outstanding at `deadline` (default: CYCLE_DEADLINE from now) are given up.
+    if deadline is None:
+        deadline = cycle_deadline()
+    if registry is None:
+        registry = SubscriptionRegistry(rules)
+        registry.add_watchlist(watchlist, DEFAULT_RECIPIENT)
+    # Each distinct rule any subscriber uses runs once over all symbols
+    rules = registry.rules(watchlist)
+    probabilities = None
+    if shards > 1:
+        from sharded import sharded_scan
+        with metrics.timer('scan'):
+            moves, probabilities = sharded_scan(watchlist, rules, shards, limiter, Stock_api, deadline,
+                                                store.root)
+    else:
+        moves = scan_moves(watchlist, rules, limiter, index, deadline)
+    # Subscribers' own rules pick their symbols first, so headlines are only
+    # looked up (and later marked sent) for symbols someone will be alerted on
+    matched = {}
+    for phone, symbol, fired in registry.matches(moves):
+        matched.setdefault(symbol, []).append((phone, fired))
+    if not matched:
+        return {}
+    dispatcher = dispatcher or new_dispatcher()
+    # One OR-combined news query per batch of the matched companies
+    news_stage = get_news_stage()
+    try:
+        prefetched = news_stage.fetch(watchlist[symbol] for symbol in sorted(matched))
+    except requests.RequestException as e:
+        print(f"News fetch failed, querying per symbol: {e}")
+        prefetched = None
+
+    # Headlines and the direction estimate are looked up once per symbol, however many users watch it
+    notes = {}
+    for symbol in sorted(matched):
+        try:
+            articles = news_stage.articles(watchlist[symbol], prefetched, mark=False)
+            if not articles:
+                continue
+            if probabilities is not None:
+                # Scored in the shard that fetched the symbol
+                from online_model import direction_text
+                direction = direction_text(probabilities.get(symbol, math.nan))
+            else:
+                direction = direction_suffix(symbol)
+            notes[symbol] = (articles, direction)
+        except requests.RequestException as e:
+            print(f"{symbol}: API request error: {e}")
+        except Exception as e:
+            print(f"{symbol}: An error occurred: {e}")
+
+    # One digest per user with a section for each of their symbols
+    digests = {}
+    for symbol, subscribers in sorted(matched.items()):
+        if symbol not in notes:
+            continue
+        for phone, fired in subscribers:
+            descriptions = dict.fromkeys(rule.describe(value) for rule, value in fired)
+            digests.setdefault(phone, []).append(
+                alert_section(f"{symbol}: {', '.join(descriptions)}", *notes[symbol]))
+    metrics.count('digests', len(digests))
+    for phone, sections in sorted(digests.items()):
+        for body in digest_messages(sections):
+            dispatcher.outbox.enqueue('TWILIO_ACC_NUMBER', phone, body)
+    # Queued alerts survive a crash in the outbox, so their headlines count as sent from here on
+    news_stage.mark([article for articles, _ in notes.values() for article in articles])
+
+    # Every queued alert goes out in one concurrent, rate-limited batch
+    counts = dispatcher.flush()
+    print("Outbox:", counts)
+    return counts
+
+
+def scan_moves(watchlist, rules, limiter=None, index=None, deadline=None):
+    # In-process scan; returns symbol -> [(rule, value)] for the rules it triggered
+    with metrics.timer('scan'):
+        results, errors = scan_watchlist(watchlist, Stock_api, limiter, store=store, deadline=deadline)
+    metrics.count('symbols_scanned', len(results))
+    metrics.count('symbol_errors', len(errors))
+    for symbol, e in errors.items():
+        print(f"{symbol}: API request error: {e}")
+
+    # Recent closes of every symbol go into one index so all rules run as array operations
+    index = index if index is not None else AlertIndex()
+    for symbol, bars in sorted(results.items()):
+        try:
+            store.append(symbol, bars)
+        except (KeyError, ValueError) as e:
+            print(f"{symbol}: Bad data: {e}")
+            continue
+        index.load(symbol, store.tail(symbol, index.capacity))
+
+    moves = {}
+    with metrics.timer('rules'):
+        alerts = index.evaluate(rules)
+    metrics.count('alerts_fired', len(alerts))
+    for alert in alerts:
+        if alert.symbol not in results:
+            continue
+        moves.setdefault(alert.symbol, []).append((alert.rule, alert.value))
+    return moves
+
+
+def alert_watchlist(filename, rules, chart_dir=None, shards=1, subscriptions=None):
+    # Either file may be left out; watchlist symbols alert DEFAULT_RECIPIENT on `rules`
+    registry = SubscriptionRegistry.load(subscriptions, rules) if subscriptions else SubscriptionRegistry(rules)
+    if filename:
+        registry.add_watchlist(load_watchlist(filename), DEFAULT_RECIPIENT)
+    watchlist = registry.watchlist()
+    counts = alert_cycle(watchlist, rules, shards=shards, registry=registry)
+    if chart_dir:
+        from charts import render_symbols
+        paths, errors = render_symbols(watchlist, chart_dir, store_root=store.root)
+        print(f"Rendered {len(paths)} charts to {chart_dir}")
+        for symbol, e in sorted(errors.items()):
+            print(f"{symbol}: Chart not rendered: {e}")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stock news SMS alerts")
+    parser.add_argument("--watchlist", help="CSV of Symbol,Company Name to scan concurrently")
+    parser.add_argument("--subscriptions", metavar="CSV",
+                        help="Phone,Symbol,Company Name,Rules file; every user gets one digest per run")
+    parser.add_argument("--rules", default=os.getenv('ALERT_RULES', f"change:1:{DEFAULT_CHANGE_PCT}"),
+                        help="watchlist alert rules, e.g. change:1:1.5,gap:2,zscore:20:2.5")
+    parser.add_argument("--headless", action="store_true", default=HEADLESS,
+                        help="never load or show the price chart")
+    parser.add_argument("--charts", metavar="DIR", help="write price charts to DIR instead of showing them")
+    parser.add_argument("--shards", type=int, default=int(os.getenv('SHARDS', '1')),
+                        help="worker processes for a watchlist scan (default 1, in-process)")
+    parser.add_argument("--metrics-json", default=metrics.METRICS_JSON, metavar="PATH",
+                        help="write stage timings and counters to PATH after the run")
+    parser.add_argument("--profile", default=metrics.PROFILE_PATH, metavar="PATH",
+                        help="write a cProfile dump of the run to PATH")
+    args = parser.parse_args()
+
+    with metrics.profiled(args.profile), metrics.timer('run'):
+        if args.watchlist or args.subscriptions:
+            alert_watchlist(args.watchlist, parse_rules(args.rules), args.charts, args.shards, args.subscriptions)
+        else:
+            check_stock(args.headless, args.charts)
+    metrics.finish(args.metrics_json)
@@ -0,0 +1,212 @@
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Process-wide stage timers and counters. Stages are timed into fixed-bucket
+# histograms and exported in Prometheus text format (served on METRICS_PORT) or
+# as JSON (written to METRICS_JSON). Worker processes keep their own registry;
+# unless they send back a snapshot to merge(), their work only shows up as the
+# parent's wall time for the whole stage.
+
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_JSON = os.getenv('METRICS_JSON', '')
+PROFILE_PATH = os.getenv('PROFILE_PATH', '')
+
+# Seconds; covers a cache hit through a rate-limited watchlist scan
+BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                break
+        else:
+            i = len(BUCKETS)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        # Linear interpolation inside the bucket holding the q-th observation,
+        # the estimate Prometheus' histogram_quantile() gives
+        if not self.count:
+            return 0.0
+        rank, seen, lower = q * self.count, 0, 0.0
+        for bound, count in zip(BUCKETS, self.counts):
+            if count and seen + count >= rank:
+                return min(lower + (bound - lower) * (rank - seen) / count, self.max)
+            seen += count
+            lower = bound
+        return self.max
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def count(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start, stage=stage)
+
+    def merge(self, snapshot):
+        # Folds in a snapshot() taken in a worker process
+        with self.lock:
+            for item in snapshot['counters']:
+                key = _key(item['name'], item['labels'])
+                self.counters[key] = self.counters.get(key, 0) + item['value']
+            for item in snapshot['histograms']:
+                key = _key(item['name'], item['labels'])
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram()
+                histogram.counts = [a + b for a, b in zip(histogram.counts, item['buckets'].values())]
+                histogram.sum += item['sum']
+                histogram.count += item['count']
+                histogram.max = max(histogram.max, item['max'])
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        with self.lock:
+            counters = [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+            histograms = [
+                {'name': name, 'labels': dict(labels), 'count': h.count, 'sum': h.sum, 'max': h.max,
+                 'p50': h.quantile(0.5), 'p99': h.quantile(0.99),
+                 'buckets': dict(zip([str(b) for b in BUCKETS] + ['+Inf'], h.counts))}
+                for (name, labels), h in sorted(self.histograms.items())
+            ]
+        return {'started': self.started, 'uptime': time.time() - self.started,
+                'counters': counters, 'histograms': histograms}
+
+    def prometheus(self):
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"stock_alert_{name}_total{_label_text(labels)} {value:g}")
+            for (name, labels), h in sorted(self.histograms.items()):
+                metric = f"stock_alert_{name}"
+                cumulative = 0
+                for bound, count in zip([f"{b:g}" for b in BUCKETS] + ['+Inf'], h.counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{_label_text(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{metric}_sum{_label_text(labels)} {h.sum:.6f}")
+                lines.append(f"{metric}_count{_label_text(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        with open(path + ".tmp", 'w') as file:
+            json.dump(self.snapshot(), file, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def summary(self):
+        # One line per stage, slowest total first
+        rows = []
+        for item in sorted(self.snapshot()['histograms'], key=lambda h: -h['sum']):
+            label = ",".join(f"{k}={v}" for k, v in item['labels'].items())
+            if item['name'] != 'stage_seconds':
+                label = f"{item['name']} {label}"
+            rows.append(f"{label:<24} n={item['count']:<6} total={item['sum']:.3f}s "
+                        f"p50={item['p50']:.4f}s p99={item['p99']:.4f}s max={item['max']:.3f}s")
+        return "\n".join(rows)
+
+
+METRICS = Metrics()
+count = METRICS.count
+observe = METRICS.observe
+timer = METRICS.timer
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith('/metrics.json'):
+            body, kind = json.dumps(self.server.metrics.snapshot()).encode(), 'application/json'
+        elif self.path.startswith('/metrics'):
+            body, kind = self.server.metrics.prometheus().encode(), 'text/plain; version=0.0.4'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', kind)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=METRICS_PORT, metrics=METRICS, host="127.0.0.1"):
+    # /metrics for Prometheus, /metrics.json for everything else; returns the server
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.metrics = metrics
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@contextmanager
+def profiled(path=PROFILE_PATH):
+    # cProfile around a whole run when a path is given; read with `python -m pstats PATH`
+    if not path:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+def finish(json_path=METRICS_JSON, metrics=METRICS):
+    # End-of-run export for one-shot commands
+    if json_path:
+        metrics.write_json(json_path)
@@ -0,0 +1,227 @@
+import hashlib
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+from imblearn.over_sampling import SMOTE
+from sklearn.ensemble import GradientBoostingClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import accuracy_score, roc_auc_score
+from sklearn.model_selection import TimeSeriesSplit
+from sklearn.preprocessing import StandardScaler
+
+import metrics
+from feature_store import FeatureStore
+from indicators import FEATURES, INDICATOR_COLUMNS, compute_indicators, feature_hash
+from ohlcv_store import OHLCVStore
+
+MODEL_DIR = os.getenv('MODEL_DIR', 'models')
+N_SPLITS = 5
+# Trees added on top of a cached model when only new bars arrived
+WARM_START_TREES = 20
+# Warm starts in a row before the model is trained (and scored) from scratch
+# again, which caps the ensemble at 100 + MAX_WARM_STARTS * WARM_START_TREES trees
+MAX_WARM_STARTS = int(os.getenv('MAX_WARM_STARTS', '5'))
+
+
+def prepare_frame(df):
+    # df: Date-indexed frame with Close and Volume; returns the imputed frame
+    df = df.copy()
+    # Previous close, moving averages, RSI, Bollinger Bands and volume trend
+    with metrics.timer('indicators'):
+        values = compute_indicators(df['Close'].to_numpy(), df['Volume'].to_numpy())
+    for column in INDICATOR_COLUMNS:
+        df[column] = values[column][0]
+
+    # Day of the Week (Temporal Feature)
+    df['Day of Week'] = df.index.dayofweek
+
+    # Target Label: 1 if next day's close is higher, 0 otherwise
+    df['Price Change'] = np.where(df['Close'].shift(-1) > df['Close'], 1, 0)
+
+    # Handle missing values using SimpleImputer (mean strategy for numerical columns)
+    imputer = SimpleImputer(strategy='mean')
+    return pd.DataFrame(imputer.fit_transform(df), columns=df.columns)
+
+
+def data_hash(df, rows=None):
+    # Hash of the raw bars (dates, closes, volumes) behind a training set
+    rows = len(df) if rows is None else rows
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(df.index[:rows].to_numpy(dtype='datetime64[ns]')).tobytes())
+    for column in ('Close', 'Volume'):
+        digest.update(np.ascontiguousarray(df[column].to_numpy(dtype=float)[:rows]).tobytes())
+    return digest.hexdigest()
+
+
+def train_fold(X, y, train_index, test_index):
+    # One walk-forward split; module level so it can run in a worker process
+    X_train, X_test = X[train_index], X[test_index]
+    y_train, y_test = y[train_index], y[test_index]
+
+    # Handle imbalance with SMOTE, then scale
+    X_train, y_train = SMOTE(random_state=42).fit_resample(X_train, y_train)
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+
+    model = GradientBoostingClassifier(random_state=42)
+    model.fit(X_train_scaled, y_train)
+
+    y_pred = model.predict(X_test_scaled)
+    y_pred_prob = model.predict_proba(X_test_scaled)[:, 1]
+    return accuracy_score(y_test, y_pred), roc_auc_score(y_test, y_pred_prob)
+
+
+def walk_forward(X, y, n_splits=N_SPLITS, max_workers=None):
+    # Folds are independent, so they train side by side in a process pool
+    splits = list(TimeSeriesSplit(n_splits=n_splits).split(X))
+    with metrics.timer('evaluate'):
+        if max_workers == 1:
+            return [train_fold(X, y, train, test) for train, test in splits]
+        workers = max_workers or min(len(splits), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(train_fold, X, y, train, test) for train, test in splits]
+            return [future.result() for future in futures]
+
+
+def fit_final(X, y, base=None):
+    # With a cached artifact, keep its scaler and grow its ensemble on the new data
+    if base is None:
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
+        model = GradientBoostingClassifier(random_state=42)
+    else:
+        scaler = base['scaler']
+        X_scaled = scaler.transform(X)
+        model = base['model']
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + WARM_START_TREES)
+    with metrics.timer('train'):
+        X_train, y_train = SMOTE(random_state=42).fit_resample(X_scaled, y)
+        model.fit(X_train, y_train)
+    return scaler, model
+
+
+class ModelStore:
+    # One artifact per symbol, feature set and requested date range; the data
+    # hash inside decides between reuse, warm start and a full retrain
+    def __init__(self, root=MODEL_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, symbol, fhash, start=None, end=None):
+        # start/end as requested, not the dates found: an open-ended range keeps
+        # its file as bars are added
+        name = f"{symbol.upper()}-{fhash}"
+        if start is not None or end is not None:
+            name += f"-{start or 'first'}-{end or 'last'}"
+        return os.path.join(self.root, name + ".joblib")
+
+    def load(self, symbol, fhash, start=None, end=None):
+        try:
+            return joblib.load(self.path(symbol, fhash, start, end))
+        except (OSError, EOFError, ValueError):
+            return None
+
+    def save(self, symbol, fhash, artifact, start=None, end=None):
+        path = self.path(symbol, fhash, start, end)
+        joblib.dump(artifact, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+
+def get_model(symbol, bars, X, y, models=None, features=FEATURES, evaluate=None, start=None, end=None):
+    # bars: the Date-indexed source frame X and y were derived from, loaded for
+    # the requested start/end. evaluate() returns walk-forward scores and only
+    # runs on a full fit; a warm start keeps the scores of the last one, whose
+    # last date is the artifact's 'scored_end'.
+    # Returns (artifact, status) where status is "cached", "warm-start" or "trained".
+    models = models or ModelStore()
+    fhash = feature_hash(features)
+    artifact = models.load(symbol, fhash, start, end)
+    current = data_hash(bars)
+    if artifact is not None and artifact['data_hash'] == current:
+        return artifact, "cached"
+
+    # Same history plus newer bars: refit on top of the cached ensemble
+    base = None
+    if artifact is not None and artifact['rows'] < len(bars):
+        if (data_hash(bars, artifact['rows']) == artifact['data_hash']
+                and artifact.get('warm_starts', 0) < MAX_WARM_STARTS
+                and (artifact['scores'] is not None or evaluate is None)):
+            base = artifact
+    if base is not None:
+        scores, scored_end = base['scores'], base.get('scored_end', base['end'])
+        warm_starts = base.get('warm_starts', 0) + 1
+    else:
+        scores = evaluate() if evaluate is not None else None
+        scored_end, warm_starts = str(bars.index[-1].date()), 0
+    scaler, model = fit_final(X, y, base)
+    artifact = {
+        'features': list(features),
+        'scores': scores,
+        'scored_end': scored_end,
+        'warm_starts': warm_starts,
+        'data_hash': current,
+        'rows': len(bars),
+        'start': str(bars.index[0].date()),
+        'end': str(bars.index[-1].date()),
+        'scaler': scaler,
+        'model': model,
+    }
+    models.save(symbol, fhash, artifact, start, end)
+    return artifact, "warm-start" if base is not None else "trained"
+
+
+def load_training_data(symbol, start=None, end=None, store=None, features=None):
+    # Feature columns come from the feature store, which only computes rows for
+    # bars added since the last call; imputation and labels are done here
+    store = store or OHLCVStore()
+    df = store.read_frame(symbol, start, end)
+    if df.empty:
+        raise FileNotFoundError(f"No stored bars for {symbol}")
+    bars = df.set_index('Date')
+    _, X = FeatureStore(bars=store).read(symbol, features or FEATURES, start, end)
+    X = impute_means(X)
+    closes = bars['Close'].to_numpy()
+    y = np.append(closes[1:] > closes[:-1], False).astype(float)
+    return bars, X, y
+
+
+def impute_means(X):
+    # Column means fill the gaps, as SimpleImputer(strategy='mean') does in prepare_frame
+    with warnings.catch_warnings():
+        # A column with no values at all (e.g. a 200-day MA on 150 bars) becomes zeros
+        warnings.simplefilter('ignore', RuntimeWarning)
+        means = np.nan_to_num(np.nanmean(X, axis=0))
+    return np.where(np.isnan(X), means, X)
+
+
+def train_symbol(symbol, start=None, end=None):
+    # Whole pipeline for one symbol; folds run serially since symbols are the parallel unit
+    bars, X, y = load_training_data(symbol, start, end)
+    if len(X) < N_SPLITS + 1:
+        raise ValueError(f"Not enough data for TimeSeriesSplit ({len(X)} rows)")
+    artifact, status = get_model(symbol, bars, X, y, evaluate=lambda: walk_forward(X, y, max_workers=1),
+                                 start=start, end=end)
+    scores = artifact['scores'] or [(np.nan, np.nan)]
+    return {
+        'accuracy': float(np.mean([score[0] for score in scores])),
+        'auc': float(np.mean([score[1] for score in scores])),
+        'rows': len(X),
+        'status': status,
+    }
+
+
+def train_symbols(symbols, start=None, end=None, max_workers=None):
+    results, errors = {}, {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {symbol: pool.submit(train_symbol, symbol, start, end) for symbol in symbols}
+        for symbol, future in futures.items():
+            try:
+                results[symbol] = future.result()
+            except Exception as e:
+                errors[symbol] = e
+    return results, errors
@@ -0,0 +1,154 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from fetch_cache import NEWS_CLOSED_TTL, NEWS_OPEN_TTL, cached_get_json, market_ttl
+
+NEWS_ENDPOINT = os.getenv('NEWS_ENDPOINT', "https://newsapi.org/v2/everything")
+SEEN_PATH = os.getenv('SEEN_ARTICLES_PATH', 'seen_articles.sqlite3')
+
+# Articles already sent are not sent again for this long
+SEEN_TTL = 7 * 24 * 60 * 60
+# NewsAPI rejects queries longer than 500 characters
+MAX_QUERY_LENGTH = 500
+PAGE_SIZE = 100
+
+
+def normalize(text):
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", (text or "").lower()).split())
+
+
+def fingerprints(article):
+    # An article counts as seen if either its URL or its normalized title was sent before
+    keys = []
+    if article.get("url"):
+        keys.append("url:" + hashlib.sha1(article["url"].encode()).hexdigest())
+    title = normalize(article.get("title"))
+    if title:
+        keys.append("title:" + hashlib.sha1(title.encode()).hexdigest())
+    return keys
+
+
+class SeenArticles:
+    def __init__(self, path=SEEN_PATH, ttl=SEEN_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("CREATE TABLE IF NOT EXISTS seen (fingerprint TEXT PRIMARY KEY, seen REAL)")
+        self.evict()
+
+    def evict(self):
+        with self.lock:
+            self.db.execute("DELETE FROM seen WHERE seen < ?", (time.time() - self.ttl,))
+
+    def fresh(self, articles, limit):
+        # Up to `limit` articles not seen before; nothing is recorded until mark()
+        fresh, taken = [], set()
+        with self.lock:
+            for article in articles:
+                keys = fingerprints(article)
+                # A story syndicated twice in one page is only taken once
+                if not keys or taken.intersection(keys):
+                    continue
+                marks = ",".join("?" * len(keys))
+                if self.db.execute(f"SELECT 1 FROM seen WHERE fingerprint IN ({marks})", keys).fetchone():
+                    continue
+                taken.update(keys)
+                fresh.append(article)
+                if len(fresh) == limit:
+                    break
+        return fresh
+
+    def mark(self, articles):
+        now = time.time()
+        with self.lock:
+            self.db.executemany("INSERT OR REPLACE INTO seen VALUES (?, ?)",
+                                [(key, now) for article in articles for key in fingerprints(article)])
+
+    def take_fresh(self, articles, limit):
+        # Returns up to `limit` unseen articles and records them as seen
+        fresh = self.fresh(articles, limit)
+        self.mark(fresh)
+        return fresh
+
+
+def batch_queries(companies):
+    # Pack quoted company names into OR queries under NewsAPI's length limit
+    batch, length = [], 0
+    for company in companies:
+        term = f'"{company}"'
+        extra = len(term) + (4 if batch else 0)
+        if batch and length + extra > MAX_QUERY_LENGTH:
+            yield batch
+            batch, length = [], 0
+            extra = len(term)
+        batch.append(company)
+        length += extra
+    if batch:
+        yield batch
+
+
+class NewsStage:
+    def __init__(self, api_key, seen=None, endpoint=NEWS_ENDPOINT, max_workers=4):
+        self.api_key = api_key
+        self.seen = seen
+        self.endpoint = endpoint
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        # Separate from self.pool so a prefetch never waits on its own searches
+        self.prefetcher = ThreadPoolExecutor(max_workers=max_workers)
+
+    def _search(self, companies):
+        params = {
+            "apikey": self.api_key,
+            "qInTitle": " OR ".join(f'"{company}"' for company in companies),
+            "sortBy": "publishedAt",
+            "pageSize": PAGE_SIZE,
+        }
+        with metrics.timer('news'):
+            return cached_get_json(self.endpoint, params, market_ttl(NEWS_OPEN_TTL, NEWS_CLOSED_TTL)).get("articles", [])
+
+    def fetch(self, companies):
+        # One request per batch of companies; titles are matched back to each company
+        companies = list(dict.fromkeys(companies))
+        found = {company: [] for company in companies}
+        truncated = set()
+        batches = list(batch_queries(companies))
+        results = self.pool.map(self._search, batches) if len(batches) > 1 else map(self._search, batches)
+        for batch, articles in zip(batches, results):
+            names = [(company, f" {normalize(company)} ") for company in batch]
+            for article in articles:
+                title = f" {normalize(article.get('title'))} "
+                for company, name in names:
+                    if name in title:
+                        found[company].append(article)
+            if len(articles) >= PAGE_SIZE and len(batch) > 1:
+                truncated.update(batch)
+        return found, truncated
+
+    def prefetch(self, companies):
+        # Runs alongside the price fetch; result() gives what fetch() returns
+        return self.prefetcher.submit(self.fetch, companies)
+
+    def articles(self, company, prefetched=None, limit=3, mark=True):
+        # With mark=False the caller records what it actually sent through mark()
+        if prefetched is None or company not in prefetched[0]:
+            prefetched = self.fetch([company])
+        found, truncated = prefetched
+        articles = found[company]
+        # A full shared page may have crowded this company out, ask for it alone
+        if company in truncated and len(articles) < limit:
+            articles = self._search([company])
+        if self.seen is None:
+            return articles[:limit]
+        if not mark:
+            return self.seen.fresh(articles, limit)
+        return self.seen.take_fresh(articles, limit)
+
+    def mark(self, articles):
+        if self.seen is not None:
+            self.seen.mark(articles)
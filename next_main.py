@@ -2,120 +2,169 @@ import tkinter as tk
 from tkinter import messagebox
 from tkinter import ttk
 import requests
-from twilio.rest import Client
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 import os
+import threading
 from dotenv import load_dotenv
-from datetime import datetime
-import csv
+
+from alert_rules import DEFAULT_CHANGE_PCT
+from bars import daily_bars
+from fetch_cache import cached_get_json, daily_outputsize, daily_ttl
+from news import NewsStage, SeenArticles
+from gui_worker import Cancelled, RequestWorker
+from notifier import TwilioDispatcher, delivery_summary
+from ohlcv_store import OHLCVStore
+from online_model import OnlineModels, direction_text
+from subscriptions import alert_section, digest_messages
 
 # Load environment variables
 load_dotenv()
 
 # Constants
-STOCK_ENDPOINT = "https://www.alphavantage.co/query"
-NEWS_ENDPOINT = "https://newsapi.org/v2/everything"
+STOCK_ENDPOINT = os.getenv('STOCK_ENDPOINT', "https://www.alphavantage.co/query")
 
 News_api = os.getenv('NEWS_API_KEY')
 Stock_api = os.getenv('STOCK_API_KEY')
 twilio_SID = os.getenv('TWILIO_SID')
 AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
 
+REQUEST_STAGES = 4
+
+store = OHLCVStore()
+news_stage = NewsStage(News_api, SeenArticles())
+online_models = OnlineModels()
+dispatcher = None
+dispatcher_lock = threading.Lock()
+
 def fetch_stock_data(stock_name):
     params = {
         "function": "Time_Series_Daily",
         "symbol": stock_name,
+        "outputsize": daily_outputsize(stock_name, store),
         "apikey": Stock_api,
     }
-    response = requests.get(STOCK_ENDPOINT, params=params)
-    response.raise_for_status()
-    data = response.json()
-    return data
+    return cached_get_json(STOCK_ENDPOINT, params, daily_ttl, decode=daily_bars)
 
-def fetch_news(company_name):
-    params = {
-        "apikey": News_api,
-        "qInTitle": company_name,
-    }
-    response = requests.get(NEWS_ENDPOINT, params=params)
-    response.raise_for_status()
-    return response.json().get("articles", [])[:3]
+def fetch_news(company_name, prefetched=None):
+    # Up to 3 articles not already sent on an earlier request
+    return news_stage.articles(company_name, prefetched)
+
+def direction_suffix(stock_name):
+    # Same guard as main.direction_suffix: a bad model file never blocks the alert
+    try:
+        return direction_text(online_models.probability(stock_name, store))
+    except Exception as e:
+        print(f"{stock_name}: No direction estimate: {e}")
+        return ""
 
 def send_notifications(messages, phone_number):
-    client = Client(twilio_SID, AUTH_TOKEN)
-    for message in messages:
-        client.messages.create(
-            from_='TWILIO_ACC_NUMBER',
-            body=message,
-            to=phone_number
-        )
-
-def plot_stock_data(filename):
-    dates, closes = [], []
-    with open(filename, mode='r') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            dates.append(datetime.strptime(row['Date'], '%Y-%m-%d'))
-            closes.append(float(row['Close']))
-
-    plt.figure(figsize=(12, 6))
-    plt.plot(dates, closes, marker='o', linestyle='-', color='b')
-    plt.xlabel('Date')
-    plt.ylabel('Closing Price')
-    plt.title(f'Stock Prices')
-    
-    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
-    plt.gca().xaxis.set_major_locator(mdates.MonthLocator())
-    plt.xticks(rotation=45)
+    # One dispatcher (and HTTP session) is reused across submits
+    global dispatcher
+    with dispatcher_lock:
+        if dispatcher is None:
+            dispatcher = TwilioDispatcher(twilio_SID, AUTH_TOKEN)
+    return dispatcher.send(messages, phone_number)
+
+def plot_stock_data(stock_name):
+    # pyplot is only loaded the first time a chart is shown
+    import matplotlib.pyplot as plt
+    from charts import ChartRenderer
+
+    bars = store.read(stock_name)
+    renderer = ChartRenderer(plt.figure(figsize=(12, 6)))
+    renderer.draw(stock_name, bars.dates, bars.close)
     plt.tight_layout()
-    plt.grid(True)
     plt.show()
 
+def run_request(task, stock_name, company_name, phone_number, action):
+    # Runs on a worker thread; nothing in here may touch Tk widgets
+    task.report(1, REQUEST_STAGES, "Fetching prices")
+    # News only matters for SMS alerts; it is fetched while prices download
+    news_future = news_stage.prefetch([company_name]) if action == "SMS/WhatsApp" else None
+    bars = fetch_stock_data(stock_name)
+
+    task.report(2, REQUEST_STAGES, "Storing bars")
+    store.append(stock_name, bars)
+
+    positive_difference, diff_percent = bars.latest_change()
+    up_down = "⬆️" if positive_difference > 0 else "⬇️"
+
+    # Exact threshold on the unrounded move; rounding is only for the message
+    if abs(diff_percent) >= DEFAULT_CHANGE_PCT:
+        diff_percent = round(diff_percent)
+        if action == "SMS/WhatsApp":
+            task.report(3, REQUEST_STAGES, "Fetching news")
+            articles = fetch_news(company_name, news_future.result())
+            direction = direction_suffix(stock_name)
+            # All fresh headlines go out as one digest
+            section = alert_section(f"{stock_name}: {up_down}{diff_percent}%", articles, direction)
+            messages = digest_messages([section]) if articles else []
+
+            # Past this report the request can no longer be cancelled; what
+            # happened to the messages is reported instead
+            task.report(4, REQUEST_STAGES, "Sending messages")
+            return "sent", send_notifications(messages, phone_number)
+        elif action == "Show Data":
+            task.report(3, REQUEST_STAGES, "Drawing chart")
+            return "plot", None
+    elif action == "SMS/WhatsApp":
+        return "quiet", diff_percent
+
+def show_progress(stock_name, step, total, stage):
+    progress[stock_name] = f"{stock_name}: {step}/{total} {stage}"
+    update_status()
+
+def request_done(stock_name, result):
+    progress.pop(stock_name, None)
+    update_status()
+    kind, detail = result or (None, None)
+    if kind == "sent":
+        # Anything not delivered (failed, or still queued for a retry) is a warning
+        if any(detail.get(status) for status in ('failed', 'pending', 'sending')):
+            messagebox.showwarning("Notification", delivery_summary(detail))
+        else:
+            messagebox.showinfo("Notification", delivery_summary(detail))
+    elif kind == "quiet":
+        status_var.set(f"{stock_name} moved {detail:+.2f}%, under {DEFAULT_CHANGE_PCT}%: nothing sent")
+    elif kind == "plot":
+        # matplotlib's Tk backend has to run on the mainloop thread
+        plot_stock_data(stock_name)
+
+def request_failed(stock_name, e):
+    progress.pop(stock_name, None)
+    update_status()
+    if isinstance(e, Cancelled):
+        status_var.set(f"{stock_name} cancelled")
+    elif isinstance(e, requests.RequestException):
+        messagebox.showerror("API Error", f"API request failed: {e}")
+    elif isinstance(e, ValueError):
+        messagebox.showerror("Data Error", str(e))
+    else:
+        messagebox.showerror("Error", str(e))
+
+def update_status():
+    status_var.set(" | ".join(progress.values()) or "Idle")
+    if progress:
+        progress_bar.start(10)
+    else:
+        progress_bar.stop()
+
 def process_request():
     stock_name = stock_entry.get().upper()
     company_name = company_entry.get()
     phone_number = phone_entry.get()
     action = action_var.get()
 
-    try:
-        stock_data = fetch_stock_data(stock_name)
-        data_list = [value for (key, value) in sorted(stock_data.get("Time Series (Daily)", {}).items(), reverse=True)]
-
-        with open('stock_data.csv', mode='w', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(['Date', 'Open', 'High', 'Low', 'Close', 'Volume'])
-            for date, entry in sorted(stock_data.get("Time Series (Daily)", {}).items()):
-                writer.writerow([
-                    date,
-                    entry.get("1. open"),
-                    entry.get("2. high"),
-                    entry.get("3. low"),
-                    entry.get("4. close"),
-                    entry.get("5. volume"),
-                ])
-
-        yesterday_price = float(data_list[0]["4. close"])
-        day_before_yesterday_price = float(data_list[1]["4. close"])
-        positive_difference = yesterday_price - day_before_yesterday_price
-        up_down = "⬆️" if positive_difference > 0 else "⬇️"
-        diff_percent = round((positive_difference / day_before_yesterday_price) * 100)
-
-        if abs(diff_percent) > 1:
-            articles = fetch_news(company_name)
-            messages = [f"{stock_name}: {up_down}{diff_percent}%\nHeadline: {article['title']}\nBrief: {article['description']}" for article in articles]
-
-            if action == "SMS/WhatsApp":
-                send_notifications(messages, phone_number)
-                messagebox.showinfo("Notification", "Messages sent successfully!")
-            elif action == "Show Data":
-                plot_stock_data('stock_data.csv')
-    except requests.RequestException as e:
-        messagebox.showerror("API Error", f"API request failed: {e}")
-    except ValueError as e:
-        messagebox.showerror("Data Error", str(e))
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+    job = lambda task: run_request(task, stock_name, company_name, phone_number, action)
+    if not worker.submit(stock_name, job, show_progress, request_done, request_failed):
+        messagebox.showwarning("Busy", f"A request for {stock_name} is already running.")
+        return
+    show_progress(stock_name, 0, REQUEST_STAGES, "Queued")
+
+def cancel_request():
+    stock_name = stock_entry.get().upper()
+    if worker.cancel(stock_name):
+        progress[stock_name] = f"{stock_name}: cancelling"
+        update_status()
 
 #tkinter
 root = tk.Tk()
@@ -142,5 +191,21 @@ ttk.Radiobutton(frame, text="Show Data", variable=action_var, value="Show Data")
 ttk.Radiobutton(frame, text="SMS/WhatsApp", variable=action_var, value="SMS/WhatsApp").grid(row=3, column=2, sticky=tk.W)
 
 ttk.Button(frame, text="Submit", command=process_request).grid(row=4, column=1, sticky=(tk.W, tk.E))
+ttk.Button(frame, text="Cancel", command=cancel_request).grid(row=4, column=2, sticky=(tk.W, tk.E))
+
+status_var = tk.StringVar(value="Idle")
+ttk.Label(frame, textvariable=status_var).grid(row=5, column=0, columnspan=3, sticky=tk.W)
+progress_bar = ttk.Progressbar(frame, mode="indeterminate")
+progress_bar.grid(row=6, column=0, columnspan=3, sticky=(tk.W, tk.E))
+
+# Network work runs on background threads; results come back through root.after
+progress = {}
+worker = RequestWorker(root)
+
+def on_close():
+    worker.shutdown()
+    root.destroy()
+
+root.protocol("WM_DELETE_WINDOW", on_close)
 
 root.mainloop()
@@ -0,0 +1,258 @@
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from urllib.parse import urlsplit
+
+import requests
+
+import metrics
+from rate_limit import RateLimiter
+
+TWILIO_API = os.getenv('TWILIO_API', "https://api.twilio.com")
+OUTBOX_PATH = os.getenv('OUTBOX_PATH', 'outbox.sqlite3')
+
+# A long-code sender is allowed about one message per second
+TWILIO_RATE = float(os.getenv('TWILIO_RATE', '1'))
+TWILIO_WORKERS = int(os.getenv('TWILIO_WORKERS', '8'))
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+
+
+class Outbox:
+    # Durable queue of outgoing SMS. A message is keyed by day, recipient and text,
+    # so enqueueing the same alert again after a crash does not send it twice.
+    def __init__(self, path=OUTBOX_PATH):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY,
+                key TEXT UNIQUE,
+                sender TEXT,
+                recipient TEXT,
+                body TEXT,
+                status TEXT DEFAULT 'pending',
+                attempts INTEGER DEFAULT 0,
+                next_attempt REAL DEFAULT 0,
+                created REAL,
+                claimed REAL,
+                sid TEXT,
+                error TEXT
+            )
+        """)
+
+    @staticmethod
+    def key(recipient, body):
+        # The key enqueue() uses when none is given
+        return hashlib.sha1(f"{date.today()}|{recipient}|{body}".encode()).hexdigest()
+
+    def enqueue(self, sender, recipient, body, key=None):
+        key = key or self.key(recipient, body)
+        with self.lock:
+            cursor = self.db.execute(
+                "INSERT OR IGNORE INTO outbox (key, sender, recipient, body, created) VALUES (?, ?, ?, ?, ?)",
+                (key, sender, recipient, body, time.time()),
+            )
+        return cursor.rowcount == 1
+
+    def claim(self, limit):
+        # Rows move to 'sending' before the request goes out
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            rows = self.db.execute(
+                "SELECT id, sender, recipient, body, attempts, created FROM outbox "
+                "WHERE status = 'pending' AND next_attempt <= ? ORDER BY id LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+            now = time.time()
+            self.db.executemany("UPDATE outbox SET status = 'sending', claimed = ? WHERE id = ?", [(now, row[0]) for row in rows])
+            self.db.execute("COMMIT")
+        return rows
+
+    def in_flight(self, claimed_before):
+        with self.lock:
+            return self.db.execute(
+                "SELECT id, sender, recipient, body, attempts, created FROM outbox "
+                "WHERE status = 'sending' AND claimed < ?",
+                (claimed_before,),
+            ).fetchall()
+
+    def next_due(self):
+        with self.lock:
+            row = self.db.execute("SELECT MIN(next_attempt) FROM outbox WHERE status = 'pending'").fetchone()
+        return row[0]
+
+    def mark_sent(self, id, sid):
+        self._update("UPDATE outbox SET status = 'sent', sid = ?, error = NULL WHERE id = ?", (sid, id))
+
+    def mark_retry(self, id, error, next_attempt):
+        self._update(
+            "UPDATE outbox SET status = 'pending', attempts = attempts + 1, next_attempt = ?, error = ? WHERE id = ?",
+            (next_attempt, error, id),
+        )
+
+    def mark_failed(self, id, error):
+        self._update("UPDATE outbox SET status = 'failed', attempts = attempts + 1, error = ? WHERE id = ?", (error, id))
+
+    def counts(self, keys=None):
+        # Messages by status, of the whole outbox or just the given keys
+        with self.lock:
+            if keys is None:
+                return dict(self.db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            counts = {}
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                for status, count in self.db.execute(
+                        f"SELECT status, COUNT(*) FROM outbox WHERE key IN ({marks}) GROUP BY status", batch):
+                    counts[status] = counts.get(status, 0) + count
+            return counts
+
+    def _update(self, sql, params):
+        with self.lock:
+            self.db.execute(sql, params)
+
+
+class RetryableError(Exception):
+    pass
+
+
+def message_sid(response):
+    # Twilio accepted the message once it answered 2xx; an unreadable body only
+    # costs the sid, and must not leave the row in 'sending'
+    try:
+        data = response.json()
+    except ValueError:
+        return None
+    return data.get("sid") if isinstance(data, dict) else None
+
+
+class TwilioDispatcher:
+    # Sends outbox messages concurrently over one pooled session, paced per sender number
+    def __init__(self, sid, token, outbox=None, max_workers=TWILIO_WORKERS, rate=TWILIO_RATE,
+                 max_attempts=MAX_ATTEMPTS, base_url=TWILIO_API):
+        self.sid = sid
+        self.outbox = outbox or Outbox()
+        self.max_workers = max_workers
+        self.rate = rate
+        self.max_attempts = max_attempts
+        self.messages_url = f"{base_url}/2010-04-01/Accounts/{sid}/Messages.json"
+        self.session = requests.Session()
+        self.session.auth = (sid, token)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.limiters = {}
+        self.limiters_lock = threading.Lock()
+        self.started = time.time()
+
+    def _limiter(self, sender):
+        with self.limiters_lock:
+            limiter = self.limiters.get(sender)
+            if limiter is None:
+                limiter = self.limiters[sender] = RateLimiter(self.rate, per=1.0)
+            return limiter
+
+    def send(self, messages, phone_number, sender='TWILIO_ACC_NUMBER'):
+        # Returns what became of these messages, by status; one already queued
+        # today (so sent or being sent already) counts as 'duplicate'
+        keys, duplicates = [], 0
+        for message in messages:
+            key = self.outbox.key(phone_number, message)
+            if self.outbox.enqueue(sender, phone_number, message, key):
+                keys.append(key)
+            else:
+                duplicates += 1
+        self.flush()
+        counts = self.outbox.counts(keys)
+        if duplicates:
+            counts['duplicate'] = duplicates
+        return counts
+
+    def recover(self):
+        # A crash between POST and mark_sent leaves rows in 'sending'. Look them up
+        # on Twilio first so a message that already went out is not sent again.
+        for id, sender, recipient, body, attempts, created in self.outbox.in_flight(self.started):
+            try:
+                sid = self._find_sent(recipient, body, created)
+            except requests.RequestException:
+                continue
+            if sid:
+                self.outbox.mark_sent(id, sid)
+            else:
+                self.outbox.mark_retry(id, "recovered after interruption", 0)
+
+    def _find_sent(self, recipient, body, created):
+        sent_after = datetime.fromtimestamp(created, timezone.utc).date().isoformat()
+        url = self.messages_url
+        params = {"To": recipient, "DateSent>": sent_after, "PageSize": 1000}
+        while url:
+            response = self.session.get(url, params=params, timeout=30)
+            response.raise_for_status()
+            page = response.json()
+            for message in page.get("messages", []):
+                if message.get("body") == body:
+                    return message.get("sid")
+            next_page = page.get("next_page_uri")
+            url = self.messages_url.split("/2010-04-01")[0] + next_page if next_page else None
+            params = None
+        return None
+
+    def flush(self):
+        # Deliver everything due, waiting out retry backoff, until nothing is pending
+        self.recover()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while True:
+                rows = self.outbox.claim(self.max_workers * 4)
+                if rows:
+                    list(pool.map(self._deliver, rows))
+                    continue
+                next_due = self.outbox.next_due()
+                if next_due is None:
+                    break
+                time.sleep(max(0.0, next_due - time.time()))
+        return self.outbox.counts()
+
+    def _deliver(self, row):
+        id, sender, recipient, body, attempts, created = row
+        self._limiter(sender).acquire()
+        try:
+            with metrics.timer('send'):
+                response = self.session.post(
+                    self.messages_url, data={"From": sender, "To": recipient, "Body": body}, timeout=30
+                )
+            metrics.count('api_calls', api=urlsplit(self.messages_url).netloc)
+            if response.status_code == 429 or response.status_code >= 500:
+                raise RetryableError(f"HTTP {response.status_code}")
+            response.raise_for_status()
+            self.outbox.mark_sent(id, message_sid(response))
+            metrics.count('messages_sent')
+        except (RetryableError, requests.ConnectionError, requests.Timeout) as e:
+            metrics.count('send_retries')
+            if attempts + 1 >= self.max_attempts:
+                self.outbox.mark_failed(id, str(e))
+                metrics.count('messages_failed')
+            else:
+                delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempts) * random.uniform(0.5, 1.5)
+                self.outbox.mark_retry(id, str(e), time.time() + delay)
+        except requests.RequestException as e:
+            self.outbox.mark_failed(id, str(e))
+            metrics.count('messages_failed')
+
+
+def delivery_summary(counts):
+    # One line for a user about what send() did with their messages
+    if not counts:
+        return "No new headlines, nothing was sent."
+    parts = [f"{counts[status]} {label}" for status, label in (
+        ('sent', 'sent'), ('pending', 'waiting to retry'), ('sending', 'in flight'), ('failed', 'failed'),
+        ('duplicate', 'already sent today')) if counts.get(status)]
+    return "Messages: " + ", ".join(parts) + "."
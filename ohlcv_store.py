@@ -0,0 +1,143 @@
+import os
+from datetime import datetime
+
+import numpy as np
+
+import metrics
+from bars import BAR_DTYPE, Bars
+
+# One append-only file of fixed-size BAR_DTYPE records per symbol (only the
+# last record is ever rewritten), read back through np.memmap; reads come out
+# as compact Bars
+
+STORE_DIR = os.getenv('OHLCV_STORE_DIR', 'ohlcv_data')
+
+
+def trading_session(now=None):
+    # The date of the session trading right now, or None outside market hours
+    from fetch_cache import MARKET_TZ, market_is_open
+
+    now = (now or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+    return np.datetime64(now.date(), 'D') if market_is_open(now) else None
+
+
+class OHLCVStore:
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, symbol):
+        return os.path.join(self.root, f"{symbol.upper()}.bars")
+
+    def __contains__(self, symbol):
+        return len(self._bars(symbol)) > 0
+
+    def symbols(self):
+        return sorted(name[:-5] for name in os.listdir(self.root) if name.endswith('.bars'))
+
+    def _bars(self, symbol):
+        path = self.path(symbol)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=BAR_DTYPE)
+        # A torn trailing record from an interrupted append is ignored
+        count = os.path.getsize(path) // BAR_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=BAR_DTYPE)
+        return np.memmap(path, dtype=BAR_DTYPE, mode='r', shape=(count,))
+
+    def records(self, symbol):
+        # The whole history mapped as BAR_DTYPE records; pages are only read when touched
+        return self._bars(symbol)
+
+    def last_date(self, symbol):
+        bars = self._bars(symbol)
+        return bars['date'][-1] if len(bars) else None
+
+    def append(self, symbol, bars, now=None):
+        # bars: Bars or a structured array in BAR_DTYPE, any order. Dates past the
+        # stored end are appended and a bar for the last stored date replaces it,
+        # since a provider's numbers for a day can still change after they were
+        # first stored. While the session is open (as of `now`) today's bar is
+        # left out: its close is only the latest trade. Returns bars written.
+        with metrics.timer('store_write'):
+            if isinstance(bars, Bars):
+                bars = bars.to_records()
+            bars = np.sort(np.asarray(bars, dtype=BAR_DTYPE), order='date')
+            session = trading_session(now)
+            if session is not None:
+                bars = bars[bars['date'] < session]
+            stored = self._bars(symbol)
+            count = len(stored)
+            if count:
+                bars = bars[bars['date'] >= stored['date'][-1]]
+                if len(bars) and bars['date'][0] == stored['date'][-1]:
+                    if bars[:1].tobytes() == stored[-1:].tobytes():
+                        bars = bars[1:]
+                    else:
+                        count -= 1
+            del stored
+            if len(bars):
+                path = self.path(symbol)
+                # Drop any torn record first so the file stays aligned
+                if os.path.exists(path):
+                    size = os.path.getsize(path)
+                    if size % BAR_DTYPE.itemsize:
+                        os.truncate(path, size - size % BAR_DTYPE.itemsize)
+                # Written in place rather than truncated, so readers that have
+                # the file mapped never lose the pages under them
+                with open(path, mode='r+b' if os.path.exists(path) else 'wb') as file:
+                    file.seek(count * BAR_DTYPE.itemsize)
+                    file.write(bars.tobytes())
+            return len(bars)
+
+    def append_series(self, symbol, series):
+        # series: Alpha Vantage "Time Series (Daily)" dict of date -> {"1. open": ...}
+        last = self.last_date(symbol)
+        with metrics.timer('parse'):
+            # The last stored date is converted too, in case its bar changed
+            bars = Bars.from_series(series, last - 1 if last is not None else None)
+        return self.append(symbol, bars)
+
+    def read(self, symbol, start=None, end=None):
+        # Binary search on the mapped dates so only the requested pages are touched
+        bars = self._bars(symbol)
+        lo, hi = 0, len(bars)
+        if start is not None:
+            lo = np.searchsorted(bars['date'], np.datetime64(start, 'D'), side='left')
+        if end is not None:
+            hi = np.searchsorted(bars['date'], np.datetime64(end, 'D'), side='right')
+        return Bars.from_records(bars[lo:hi])
+
+    def tail(self, symbol, count):
+        # The most recent `count` bars without touching the rest of the file
+        bars = self._bars(symbol)
+        return Bars.from_records(bars[max(0, len(bars) - count):])
+
+    def read_frame(self, symbol, start=None, end=None):
+        return self.read(symbol, start, end).frame()
+
+    def import_csv(self, symbol, filename):
+        # Bulk-loads a Date,Open,High,Low,Close,Volume file; returns the number of new bars
+        from csv_bars import load_bars
+
+        return self.append(symbol, load_bars(filename))
+
+    def export_csv(self, symbol, filename, start=None, end=None):
+        bars = self.read(symbol, start, end)
+        with metrics.timer('csv_write'), open(filename, mode='w', newline='') as file:
+            file.write('Date,Open,High,Low,Close,Volume\n')
+            for bar in bars:
+                file.write(f"{bar.date},{bar.open},{bar.high},{bar.low},{bar.close},{bar.volume}\n")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3:
+        print("Usage: python ohlcv_store.py SYMBOL OUTPUT.csv [START] [END]")
+        print("       python ohlcv_store.py --import SYMBOL INPUT.csv")
+        sys.exit(1)
+    if sys.argv[1] == '--import' and len(sys.argv) == 4:
+        print(f"Stored {OHLCVStore().import_csv(sys.argv[2], sys.argv[3])} new bars for {sys.argv[2].upper()}")
+    else:
+        OHLCVStore().export_csv(sys.argv[1], sys.argv[2], *sys.argv[3:5])
@@ -0,0 +1,178 @@
+import math
+import os
+import pickle
+import threading
+
+import numpy as np
+
+import metrics
+from indicators import FEATURES, IndicatorState, day_of_week, feature_hash
+
+# Streaming next-day direction model. Every daily bar updates the indicators,
+# fills gaps from the mean of earlier bars only, labels the previous bar's
+# features with today's close and takes one gradient step. Nothing here imports
+# scikit-learn, so the alert path can score a symbol without the batch stack.
+
+MODEL_DIR = os.getenv('MODEL_DIR', 'models')
+LEARNING_RATE = 0.05
+L2_PENALTY = 1e-4
+# Probabilities are withheld until the model has seen this many labelled bars
+MIN_SAMPLES = 50
+
+
+class CausalImputer:
+    # Missing and infinite values become the mean of the values seen on earlier bars
+    def __init__(self, n_features):
+        self.sums = np.zeros(n_features)
+        self.counts = np.zeros(n_features)
+
+    def update(self, x):
+        valid = np.isfinite(x)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = np.where(self.counts > 0, self.sums / self.counts, 0.0)
+        filled = np.where(valid, x, means)
+        self.sums[valid] += x[valid]
+        self.counts[valid] += 1
+        return filled
+
+
+class RunningScaler:
+    # Welford mean/variance over all bars so far; standardizes each new row
+    def __init__(self, n_features):
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+
+    def update(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        if self.count < 2:
+            return np.zeros_like(x)
+        std = np.sqrt(self.m2 / (self.count - 1))
+        return np.where(std > 0, (x - self.mean) / np.where(std > 0, std, 1.0), 0.0)
+
+
+class OnlineLogit:
+    # Logistic regression trained one row at a time with AdaGrad steps
+    def __init__(self, n_features, learning_rate=LEARNING_RATE, l2=L2_PENALTY):
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.coef = np.zeros(n_features)
+        self.intercept = 0.0
+        self.grad_sq = np.zeros(n_features + 1)
+
+    def partial_fit(self, X, y):
+        for x, target in zip(np.atleast_2d(X), np.atleast_1d(y)):
+            error = self.predict_proba_one(x) - float(target)
+            grad = np.append(error * x + self.l2 * self.coef, error)
+            self.grad_sq += grad * grad
+            step = self.learning_rate * grad / (np.sqrt(self.grad_sq) + 1e-8)
+            self.coef -= step[:-1]
+            self.intercept -= step[-1]
+        return self
+
+    def predict_proba_one(self, x):
+        z = self.intercept + float(self.coef @ x)
+        # Clamped so a runaway score can't overflow exp()
+        return 1.0 / (1.0 + math.exp(-max(min(z, 30.0), -30.0)))
+
+
+class OnlinePredictor:
+    def __init__(self, features=FEATURES):
+        self.features = list(features)
+        self.indicators = IndicatorState()
+        self.imputer = CausalImputer(len(self.features))
+        self.scaler = RunningScaler(len(self.features))
+        self.model = OnlineLogit(len(self.features))
+        self.last_date = None
+        self.last_close = math.nan
+        self.latest = None
+        self.samples = 0
+        self.hits = 0
+
+    def update(self, date, close, volume=math.nan):
+        # Bars at or before the last one seen are ignored, so replays are safe
+        date = np.datetime64(date, 'D')
+        if self.last_date is not None and date <= self.last_date:
+            return False
+        close = float(close)
+        if self.latest is not None:
+            # Yesterday's features now have their label; score before learning for a fair hit rate
+            target = close > self.last_close
+            self.hits += (self.model.predict_proba_one(self.latest) > 0.5) == target
+            self.model.partial_fit(self.latest, target)
+            self.samples += 1
+        row = self.indicators.update(close, volume)
+        row['Day of Week'] = day_of_week(date)
+        x = np.array([row[feature] for feature in self.features], dtype=float)
+        self.latest = self.scaler.update(self.imputer.update(x))
+        self.last_date, self.last_close = date, close
+        return True
+
+    def learn(self, bars):
+        # bars: Bars from OHLCVStore or csv_bars, oldest first; returns bars consumed
+        learned = 0
+        for bar in bars:
+            learned += self.update(bar.date, bar.close, bar.volume)
+        return learned
+
+    def probability(self):
+        # Chance the next close is above the latest one; nan until the model has enough history
+        if self.latest is None or self.samples < MIN_SAMPLES:
+            return math.nan
+        return self.model.predict_proba_one(self.latest)
+
+    def accuracy(self):
+        return self.hits / self.samples if self.samples else math.nan
+
+
+class OnlineModels:
+    # Predictors stay in memory once loaded; each call catches a symbol up with
+    # the bars stored since its last update and saves it only if something changed
+    def __init__(self, root=MODEL_DIR, features=FEATURES):
+        self.root = root
+        self.features = list(features)
+        self.fhash = feature_hash(self.features)
+        self.loaded = {}
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, symbol):
+        return os.path.join(self.root, f"{symbol.upper()}-{self.fhash}.online")
+
+    def get(self, symbol):
+        symbol = symbol.upper()
+        predictor = self.loaded.get(symbol)
+        if predictor is None:
+            try:
+                with open(self.path(symbol), 'rb') as file:
+                    predictor = pickle.load(file)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                predictor = OnlinePredictor(self.features)
+            self.loaded[symbol] = predictor
+        return predictor
+
+    def save(self, symbol, predictor):
+        path = self.path(symbol)
+        with open(path + ".tmp", 'wb') as file:
+            pickle.dump(predictor, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    def probability(self, symbol, store):
+        with self.lock:
+            predictor = self.get(symbol)
+            start = None if predictor.last_date is None else predictor.last_date + 1
+            with metrics.timer('online_update'):
+                if predictor.learn(store.read(symbol, start)):
+                    self.save(symbol, predictor)
+            with metrics.timer('predict'):
+                return predictor.probability()
+
+
+def direction_text(probability):
+    # SMS suffix; empty while the model is still warming up
+    if math.isnan(probability):
+        return ""
+    return f"\nNext day: {probability:.0%} chance up"
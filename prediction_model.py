@@ -1,153 +1,173 @@
-import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, TimeSeriesSplit
-from sklearn.ensemble import GradientBoostingClassifier
-from sklearn.metrics import accuracy_score, classification_report, roc_auc_score, precision_recall_curve
-from sklearn.preprocessing import StandardScaler
-from sklearn.impute import SimpleImputer
-import matplotlib.pyplot as plt
-from imblearn.over_sampling import SMOTE
+import argparse
+import os
 import sys
 
-# Debugging: Track script start
-print("Script started...")
+import metrics
+from metrics import timer
 
-try:
-    # Load your stock data (CSV file, for example)
+# pandas, sklearn, imblearn and matplotlib are imported inside the functions that
+# use them, so --help and argument errors don't pay for them
+HEADLESS = os.getenv('HEADLESS', '') not in ('', '0')
+
+
+def evaluate(X, y, workers):
+    from model_training import N_SPLITS, walk_forward
+
+    # Split data using TimeSeriesSplit (walk-forward validation), one fold per process
+    print(f"Starting TimeSeriesSplit across {workers or 'all'} worker processes...")
+    scores = walk_forward(X, y, N_SPLITS, workers)
+    for accuracy, auc_score in scores:
+        print(f"Split results - Accuracy: {accuracy:.2f}, AUC: {auc_score:.2f}")
+    return scores
+
+
+def run_online(symbol):
+    # Replays the history through the streaming model; each bar is scored before it is learned
+    import time
+    from online_model import OnlinePredictor
+
+    if symbol == 'stock_data':
+        from csv_bars import load_bars
+        bars = load_bars('stock_data.csv')
+    else:
+        from ohlcv_store import OHLCVStore
+        bars = OHLCVStore().read(symbol)
+    predictor = OnlinePredictor()
+    start = time.perf_counter()
+    predictor.learn(bars)
+    learn_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(10000):
+        probability = predictor.probability()
+    score_time = (time.perf_counter() - start) / 10000
+
+    print(f"Online model on {len(bars)} bars, {learn_time / max(1, len(bars)) * 1e6:.0f} µs per update")
+    print(f"Prequential accuracy: {predictor.accuracy():.2f}")
+    print(f"Next-day probability up: {probability:.2f} ({score_time * 1e6:.1f} µs per prediction)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the next-day direction classifier")
+    parser.add_argument("symbols", nargs="*", help="stored symbols; stock_data.csv is used when omitted")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--workers", type=int, help="worker processes for folds or symbols")
+    parser.add_argument("--headless", action="store_true", default=HEADLESS, help="skip the plots")
+    parser.add_argument("--online", action="store_true",
+                        help="evaluate the streaming model with causal imputation instead of the batch classifier")
+    parser.add_argument("--metrics-json", default=metrics.METRICS_JSON, metavar="PATH",
+                        help="write stage timings and counters to PATH after the run")
+    parser.add_argument("--profile", default=metrics.PROFILE_PATH, metavar="PATH",
+                        help="write a cProfile dump of the run to PATH")
+    args = parser.parse_args()
+
+    try:
+        with metrics.profiled(args.profile), timer('run'):
+            run(args)
+    finally:
+        print("Stage timings:")
+        print(metrics.METRICS.summary())
+        metrics.finish(args.metrics_json)
+
+
+def run(args):
+    if args.online:
+        for symbol in args.symbols or ['stock_data']:
+            run_online(symbol.upper() if symbol != 'stock_data' else symbol)
+        return
+
+    from model_training import FEATURES, N_SPLITS, get_model, load_training_data, prepare_frame, train_symbols
+
+    # Many symbols: one process per symbol, summary only
+    if len(args.symbols) > 1:
+        print(f"Training {len(args.symbols)} symbols in parallel...")
+        results, errors = train_symbols([s.upper() for s in args.symbols], args.start, args.end, args.workers)
+        for symbol, result in sorted(results.items()):
+            print(f"{symbol}: {result['status']}, {result['rows']} rows, "
+                  f"Accuracy {result['accuracy']:.2f}, AUC {result['auc']:.2f}")
+        for symbol, e in sorted(errors.items()):
+            print(f"{symbol}: An error occurred: {e}")
+        return
+
+    # Load stored bars for the given symbol, or a CSV file when no symbol is passed
     print("Loading data...")
-    df = pd.read_csv('stock_data.csv', parse_dates=['Date'])
+    with timer('load'):
+        if args.symbols:
+            symbol = args.symbols[0].upper()
+            bars, X, y = load_training_data(symbol, args.start, args.end)
+        else:
+            from csv_bars import load_frame
+            symbol = 'stock_data'
+            bars = load_frame('stock_data.csv')
+            df_imputed = prepare_frame(bars)
+            X, y = df_imputed[FEATURES].to_numpy(), df_imputed['Price Change'].to_numpy()
     print("Data loaded successfully!")
-    print(f"Dataset shape: {df.shape}")
-
-    df.set_index('Date', inplace=True)
-
-    # Feature Engineering
-    print("Starting feature engineering...")
-    # Previous day's close price
-    df['Prev Close'] = df['Close'].shift(1)
-
-    # Moving Averages
-    df['50 Day MA'] = df['Close'].rolling(window=50).mean()
-    df['200 Day MA'] = df['Close'].rolling(window=200).mean()
-
-    # RSI (Relative Strength Index)
-    window_length = 14
-    delta = df['Close'].diff(1)
-    gain = (delta.where(delta > 0, 0)).rolling(window=window_length).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=window_length).mean()
-    rs = gain / loss
-    df['RSI'] = 100 - (100 / (1 + rs))
-
-    # Bollinger Bands
-    df['20 Day MA'] = df['Close'].rolling(window=20).mean()
-    df['20 Day StdDev'] = df['Close'].rolling(window=20).std()
-    df['Upper Band'] = df['20 Day MA'] + (df['20 Day StdDev'] * 2)
-    df['Lower Band'] = df['20 Day MA'] - (df['20 Day StdDev'] * 2)
-
-    # Day of the Week (Temporal Feature)
-    df['Day of Week'] = df.index.dayofweek
-
-    # Volume Trend (relative change in volume)
-    df['Volume Change'] = df['Volume'].pct_change()
-
-    # Target Label: 1 if next day's close is higher, 0 otherwise
-    df['Price Change'] = np.where(df['Close'].shift(-1) > df['Close'], 1, 0)
-
-    # Check missing values before cleaning
-    print("Missing values in each column before cleaning:")
-    print(df.isnull().sum())
-
-    # Handle missing values using SimpleImputer (mean strategy for numerical columns)
-    imputer = SimpleImputer(strategy='mean')
-    df_imputed = pd.DataFrame(imputer.fit_transform(df), columns=df.columns)
-    
-    # Verify data shape after imputing missing values
-    print(f"Dataset shape after imputing missing values: {df_imputed.shape}")
-
-    # Define features (X) and target (y)
-    features = ['Prev Close', '50 Day MA', '200 Day MA', 'RSI', 'Upper Band', 
-                'Lower Band', 'Day of Week', 'Volume Change']
-    X = df_imputed[features]
-    y = df_imputed['Price Change']
-    print("Feature and target sets defined.")
     print(f"Feature shape: {X.shape}, Target shape: {y.shape}")
 
     # Check if there's enough data for TimeSeriesSplit
-    if len(df_imputed) < 6:
+    if len(X) < N_SPLITS + 1:
         print("Not enough data for TimeSeriesSplit (must be at least 6 samples). Exiting.")
         sys.exit(1)
 
-    # Split data using TimeSeriesSplit (walk-forward validation)
-    tscv = TimeSeriesSplit(n_splits=5)
-    scaler = StandardScaler()
-    smote = SMOTE(random_state=42)
-    scores = []
-
-    print("Starting TimeSeriesSplit...")
-    for train_index, test_index in tscv.split(X):
-        print(f"Processing split: Train {len(train_index)}, Test {len(test_index)}")
-        X_train, X_test = X.iloc[train_index], X.iloc[test_index]
-        y_train, y_test = y.iloc[train_index], y.iloc[test_index]
-        
-        # Handle imbalance with SMOTE
-        print("Applying SMOTE...")
-        X_train, y_train = smote.fit_resample(X_train, y_train)
-        print(f"SMOTE applied. Resampled Train shape: {X_train.shape}, {y_train.shape}")
-
-        # Scale the features
-        print("Scaling features...")
-        X_train_scaled = scaler.fit_transform(X_train)
-        X_test_scaled = scaler.transform(X_test)
-        
-        # Train the model (Gradient Boosting)
-        print("Training model...")
-        model = GradientBoostingClassifier(random_state=42)
-        model.fit(X_train_scaled, y_train)
-        
-        # Evaluate the model
-        print("Evaluating model...")
-        y_pred = model.predict(X_test_scaled)
-        y_pred_prob = model.predict_proba(X_test_scaled)[:, 1]
-        accuracy = accuracy_score(y_test, y_pred)
-        auc_score = roc_auc_score(y_test, y_pred_prob)
-        scores.append((accuracy, auc_score))
-        print(f"Split results - Accuracy: {accuracy:.2f}, AUC: {auc_score:.2f}")
+    # Reuse the stored model when the data is unchanged, warm start when only new bars arrived
+    print("Loading or training final model...")
+    artifact, status = get_model(symbol, bars, X, y, evaluate=lambda: evaluate(X, y, args.workers),
+                                 start=args.start, end=args.end)
+    print(f"Model {status}: {artifact['start']} to {artifact['end']}, {artifact['rows']} rows")
+    if artifact['scored_end'] != artifact['end']:
+        print(f"Scores are from the last full fit, on data to {artifact['scored_end']}")
 
     # average scores
+    scores = artifact['scores']
     avg_accuracy = np.mean([score[0] for score in scores])
     avg_auc = np.mean([score[1] for score in scores])
     print(f'Average Accuracy: {avg_accuracy:.2f}')
     print(f'Average AUC-ROC: {avg_auc:.2f}')
 
-    #Model Training
-    print("Training final model on full dataset...")
-    X_train_scaled = scaler.fit_transform(X)
-    y_train = y
-    X_train, y_train = smote.fit_resample(X_train_scaled, y_train)
-    final_model = GradientBoostingClassifier(random_state=42)
-    final_model.fit(X_train, y_train)
+    final_model, scaler = artifact['model'], artifact['scaler']
+    if args.headless:
+        return
+
+    import matplotlib.pyplot as plt
 
     print("Generating feature importance plot...")
     importances = final_model.feature_importances_
-    plt.barh(features, importances)
+    plt.barh(FEATURES, importances)
     plt.title("Feature Importance")
     plt.xlabel("Importance")
     plt.ylabel("Features")
     plt.show()
 
+    # The model has seen these bars, so this is an in-sample view; backtest.py
+    # scores the online model's out-of-sample probabilities over parameter grids
     print("Generating predictions for backtesting...")
-    df_imputed['Prediction'] = final_model.predict(scaler.transform(X))
-    plt.plot(df_imputed['Close'], label='Actual Prices')
-    plt.plot(df_imputed['Prediction'], label='Predicted Movements', alpha=0.7)
+    from backtest import equity_curve, score
+
+    with timer('predict'):
+        probabilities = final_model.predict_proba(scaler.transform(X))[:, 1]
+    closes = bars['Close'].to_numpy(dtype=float)
+    positions = (probabilities > 0.5).astype(np.int8)[None, :]
+    total, drawdown, hit_rate = score(closes, positions)[0][:3]
+    print(f"Long when P(up) > 0.5 (in-sample): return {total:.1%}, max drawdown {drawdown:.1%}, "
+          f"hit rate {hit_rate:.1%}")
+    plt.plot(bars.index[1:], equity_curve(closes, positions)[0], label='Model (long when P(up) > 0.5)')
+    plt.plot(bars.index[1:], closes[1:] / closes[0], label='Buy and hold')
     plt.legend()
-    plt.title("Stock Price and Predicted Movements")
+    plt.title("Equity Curve of Predicted Movements (in-sample)")
     plt.show()
 
-except FileNotFoundError as e:
-    print(f"File not found: {e}")
-    sys.exit(1)
-except Exception as e:
-    print(f"An error occurred: {e}")
-    sys.exit(1)
 
-print("Script completed.")
+if __name__ == "__main__":
+    # Debugging: Track script start
+    print("Script started...")
+    try:
+        main()
+    except FileNotFoundError as e:
+        print(f"File not found: {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        sys.exit(1)
+    print("Script completed.")
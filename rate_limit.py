@@ -0,0 +1,82 @@
+import multiprocessing
+import threading
+import time
+
+
+class RateLimiter:
+    # Token bucket shared by every worker that talks to the same provider.
+    # rate calls are allowed per `per` seconds, with at most `burst` in a row.
+    def __init__(self, rate, per=60.0, burst=1):
+        if rate <= 0:
+            raise ValueError("Rate must be positive.")
+        self.fill_rate = rate / per
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.fill_rate)
+        self.last = now
+
+    def acquire(self, timeout=None):
+        # With a timeout, gives up and returns False once the next token is due too late
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.fill_rate
+            if end is not None and now + wait > end:
+                return False
+            time.sleep(wait)
+
+    def try_acquire(self):
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class ProcessRateLimiter:
+    # The same token bucket kept in shared memory, so worker processes started with
+    # it draw from one budget. Hand it to processes at start (Process args or a pool
+    # initializer); like any multiprocessing lock it can't be pickled into a task.
+    # The context must match the one the workers are started from.
+    def __init__(self, rate, per=60.0, burst=1, context='spawn'):
+        if rate <= 0:
+            raise ValueError("Rate must be positive.")
+        self.fill_rate = rate / per
+        self.capacity = max(1, burst)
+        # [tokens, last refill]; CLOCK_MONOTONIC is shared by every process on the host
+        self.state = multiprocessing.get_context(context).Array('d', [float(self.capacity), time.monotonic()])
+
+    def _take(self):
+        # Returns 0 when a token was taken, otherwise the seconds until one is due
+        with self.state.get_lock():
+            now = time.monotonic()
+            tokens = min(self.capacity, self.state[0] + (now - self.state[1]) * self.fill_rate)
+            self.state[1] = now
+            if tokens >= 1:
+                self.state[0] = tokens - 1
+                return 0.0
+            self.state[0] = tokens
+            return (1 - tokens) / self.fill_rate
+
+    def acquire(self, timeout=None):
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if end is not None and time.monotonic() + wait > end:
+                return False
+            time.sleep(wait)
+
+    def try_acquire(self):
+        return not self._take()
@@ -0,0 +1,140 @@
+import multiprocessing
+import os
+import queue
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import metrics
+from alert_rules import AlertIndex
+from ohlcv_store import STORE_DIR, OHLCVStore
+from online_model import OnlineModels
+from rate_limit import ProcessRateLimiter
+from watchlist import STOCK_API_RATE, scan_watchlist
+
+# Sharded scan for large watchlists: each worker process fetches, decodes,
+# stores, evaluates the rules and scores its slice of symbols, so JSON parsing,
+# indicator math and model scoring use every core. Price calls from all workers
+# draw from one ProcessRateLimiter. Results come back as rows of a record array
+# in shared memory (one row per symbol), not as pickled objects; only each
+# worker's metrics snapshot travels over a queue.
+
+SHARDS = int(os.getenv('SHARDS', '1'))
+SHARD_THREADS = int(os.getenv('SHARD_THREADS', '8'))
+
+PENDING, OK, FETCH_ERROR, BAD_DATA = 0, 1, 2, 3
+
+
+def result_dtype(n_rules):
+    return np.dtype([
+        ('status', 'i1'),
+        ('fired', '?', (n_rules,)),
+        ('value', 'f8', (n_rules,)),
+        ('probability', 'f8'),
+    ])
+
+
+def _run_shard(shm_name, size, assignments, rules, api_key, limiter, report, deadline=None, store_root=STORE_DIR):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    results = None
+    try:
+        results = np.ndarray(size, dtype=result_dtype(len(rules)), buffer=shm.buf)
+        rows = dict(assignments)
+        store = OHLCVStore(store_root)
+        fetched, errors = scan_watchlist(list(rows), api_key, limiter, SHARD_THREADS, store=store,
+                                        deadline=deadline)
+        for symbol, e in errors.items():
+            print(f"{symbol}: API request error: {e}")
+            results['status'][rows[symbol]] = FETCH_ERROR
+
+        index = AlertIndex()
+        for symbol, bars in sorted(fetched.items()):
+            try:
+                store.append(symbol, bars)
+            except (KeyError, ValueError) as e:
+                print(f"{symbol}: Bad data: {e}")
+                results['status'][rows[symbol]] = BAD_DATA
+                continue
+            index.load(symbol, store.tail(symbol, index.capacity))
+        # The fetched histories are no longer needed; free them before the scoring pass
+        del fetched
+
+        targets = np.array([rows[symbol] for symbol in index.symbols], dtype=np.int64)
+        fired = np.zeros((len(targets), len(rules)), dtype=bool)
+        values = np.full((len(targets), len(rules)), np.nan)
+        with metrics.timer('rules'):
+            for j, rule in enumerate(rules):
+                if rule.lookback >= index.capacity:
+                    raise ValueError(f"Rule {rule.name} needs more than {index.capacity} bars of history")
+                fired[:, j], values[:, j] = rule.evaluate(index)
+
+        probabilities = np.full(len(targets), np.nan)
+        models = OnlineModels()
+        for i in np.flatnonzero(fired.any(axis=1)):
+            try:
+                probabilities[i] = models.probability(index.symbols[i], store)
+            except Exception as e:
+                print(f"{index.symbols[i]}: No direction estimate: {e}")
+
+        results['fired'][targets] = fired
+        results['value'][targets] = values
+        results['probability'][targets] = probabilities
+        results['status'][targets] = OK
+    finally:
+        del results
+        shm.close()
+        report.put(metrics.METRICS.snapshot())
+
+
+def sharded_scan(watchlist, rules, shards=SHARDS, limiter=None, api_key=None, deadline=None, store_root=STORE_DIR):
+    # Returns (moves, probabilities): symbol -> [(rule, value)] for every symbol
+    # with a fired rule, and symbol -> next-day probability (nan if unknown).
+    # deadline is a time.monotonic() value, which means the same in every process on the host.
+    # Workers write and read bars under store_root, the caller's OHLCVStore.root.
+    symbols = sorted(watchlist)
+    if limiter is None:
+        limiter = ProcessRateLimiter(STOCK_API_RATE)
+    dtype = result_dtype(len(rules))
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(symbols) * dtype.itemsize))
+    # Spawned rather than forked: the parent already runs news and HTTP threads
+    context = multiprocessing.get_context('spawn')
+    report = context.Queue()
+    try:
+        results = np.ndarray(len(symbols), dtype=dtype, buffer=shm.buf)
+        results['status'] = PENDING
+        shards = max(1, min(shards, len(symbols)))
+        workers = []
+        for k in range(shards):
+            assignments = [(symbol, row) for row, symbol in enumerate(symbols) if row % shards == k]
+            worker = context.Process(target=_run_shard, args=(
+                shm.name, len(symbols), assignments, rules, api_key, limiter, report, deadline, store_root,
+            ))
+            worker.start()
+            workers.append(worker)
+        # Drain the queue while waiting; a worker blocks on exit until its snapshot is read
+        pending = len(workers)
+        while pending:
+            try:
+                metrics.METRICS.merge(report.get(timeout=1))
+                pending -= 1
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    break
+        for worker in workers:
+            worker.join()
+
+        moves, probabilities = {}, {}
+        metrics.count('alerts_fired', int(np.count_nonzero(results['fired'][results['status'] == OK])))
+        for row in np.flatnonzero((results['status'] == OK) & results['fired'].any(axis=1)):
+            symbol = symbols[row]
+            moves[symbol] = [(rules[j], float(results['value'][row, j])) for j in np.flatnonzero(results['fired'][row])]
+            probabilities[symbol] = float(results['probability'][row])
+        metrics.count('symbols_scanned', int(np.count_nonzero(results['status'] == OK)))
+        metrics.count('symbol_errors', int(np.count_nonzero(results['status'] > OK)))
+        for row in np.flatnonzero(results['status'] == PENDING):
+            print(f"{symbols[row]}: Shard exited without a result")
+        del results
+    finally:
+        shm.close()
+        shm.unlink()
+    return moves, probabilities
@@ -0,0 +1,221 @@
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from zoneinfo import ZoneInfo
+
+# Local stand-in for the Alpha Vantage, NewsAPI and Twilio endpoints so throughput can be measured offline.
+# With a fixtures.FixtureSet the recorded payloads are replayed instead of generated ones.
+
+
+MARKET_TZ = ZoneInfo("America/New_York")
+
+
+def daily_series(symbol, days=100, end=None):
+    rng = random.Random(symbol)
+    end = end or date.today()
+    price = rng.uniform(20, 500)
+    series = {}
+    day = end - timedelta(days=int(days * 1.5))
+    while len(series) < days:
+        day += timedelta(days=1)
+        if day.weekday() >= 5:
+            continue
+        open_price = price
+        price = max(1.0, price * (1 + rng.gauss(0, 0.02)))
+        series[day.isoformat()] = {
+            "1. open": f"{open_price:.4f}",
+            "2. high": f"{max(open_price, price) * 1.01:.4f}",
+            "3. low": f"{min(open_price, price) * 0.99:.4f}",
+            "4. close": f"{price:.4f}",
+            "5. volume": str(rng.randint(100000, 50000000)),
+        }
+    return series
+
+
+def intraday_series(symbol, interval=1, count=100, end=None):
+    # The `count` minute bars that closed before `end`, labelled by their start like
+    # Alpha Vantage. Each close is a function of the bar's time alone, so every poll
+    # agrees with the previous one and only the newest bars change.
+    rng = random.Random(symbol)
+    base, phase = rng.uniform(20, 500), rng.uniform(0, 2 * math.pi)
+    end = end or datetime.now()
+    last = int(end.timestamp() // 60 // interval * interval) - interval
+
+    def close(minute):
+        noise = random.Random(f"{symbol}:{minute}").gauss(0, 0.002)
+        return base * (1 + 0.04 * math.sin(minute / 45 + phase)) * (1 + noise)
+
+    series = {}
+    for minute in range(last - (count - 1) * interval, last + 1, interval):
+        open_price, price = close(minute - interval), close(minute)
+        # Labels are New York time, as Alpha Vantage sends them
+        label = datetime.fromtimestamp(minute * 60, MARKET_TZ).strftime("%Y-%m-%d %H:%M:%S")
+        series[label] = {
+            "1. open": f"{open_price:.4f}",
+            "2. high": f"{max(open_price, price) * 1.001:.4f}",
+            "3. low": f"{min(open_price, price) * 0.999:.4f}",
+            "4. close": f"{price:.4f}",
+            "5. volume": str(random.Random(f"{symbol}:{minute}:v").randint(1000, 500000)),
+        }
+    return series
+
+
+def news_articles(query, page_size=100, per_company=5):
+    # A few deterministic headlines for every quoted company in a qInTitle query
+    companies = re.findall(r'"([^"]+)"', query) or [query]
+    articles = []
+    for company in companies:
+        for i in range(per_company):
+            slug = re.sub(r"[^a-z0-9]+", "-", company.lower())
+            articles.append({
+                "title": f"{company} shares move on story {i}",
+                "description": f"Coverage of {company}, item {i}.",
+                "url": f"https://news.example/{slug}/{date.today()}/{i}",
+            })
+    return articles[:page_size]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    days = 100
+    fail_rate = 0.0
+    throttle_rate = 0.0
+    stall_rate = 0.0
+    stall = 0.0
+    fixtures = None
+    messages = None
+    messages_lock = threading.Lock()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        time.sleep(self.latency)
+        # Occasional very slow answers, as a provider's tail latency would give
+        if random.random() < self.stall_rate:
+            time.sleep(self.stall)
+        function = query.get("function", "").upper()
+        if url.path == "/query" and random.random() < self.throttle_rate:
+            # Alpha Vantage answers an over-quota key with HTTP 200 and a note instead of data
+            self._reply(200, {"Note": "Thank you for using Alpha Vantage! Our standard API call frequency is "
+                                      "5 calls per minute and 500 calls per day."})
+            return
+        if url.path.endswith("/Messages.json"):
+            recipient = query.get("To")
+            with self.messages_lock:
+                found = [m for m in self.messages if recipient is None or m["to"] == recipient]
+            self._reply(200, {"messages": found, "next_page_uri": None})
+        elif url.path == "/v2/everything":
+            search, page_size = query.get("qInTitle", query.get("q", "")), int(query.get("pageSize", 100))
+            if self.fixtures is not None:
+                self._reply(200, self.fixtures.news_response(search, page_size))
+                return
+            articles = news_articles(search, page_size)
+            self._reply(200, {"status": "ok", "totalResults": len(articles), "articles": articles})
+        elif url.path == "/query" and function == "TIME_SERIES_DAILY":
+            symbol = query.get("symbol", "").upper()
+            if self.fixtures is not None:
+                self._reply(200, self.fixtures.daily_response(symbol))
+                return
+            body = {
+                "Meta Data": {"2. Symbol": symbol},
+                "Time Series (Daily)": daily_series(symbol, self.days),
+            }
+            self._reply(200, body)
+        elif url.path == "/query" and function == "TIME_SERIES_INTRADAY":
+            symbol, interval = query.get("symbol", "").upper(), query.get("interval", "1min")
+            minutes = int(interval.removesuffix("min"))
+            body = {
+                "Meta Data": {"2. Symbol": symbol, "4. Interval": interval},
+                f"Time Series ({interval})": intraday_series(symbol, minutes),
+            }
+            self._reply(200, body)
+        else:
+            self._reply(404, {"Error Message": "Invalid API call."})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+        time.sleep(self.latency)
+        if not url.path.endswith("/Messages.json"):
+            self._reply(404, {"message": "Not found"})
+        elif random.random() < self.fail_rate:
+            self._reply(503, {"message": "Service unavailable"})
+        else:
+            with self.messages_lock:
+                sid = f"SM{len(self.messages):032d}"
+                if self.fixtures is not None:
+                    message = self.fixtures.message_response(sid, form.get("From"), form.get("To"), form.get("Body"))
+                else:
+                    message = {
+                        "sid": sid,
+                        "from": form.get("From"),
+                        "to": form.get("To"),
+                        "body": form.get("Body"),
+                        "status": "queued",
+                    }
+                self.messages.append(message)
+            self._reply(201, message)
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port=0, latency=0.0, days=100, fail_rate=0.0, fixtures=None, throttle_rate=0.0,
+                      stall_rate=0.0, stall=0.0):
+    handler = type("Handler", (StubHandler,), {
+        "latency": latency,
+        "days": days,
+        "fail_rate": fail_rate,
+        "throttle_rate": throttle_rate,
+        "stall_rate": stall_rate,
+        "stall": stall,
+        "fixtures": fixtures,
+        "messages": [],
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.messages = handler.messages
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fake Alpha Vantage, NewsAPI and Twilio responses")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--days", type=int, default=100)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of Twilio sends answered with 503")
+    parser.add_argument("--fixtures", metavar="DIR", help="replay responses recorded with fixtures.py")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="share of Alpha Vantage calls answered with the throttling note")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="share of GETs that wait --stall seconds")
+    parser.add_argument("--stall", type=float, default=30.0)
+    args = parser.parse_args()
+    fixtures = None
+    if args.fixtures:
+        from fixtures import FixtureSet
+        fixtures = FixtureSet(args.fixtures)
+    server, base_url = start_stub_server(args.port, args.latency, args.days, args.fail_rate, fixtures,
+                                         args.throttle_rate, args.stall_rate, args.stall)
+    print(f"Stub server listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,154 @@
+import csv
+import os
+
+from alert_rules import DEFAULT_CHANGE_PCT, check_lookback, parse_rules
+
+# Who gets which alerts. A subscription is (phone, symbol, rule spec); a blank
+# spec means the default rules. The registry keeps an inverted index from
+# symbol to subscribers, so a cycle fetches prices and news once per symbol,
+# evaluates each distinct rule once, and then fans the result out to every
+# subscriber whose own rules fired. Each user gets one digest per cycle.
+
+SUBSCRIPTIONS_PATH = os.getenv('SUBSCRIPTIONS_PATH', 'subscriptions.csv')
+
+# Recipient for plain watchlist runs, which have no subscriptions of their own
+DEFAULT_RECIPIENT = os.getenv('ALERT_PHONE', 'YOUR_REAL_NUMBER')
+
+# Twilio rejects bodies longer than this
+DIGEST_MAX_CHARS = 1600
+
+
+class SubscriptionRegistry:
+    def __init__(self, default_rules=None):
+        if default_rules is None:
+            default_rules = parse_rules(f"change:1:{DEFAULT_CHANGE_PCT}")
+        check_lookback(default_rules)
+        self.default_rules = list(default_rules)
+        self.companies = {}
+        # (phone, symbol) -> rule spec as given, '' for the default rules
+        self.specs = {}
+        # symbol -> {phone: frozenset of rule names}
+        self.by_symbol = {}
+        self.known_rules = {rule.name: rule for rule in self.default_rules}
+
+    def __len__(self):
+        return len(self.specs)
+
+    def _rule_names(self, spec):
+        rules = parse_rules(spec) if spec else self.default_rules
+        # Caught here rather than by AlertIndex.evaluate, where one user's rule
+        # would fail the cycle for everybody
+        check_lookback(rules)
+        for rule in rules:
+            self.known_rules.setdefault(rule.name, rule)
+        return frozenset(rule.name for rule in rules)
+
+    def subscribe(self, phone, symbol, company=None, rules=""):
+        # Subscribing again replaces the rules for that symbol; a bad spec raises and changes nothing
+        symbol = symbol.upper()
+        names = self._rule_names(rules)
+        self.specs[(phone, symbol)] = rules
+        self.by_symbol.setdefault(symbol, {})[phone] = names
+        if company or symbol not in self.companies:
+            self.companies[symbol] = company or symbol
+
+    def unsubscribe(self, phone, symbol=None):
+        # One symbol, or everything the phone is subscribed to; returns the number removed
+        symbols = [symbol.upper()] if symbol else [s for p, s in self.specs if p == phone]
+        removed = 0
+        for symbol in symbols:
+            if self.specs.pop((phone, symbol), None) is None:
+                continue
+            removed += 1
+            subscribers = self.by_symbol[symbol]
+            del subscribers[phone]
+            if not subscribers:
+                del self.by_symbol[symbol]
+                del self.companies[symbol]
+        return removed
+
+    def add_watchlist(self, watchlist, phone=DEFAULT_RECIPIENT):
+        # watchlist: symbol -> company name, all on the default rules
+        for symbol, company in watchlist.items():
+            self.subscribe(phone, symbol, company)
+
+    def copy(self):
+        registry = SubscriptionRegistry(self.default_rules)
+        registry.companies = dict(self.companies)
+        registry.specs = dict(self.specs)
+        registry.by_symbol = {symbol: dict(subscribers) for symbol, subscribers in self.by_symbol.items()}
+        registry.known_rules = dict(self.known_rules)
+        return registry
+
+    def watchlist(self):
+        # Every symbol somebody watches, once
+        return {symbol: self.companies[symbol] for symbol in sorted(self.by_symbol)}
+
+    def subscribers(self, symbol):
+        return dict(self.by_symbol.get(symbol.upper(), {}))
+
+    def users(self):
+        return sorted({phone for phone, _ in self.specs})
+
+    def rules(self, symbols=None):
+        # The distinct rules any subscriber of `symbols` (default: all) uses, each evaluated once per cycle
+        symbols = self.by_symbol if symbols is None else symbols
+        names = set()
+        for symbol in symbols:
+            for rule_names in self.by_symbol.get(symbol, {}).values():
+                names |= rule_names
+        return [self.known_rules[name] for name in sorted(names)]
+
+    def matches(self, moves):
+        # moves: symbol -> [(rule, value)] fired this cycle. Yields (phone, symbol, fired)
+        # for every subscriber with at least one of their own rules among them.
+        for symbol, fired in sorted(moves.items()):
+            for phone, names in sorted(self.by_symbol.get(symbol, {}).items()):
+                mine = [(rule, value) for rule, value in fired if rule.name in names]
+                if mine:
+                    yield phone, symbol, mine
+
+    @classmethod
+    def load(cls, filename=SUBSCRIPTIONS_PATH, default_rules=None):
+        # CSV with "Phone", "Symbol", "Company Name" and "Rules" columns
+        registry = cls(default_rules)
+        with open(filename, mode='r', newline='') as file:
+            for row in csv.DictReader(file):
+                phone, symbol = row['Phone'].strip(), row['Symbol'].strip()
+                if phone and symbol:
+                    registry.subscribe(phone, symbol, (row.get('Company Name') or '').strip(),
+                                       (row.get('Rules') or '').strip())
+        return registry
+
+    def save(self, filename=SUBSCRIPTIONS_PATH):
+        with open(filename + '.tmp', mode='w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['Phone', 'Symbol', 'Company Name', 'Rules'])
+            for (phone, symbol), spec in sorted(self.specs.items()):
+                writer.writerow([phone, symbol, self.companies[symbol], spec])
+        os.replace(filename + '.tmp', filename)
+
+
+def alert_section(header, articles, direction=""):
+    # One symbol's part of a digest: what moved, its fresh headlines, the model's view
+    lines = [header]
+    for article in articles:
+        lines.append(f"Headline: {article['title']}.")
+        lines.append(f"Brief: {article['description']}")
+    return "\n".join(lines) + direction
+
+
+def digest_messages(sections, limit=DIGEST_MAX_CHARS):
+    # Sections joined into as few bodies as fit Twilio's limit; an oversized section is cut short
+    messages, current = [], ""
+    for section in sections:
+        if len(section) > limit:
+            section = section[:limit - 1] + "…"
+        if current and len(current) + 2 + len(section) > limit:
+            messages.append(current)
+            current = section
+        else:
+            current = f"{current}\n\n{section}" if current else section
+    if current:
+        messages.append(current)
+    return messages
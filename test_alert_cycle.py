@@ -0,0 +1,102 @@
+from concurrent.futures import Future
+
+import pytest
+
+import main
+from alert_rules import parse_rules
+from news import NewsStage, SeenArticles
+from subscriptions import SubscriptionRegistry
+
+
+class Outbox:
+    def __init__(self):
+        self.queued = []
+
+    def enqueue(self, sender, phone, body):
+        self.queued.append((phone, body))
+
+
+class Dispatcher:
+    def __init__(self):
+        self.outbox = Outbox()
+
+    def flush(self):
+        return {'sent': len(self.outbox.queued)}
+
+
+class Stage(NewsStage):
+    # Canned headlines per company instead of NewsAPI
+    def __init__(self, headlines, seen):
+        super().__init__(None, seen)
+        self.headlines = headlines
+        self.looked_up = []
+
+    def fetch(self, companies):
+        companies = list(companies)
+        self.looked_up.extend(companies)
+        return {company: list(self.headlines.get(company, [])) for company in companies}, set()
+
+    def prefetch(self, companies):
+        future = Future()
+        future.set_result(self.fetch(companies))
+        return future
+
+
+@pytest.fixture
+def cycle(tmp_path, monkeypatch):
+    seen = SeenArticles(str(tmp_path / 'seen.sqlite3'))
+    headlines = {
+        'Apple': [{'title': 'Apple jumps', 'description': 'Up.', 'url': 'https://news.test/apple'}],
+        'Tesla': [{'title': 'Tesla slides', 'description': 'Down.', 'url': 'https://news.test/tesla'}],
+    }
+    stage = Stage(headlines, seen)
+    monkeypatch.setattr(main, '_news_stage', stage)
+    monkeypatch.setattr(main, 'direction_suffix', lambda symbol: "")
+    small, big = parse_rules("change:1:1,change:1:5")
+    # Only the 1% rule fired for both symbols; TSLA's subscriber only wants 5% moves
+    monkeypatch.setattr(main, 'scan_moves', lambda *args: {'AAPL': [(small, 2.0)], 'TSLA': [(small, -2.0)]})
+    registry = SubscriptionRegistry([small])
+    registry.subscribe('+1555', 'AAPL', 'Apple')
+    registry.subscribe('+1666', 'TSLA', 'Tesla', 'change:1:5')
+    return registry, stage, seen
+
+
+def test_news_only_for_matched_symbols(cycle):
+    registry, stage, seen = cycle
+    dispatcher = Dispatcher()
+    main.alert_cycle(registry.watchlist(), [], dispatcher=dispatcher, registry=registry)
+    assert [phone for phone, _ in dispatcher.outbox.queued] == ['+1555']
+    assert 'Apple jumps' in dispatcher.outbox.queued[0][1]
+    # Tesla's headline went to nobody, so it is still fresh for a later alert
+    assert seen.fresh(stage.headlines['Tesla'], 3) == stage.headlines['Tesla']
+    assert seen.fresh(stage.headlines['Apple'], 3) == []
+
+
+def test_headlines_not_marked_before_enqueue(cycle, monkeypatch):
+    registry, stage, seen = cycle
+    dispatcher = Dispatcher()
+
+    def broken(*args):
+        raise RuntimeError("outbox unavailable")
+    monkeypatch.setattr(dispatcher.outbox, 'enqueue', broken)
+    with pytest.raises(RuntimeError):
+        main.alert_cycle(registry.watchlist(), [], dispatcher=dispatcher, registry=registry)
+    assert seen.fresh(stage.headlines['Apple'], 3) == stage.headlines['Apple']
+
+
+def test_take_fresh_marks_and_dedupes(tmp_path):
+    seen = SeenArticles(str(tmp_path / 'seen.sqlite3'))
+    story = {'title': 'Apple jumps', 'url': 'https://news.test/apple'}
+    syndicated = {'title': 'Apple Jumps!', 'url': 'https://other.test/apple'}
+    assert seen.take_fresh([story, syndicated], 3) == [story]
+    assert seen.take_fresh([syndicated], 3) == []
+
+
+def test_no_news_or_notifier_without_a_match(cycle, monkeypatch):
+    registry, stage, seen = cycle
+    small = registry.known_rules['change:1:1']
+    monkeypatch.setattr(main, 'scan_moves', lambda *args: {'TSLA': [(small, -2.0)]})
+    monkeypatch.setattr(main, '_news_stage', None)
+    monkeypatch.setattr(main, 'new_dispatcher', lambda: pytest.fail("notifier loaded"))
+    assert main.alert_cycle(registry.watchlist(), [], registry=registry) == {}
+    assert main._news_stage is None
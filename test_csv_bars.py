@@ -0,0 +1,106 @@
+import csv
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from csv_bars import CSV_COLUMNS, load_bars, load_csv, load_frame
+
+HEADER = 'Date,Open,High,Low,Close,Volume'
+
+
+def rows(count, seed=9):
+    rng = np.random.default_rng(seed)
+    dates = np.datetime64('2015-01-02') + np.arange(count)
+    closes = np.round(100 * np.exp(np.cumsum(rng.normal(0, 0.01, count))), 4)
+    volumes = rng.integers(10 ** 5, 10 ** 7, count)
+    return [f"{date},{close - 0.5},{close + 1},{close - 1},{close},{volume}"
+            for date, close, volume in zip(dates, closes, volumes)]
+
+
+def write(tmp_path, lines, header=HEADER, newline='\n', name='bars.csv'):
+    path = tmp_path / name
+    path.write_bytes((newline.join([header] + lines) + newline).encode())
+    return str(path)
+
+
+def dict_reader(filename):
+    # The per-row parsing main.py and the GUI used before the bulk loader
+    columns = {column: [] for column in CSV_COLUMNS}
+    with open(filename, mode='r') as file:
+        for row in csv.DictReader(file):
+            columns['Date'].append(datetime.strptime(row['Date'], '%Y-%m-%d'))
+            for column in CSV_COLUMNS[1:-1]:
+                columns[column].append(float(row[column]))
+            columns['Volume'].append(int(float(row['Volume'])))
+    return columns
+
+
+@pytest.mark.parametrize('chunk_bytes', [64, 1000, 1 << 24])
+def test_load_csv_matches_pandas_and_dict_reader(tmp_path, chunk_bytes):
+    filename = write(tmp_path, rows(500))
+    loaded = load_csv(filename, chunk_bytes=chunk_bytes)
+    expected = pd.read_csv(filename, parse_dates=['Date'])
+    reference = dict_reader(filename)
+    np.testing.assert_array_equal(loaded['Date'], expected['Date'].to_numpy().astype('datetime64[D]'))
+    np.testing.assert_array_equal(loaded['Date'], np.array(reference['Date'], dtype='datetime64[D]'))
+    for column in CSV_COLUMNS[1:]:
+        np.testing.assert_array_equal(loaded[column], expected[column].to_numpy())
+        np.testing.assert_array_equal(loaded[column], reference[column])
+    assert loaded['Volume'].dtype == np.int64
+
+
+def test_load_frame_matches_read_csv(tmp_path):
+    filename = write(tmp_path, rows(300))
+    expected = pd.read_csv(filename, parse_dates=['Date']).set_index('Date')
+    pd.testing.assert_frame_equal(load_frame(filename), expected, check_index_type=False)
+    pd.testing.assert_frame_equal(load_frame(filename, ['Close']), expected[['Close']], check_index_type=False)
+
+
+def test_layout_variations(tmp_path):
+    # CRLF endings, blank lines, extra and reordered columns, float volumes, no final newline
+    lines = rows(50)
+    expected = load_csv(write(tmp_path, lines))
+    crlf = write(tmp_path, lines[:20] + [''] + lines[20:], newline='\r\n', name='crlf.csv')
+    reordered = write(tmp_path, [f"{line.split(',', 1)[1]},x,{line.split(',', 1)[0]}" for line in lines],
+                      header='Open,High,Low,Close,Volume,Note,Date', name='reordered.csv')
+    floats = write(tmp_path, [line + '.0' for line in lines], name='floats.csv')
+    unterminated = tmp_path / 'unterminated.csv'
+    unterminated.write_text('\n'.join([HEADER] + lines))
+    for filename in (crlf, reordered, floats, str(unterminated)):
+        loaded = load_csv(filename, chunk_bytes=128)
+        for column in CSV_COLUMNS:
+            np.testing.assert_array_equal(loaded[column], expected[column])
+
+
+def test_load_bars_sorts_by_date(tmp_path):
+    lines = rows(100)
+    bars = load_bars(write(tmp_path, lines[::-1]))
+    expected = load_csv(write(tmp_path, lines, name='sorted.csv'))
+    np.testing.assert_array_equal(bars.dates.astype('datetime64[D]'), expected['Date'])
+    np.testing.assert_array_equal(bars.close, expected['Close'])
+
+
+def test_empty_and_missing_columns(tmp_path):
+    empty = load_csv(write(tmp_path, []))
+    assert all(len(values) == 0 for values in empty.values())
+    with pytest.raises(ValueError, match='Volume'):
+        load_csv(write(tmp_path, ['2024-01-02,1,2,0,1'], header='Date,Open,High,Low,Close'))
+
+
+@pytest.mark.parametrize('bad', [
+    '2024-03-04,1,2,0.5',             # missing fields
+    '2024-03-04,1,2,0.5,abc,100',     # not a number
+    '2024-03-04,1,2,0.5,,100',        # empty field
+    '2024-13-04,1,2,0.5,1.5,100',     # no such month
+    '03/04/2024,1,2,0.5,1.5,100',     # not an ISO date
+])
+def test_malformed_rows_raise(tmp_path, bad):
+    # The DictReader/strptime path refused these too; pandas would load them as nan or text
+    lines = rows(40)
+    filename = write(tmp_path, lines[:30] + [bad] + lines[30:])
+    with pytest.raises((TypeError, ValueError)):
+        dict_reader(filename)
+    with pytest.raises(ValueError, match='bars.csv'):
+        load_csv(filename, chunk_bytes=256)
@@ -0,0 +1,75 @@
+import json
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+import fetch_cache
+from fetch_cache import DAILY_OPEN_TTL, MARKET_TZ, FetchCache, cached_get_json, daily_ttl, last_session
+
+
+def payload(*dates):
+    return {'Time Series (Daily)': {date: {'4. close': '1'} for date in dates}}
+
+
+@pytest.mark.parametrize('now, session', [
+    (datetime(2024, 3, 5, 17, 0), '2024-03-05'),   # Tuesday after the close
+    (datetime(2024, 3, 5, 8, 0), '2024-03-04'),    # Tuesday before the open
+    (datetime(2024, 3, 4, 8, 0), '2024-03-01'),    # Monday before the open
+    (datetime(2024, 3, 9, 12, 0), '2024-03-08'),   # Saturday
+])
+def test_last_session(now, session):
+    assert last_session(now.replace(tzinfo=MARKET_TZ)).isoformat() == session
+
+
+def test_daily_ttl_waits_for_the_closing_bar():
+    after_close = datetime(2024, 3, 5, 16, 5, tzinfo=MARKET_TZ)
+    # Until the provider has the day's bar, keep refreshing
+    assert daily_ttl(payload('2024-03-01', '2024-03-04'), after_close) == DAILY_OPEN_TTL
+    # With it, prices are final until Wednesday's open
+    ttl = daily_ttl(payload('2024-03-04', '2024-03-05'), after_close)
+    assert ttl == (datetime(2024, 3, 6, 9, 30, tzinfo=MARKET_TZ) - after_close).total_seconds()
+    during = datetime(2024, 3, 5, 11, 0, tzinfo=MARKET_TZ)
+    assert daily_ttl(payload('2024-03-05'), during) == DAILY_OPEN_TTL
+    assert daily_ttl({'Note': 'slow down'}, after_close) == DAILY_OPEN_TTL
+
+
+def test_expiry_lives_in_the_mtime(tmp_path):
+    cache = FetchCache(str(tmp_path))
+    cache.set('fresh', {'a': 1}, 60)
+    cache.set('stale', {'b': 2}, 60)
+    os.utime(cache._path('stale'), (time.time() - 1, time.time() - 1))
+    assert os.path.getmtime(cache._path('fresh')) > time.time() + 50
+    reopened = FetchCache(str(tmp_path))
+    assert reopened.get('fresh') == {'a': 1}
+    assert not os.path.exists(cache._path('stale'))
+
+
+def test_purge_does_not_read_payloads(tmp_path, monkeypatch):
+    cache = FetchCache(str(tmp_path))
+    for i in range(5):
+        cache.set(f'key{i}', {'i': i}, 60)
+    monkeypatch.setattr(json, 'load', lambda *args: pytest.fail("payload parsed"))
+    FetchCache(str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 5
+
+
+def test_old_format_files_are_dropped(tmp_path):
+    # Written before expiries went into the mtime: the mtime is in the past
+    path = tmp_path / 'legacy.json'
+    path.write_text(json.dumps({'expires': time.time() + 600, 'value': 1}))
+    FetchCache(str(tmp_path))
+    assert not path.exists()
+
+
+def test_callable_ttl_sees_the_payload(tmp_path, monkeypatch):
+    class Client:
+        def get_json(self, endpoint, params, limiter, deadline):
+            return {'x': 1}
+    monkeypatch.setattr(fetch_cache.http_client, 'client', lambda endpoint: Client())
+    seen = []
+    cache = FetchCache(str(tmp_path))
+    assert cached_get_json('http://example.test/q', {}, lambda data: seen.append(data) or 60, cache) == {'x': 1}
+    assert seen == [{'x': 1}]
+    assert cache.get(fetch_cache.cache_key('http://example.test/q', {})) == {'x': 1}
@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+from gui_worker import Cancelled, RequestWorker
+
+
+class Root:
+    # Stands in for Tk: after() callbacks are run by hand with poll()
+    def __init__(self):
+        self.pending = []
+
+    def after(self, ms, callback):
+        self.pending.append(callback)
+
+    def poll(self):
+        callbacks, self.pending = self.pending, []
+        for callback in callbacks:
+            callback()
+
+
+def run(job, cancel_at=None):
+    root = Root()
+    worker = RequestWorker(root, max_workers=1)
+    results = []
+    started, release = threading.Event(), threading.Event()
+
+    def wrapped(task):
+        started.set()
+        release.wait(5)
+        return job(task)
+    worker.submit('ABC', wrapped, on_done=lambda key, result: results.append(('done', result)),
+                  on_error=lambda key, e: results.append(('error', e)))
+    started.wait(5)
+    if cancel_at == 'before':
+        worker.cancel('ABC')
+    release.set()
+    worker.pool.shutdown(wait=True)
+    if cancel_at == 'after':
+        # The job has already returned; its result must still be reported
+        worker.cancel('ABC')
+    root.poll()
+    return results
+
+
+def test_cancel_after_last_report_keeps_result():
+    # Cancel arrives while the messages are going out; they were sent all the same
+    assert run(lambda task: ("sent", {'sent': 1}), cancel_at='before') == [('done', ("sent", {'sent': 1}))]
+    assert run(lambda task: ("sent", {'sent': 1}), cancel_at='after') == [('done', ("sent", {'sent': 1}))]
+
+
+def test_cancel_stops_job_at_next_report():
+    def job(task):
+        task.report(1, 2, "Sending")
+        pytest.fail("job continued after cancel")
+    [(kind, error)] = run(job, cancel_at='before')
+    assert kind == 'error' and isinstance(error, Cancelled)
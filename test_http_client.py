@@ -0,0 +1,105 @@
+import pytest
+import requests
+
+import http_client
+from http_client import CircuitBreaker, CircuitOpenError, DeadlineExceeded, HttpClient
+
+
+class Response:
+    def __init__(self, status_code=200, data=None, body=None):
+        self.status_code = status_code
+        self.data = data
+        self.body = body
+
+    def json(self):
+        if self.body is not None:
+            raise requests.JSONDecodeError("Expecting value", self.body, 0)
+        return self.data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {self.status_code}", response=self)
+
+
+class Limiter:
+    def acquire(self, timeout=None):
+        return False
+
+
+def make_client(responses, max_attempts=1):
+    breaker = CircuitBreaker(failures=1, reset_after=0)
+    client = HttpClient('example.test', max_attempts=max_attempts, breaker=breaker)
+    client._send = lambda url, params, remaining: responses.pop(0)
+    return client
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(http_client.time, 'sleep', lambda seconds: None)
+
+
+def open_breaker(client):
+    client.breaker.failure()
+    assert client.breaker.state == 'half-open'
+
+
+def test_bad_json_is_retried():
+    client = make_client([Response(body='<html>'), Response(data={'ok': 1})], max_attempts=2)
+    assert client.get_json('http://example.test/') == {'ok': 1}
+    assert client.breaker.state == 'closed'
+
+
+def test_bad_json_trial_reopens_circuit():
+    client = make_client([Response(body='<html>'), Response(data={'ok': 1})])
+    open_breaker(client)
+    with pytest.raises(ValueError):
+        client.get_json('http://example.test/')
+    assert not client.breaker.trial
+    # The next call gets a fresh trial instead of being rejected forever
+    assert client.get_json('http://example.test/') == {'ok': 1}
+    assert client.breaker.state == 'closed'
+
+
+def test_unexpected_error_in_trial_counts_as_failure():
+    client = make_client([])
+    open_breaker(client)
+
+    def broken(url, params, remaining):
+        raise RuntimeError("boom")
+    client._send = broken
+    with pytest.raises(RuntimeError):
+        client.get_json('http://example.test/')
+    assert not client.breaker.trial
+
+
+def test_limiter_timeout_takes_no_trial():
+    client = make_client([Response(data={'ok': 1})])
+    open_breaker(client)
+    with pytest.raises(DeadlineExceeded):
+        client.get_json('http://example.test/', limiter=Limiter())
+    assert not client.breaker.trial
+    assert client.get_json('http://example.test/') == {'ok': 1}
+
+
+def test_expired_deadline_takes_no_trial():
+    client = make_client([Response(data={'ok': 1})])
+    open_breaker(client)
+    with pytest.raises(DeadlineExceeded):
+        client.get_json('http://example.test/', deadline=0)
+    assert not client.breaker.trial
+
+
+def test_client_error_closes_circuit():
+    client = make_client([Response(status_code=404)])
+    open_breaker(client)
+    with pytest.raises(requests.HTTPError):
+        client.get_json('http://example.test/')
+    assert client.breaker.state == 'closed'
+
+
+def test_open_circuit_rejects():
+    breaker = CircuitBreaker(failures=1, reset_after=60)
+    client = HttpClient('example.test', breaker=breaker)
+    breaker.failure()
+    with pytest.raises(CircuitOpenError):
+        client.get_json('http://example.test/')
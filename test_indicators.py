@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import FEATURE_LOOKBACK, INDICATOR_COLUMNS, IndicatorEngine, compute_feature, compute_indicators
+
+# Checked against the pandas block prediction_model.py used before the indicator
+# engine replaced it, and pandas' ewm for the Wilder variant of RSI
+
+
+def reference(closes, volumes, rsi_smoothing='sma'):
+    df = pd.DataFrame({'Close': closes, 'Volume': volumes})
+    df['Prev Close'] = df['Close'].shift(1)
+    df['50 Day MA'] = df['Close'].rolling(window=50).mean()
+    df['200 Day MA'] = df['Close'].rolling(window=200).mean()
+    window_length = 14
+    delta = df['Close'].diff(1)
+    gain = (delta.where(delta > 0, 0)).rolling(window=window_length).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=window_length).mean()
+    if rsi_smoothing == 'wilder':
+        # The first full-window average seeds Wilder's smoothing (ewm with alpha = 1/14)
+        raw_gain, raw_loss = delta.where(delta > 0, 0), -delta.where(delta < 0, 0)
+        seed = window_length - 1
+        raw_gain[:seed + 1], raw_loss[:seed + 1] = np.nan, np.nan
+        raw_gain[seed], raw_loss[seed] = gain[seed], loss[seed]
+        gain = raw_gain.ewm(alpha=1 / window_length, adjust=False).mean()
+        loss = raw_loss.ewm(alpha=1 / window_length, adjust=False).mean()
+    rs = gain / loss
+    df['RSI'] = 100 - (100 / (1 + rs))
+    df['20 Day MA'] = df['Close'].rolling(window=20).mean()
+    df['20 Day StdDev'] = df['Close'].rolling(window=20).std()
+    df['Upper Band'] = df['20 Day MA'] + (df['20 Day StdDev'] * 2)
+    df['Lower Band'] = df['20 Day MA'] - (df['20 Day StdDev'] * 2)
+    df['Volume Change'] = df['Volume'].pct_change()
+    return df
+
+
+def history(days, seed=5):
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, days)))
+    # A few unchanged closes, so some windows see zero gains or losses
+    flat = days // 10
+    closes[flat:flat + 5] = closes[flat]
+    volumes = rng.integers(10 ** 5, 10 ** 6, days).astype(float)
+    return closes, volumes
+
+
+def assert_matches(actual, expected):
+    np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize('rsi_smoothing', ['sma', 'wilder'])
+def test_batch_matches_pandas(rsi_smoothing):
+    closes, volumes = history(400)
+    expected = reference(closes, volumes, rsi_smoothing)
+    result = compute_indicators(closes, volumes, rsi_smoothing)
+    for column in INDICATOR_COLUMNS:
+        assert_matches(result[column][0], expected[column].to_numpy())
+
+
+@pytest.mark.parametrize('rsi_smoothing', ['sma', 'wilder'])
+def test_streaming_matches_pandas(rsi_smoothing):
+    closes, volumes = history(400)
+    expected = reference(closes, volumes, rsi_smoothing)
+    engine = IndicatorEngine(rsi_smoothing)
+    rows = [engine.update('ABC', close, volume) for close, volume in zip(closes, volumes)]
+    for column in INDICATOR_COLUMNS:
+        assert_matches([row[column] for row in rows], expected[column].to_numpy())
+
+
+def test_padded_batch_matches_each_symbol():
+    # Shorter histories are left-padded with nan and must not pick up values from the padding
+    lengths = [400, 260, 120, 10]
+    closes = np.full((len(lengths), max(lengths)), np.nan)
+    volumes = np.full(closes.shape, np.nan)
+    for i, length in enumerate(lengths):
+        closes[i, -length:], volumes[i, -length:] = history(length, seed=i)
+    result = compute_indicators(closes, volumes)
+    for i, length in enumerate(lengths):
+        expected = reference(closes[i, -length:], volumes[i, -length:])
+        for column in INDICATOR_COLUMNS:
+            assert_matches(result[column][i, -length:], expected[column].to_numpy())
+            assert np.isnan(result[column][i, :-length]).all()
+
+
+def test_features_from_a_window_match_the_full_history():
+    # The feature store recomputes only the tail of a column from FEATURE_LOOKBACK earlier bars
+    closes, volumes = history(400)
+    full = compute_indicators(closes, volumes)
+    for name in INDICATOR_COLUMNS:
+        start = 300 - FEATURE_LOOKBACK[name]
+        tail = compute_feature(name, closes[start:], volumes[start:])[0][300 - start:]
+        assert_matches(tail, full[name][0][300:])
+
+
+def test_warm_up_continues_like_a_replay():
+    closes, volumes = history(300)
+    engine = IndicatorEngine()
+    engine.warm_up('ABC', closes[:250], volumes[:250])
+    rows = [engine.update('ABC', close, volume) for close, volume in zip(closes[250:], volumes[250:])]
+    expected = reference(closes, volumes)
+    for column in INDICATOR_COLUMNS:
+        assert_matches([row[column] for row in rows], expected[column].to_numpy()[250:])
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import model_training
+from indicators import FEATURES
+from model_training import ModelStore, get_model, prepare_frame
+
+
+def history(days):
+    rng = np.random.default_rng(11)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, days)))
+    dates = pd.bdate_range('2022-01-03', periods=days, name='Date')
+    return pd.DataFrame({'Close': closes, 'Volume': rng.integers(10 ** 5, 10 ** 6, days)}, index=dates)
+
+
+def training_set(bars):
+    frame = prepare_frame(bars)
+    return frame[FEATURES].to_numpy(), frame['Price Change'].to_numpy()
+
+
+class Evaluations:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return [(0.5 + self.calls / 100, 0.5)]
+
+
+@pytest.fixture
+def models(tmp_path):
+    return ModelStore(str(tmp_path))
+
+
+def fit(bars, models, evaluate, **options):
+    X, y = training_set(bars)
+    return get_model('ABC', bars, X, y, models, evaluate=evaluate, **options)
+
+
+def test_warm_start_keeps_scores(models):
+    full, evaluate = history(260), Evaluations()
+    artifact, status = fit(full[:250], models, evaluate)
+    assert status == "trained" and evaluate.calls == 1
+    assert fit(full[:250], models, evaluate)[1] == "cached"
+    artifact, status = fit(full, models, evaluate)
+    assert status == "warm-start" and evaluate.calls == 1
+    assert artifact['scores'] == [(0.51, 0.5)]
+    assert artifact['scored_end'] == str(full.index[249].date())
+    assert artifact['end'] == str(full.index[-1].date())
+
+
+def test_warm_starts_are_capped(models, monkeypatch):
+    monkeypatch.setattr(model_training, 'MAX_WARM_STARTS', 2)
+    full, evaluate = history(260)[:254], Evaluations()
+    statuses = [fit(full[:rows], models, evaluate)[1] for rows in range(250, 255)]
+    assert statuses == ["trained", "warm-start", "warm-start", "trained", "warm-start"]
+    assert evaluate.calls == 2
+    artifact = models.load('ABC', model_training.feature_hash(FEATURES))
+    assert artifact['model'].n_estimators == 100 + model_training.WARM_START_TREES
+
+
+def test_ranges_have_their_own_artifacts(models):
+    full, evaluate = history(300), Evaluations()
+    fit(full[:250], models, evaluate)
+    fit(full[50:], models, evaluate, start=str(full.index[50].date()))
+    assert fit(full[:250], models, evaluate)[1] == "cached"
+    assert fit(full[50:], models, evaluate, start=str(full.index[50].date()))[1] == "cached"
+    assert evaluate.calls == 2
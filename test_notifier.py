@@ -0,0 +1,72 @@
+import pytest
+
+from notifier import Outbox, TwilioDispatcher, delivery_summary
+
+
+class Dispatcher(TwilioDispatcher):
+    # Delivery outcome per message body instead of the Twilio API
+    def __init__(self, outbox, outcomes):
+        self.outbox = outbox
+        self.outcomes = outcomes
+
+    def flush(self):
+        for id, sender, recipient, body, attempts, created in self.outbox.claim(100):
+            if self.outcomes.get(body, 'sent') == 'sent':
+                self.outbox.mark_sent(id, f"SM{id}")
+            else:
+                self.outbox.mark_failed(id, "rejected")
+        return self.outbox.counts()
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return Outbox(str(tmp_path / 'outbox.sqlite3'))
+
+
+def test_send_counts_only_this_batch(outbox):
+    dispatcher = Dispatcher(outbox, {'bad': 'failed'})
+    assert dispatcher.send(['one', 'two'], '+1555') == {'sent': 2}
+    assert dispatcher.send(['three', 'bad'], '+1555') == {'sent': 1, 'failed': 1}
+    assert outbox.counts() == {'sent': 3, 'failed': 1}
+
+
+def test_send_reports_duplicates_and_nothing_to_send(outbox):
+    dispatcher = Dispatcher(outbox, {})
+    dispatcher.send(['one'], '+1555')
+    assert dispatcher.send(['one'], '+1555') == {'duplicate': 1}
+    assert dispatcher.send([], '+1555') == {}
+
+
+@pytest.mark.parametrize('counts, text', [
+    ({}, "No new headlines, nothing was sent."),
+    ({'sent': 2}, "Messages: 2 sent."),
+    ({'sent': 1, 'failed': 1}, "Messages: 1 sent, 1 failed."),
+    ({'pending': 1, 'duplicate': 2}, "Messages: 1 waiting to retry, 2 already sent today."),
+])
+def test_delivery_summary(counts, text):
+    assert delivery_summary(counts) == text
+
+
+class Response:
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        import json
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.mark.parametrize('text, sid', [('{"sid": "SM1"}', "SM1"), ('<html>ok</html>', None), ('[]', None)])
+def test_accepted_message_is_sent_whatever_the_body(outbox, text, sid):
+    class Session:
+        def post(self, url, data, timeout):
+            return Response(201, text)
+    dispatcher = TwilioDispatcher('AC1', 'token', outbox, rate=1e9)
+    dispatcher.session = Session()
+    assert dispatcher.send(['hello'], '+1555') == {'sent': 1}
+    row = outbox.db.execute("SELECT sid FROM outbox").fetchone()
+    assert row == (sid,)
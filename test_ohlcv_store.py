@@ -0,0 +1,76 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from bars import Bars
+from fetch_cache import MARKET_TZ
+from feature_store import FeatureStore
+from ohlcv_store import OHLCVStore
+
+# A Tuesday, during and after the session
+OPEN = datetime(2024, 3, 5, 11, 0, tzinfo=MARKET_TZ)
+CLOSED = datetime(2024, 3, 5, 17, 0, tzinfo=MARKET_TZ)
+
+
+def make_bars(dates, closes):
+    days = np.array(dates, dtype='datetime64[D]').astype(np.int64)
+    closes = np.asarray(closes, dtype=float)
+    return Bars(days, closes, closes + 1, closes - 1, closes, np.full(len(days), 1000))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return OHLCVStore(str(tmp_path / 'bars'))
+
+
+def test_append_keeps_only_new_dates(store):
+    assert store.append('abc', make_bars(['2024-03-01', '2024-03-04'], [10, 11]), CLOSED) == 2
+    assert store.append('ABC', make_bars(['2024-03-01', '2024-03-04', '2024-03-05'], [10, 11, 12]), CLOSED) == 1
+    assert list(store.read('ABC').close) == [10, 11, 12]
+
+
+def test_same_date_replaces_last_bar(store):
+    store.append('ABC', make_bars(['2024-03-01', '2024-03-04'], [10, 11]), CLOSED)
+    assert store.append('ABC', make_bars(['2024-03-04', '2024-03-05'], [11.5, 12]), CLOSED) == 2
+    bars = store.read('ABC')
+    assert [str(date) for date in bars.dates.astype('datetime64[D]')] == ['2024-03-01', '2024-03-04', '2024-03-05']
+    assert list(bars.close) == [10, 11.5, 12]
+
+
+def test_unchanged_last_bar_is_not_rewritten(store):
+    store.append('ABC', make_bars(['2024-03-01', '2024-03-04'], [10, 11]), CLOSED)
+    assert store.append('ABC', make_bars(['2024-03-04'], [11]), CLOSED) == 0
+    assert len(store.read('ABC')) == 2
+
+
+def test_open_session_bar_is_not_stored(store):
+    history = make_bars(['2024-03-01', '2024-03-04', '2024-03-05'], [10, 11, 11.8])
+    assert store.append('ABC', history, OPEN) == 2
+    assert store.last_date('ABC') == np.datetime64('2024-03-04')
+    # After the close the final bar for the day goes in
+    assert store.append('ABC', make_bars(['2024-03-04', '2024-03-05'], [11, 12]), CLOSED) == 1
+    assert list(store.read('ABC').close) == [10, 11, 12]
+
+
+def test_append_series_replaces_last_bar(store):
+    def series(closes):
+        return {date: {'1. open': close, '2. high': close, '3. low': close, '4. close': close, '5. volume': 1}
+                for date, close in closes.items()}
+    store.append_series('ABC', series({'2024-03-01': 10, '2024-03-04': 11}))
+    store.append_series('ABC', series({'2024-03-01': 10, '2024-03-04': 11.5}))
+    assert list(store.read('ABC').close) == [10, 11.5]
+
+
+def test_features_follow_replaced_bar(tmp_path, store):
+    rng = np.random.default_rng(3)
+    dates = np.arange(np.datetime64('2023-01-02'), np.datetime64('2023-07-01'))
+    closes = 100 + np.cumsum(rng.normal(0, 1, len(dates)))
+    store.append('ABC', make_bars(dates, closes), CLOSED)
+    features = FeatureStore(str(tmp_path / 'features'), store)
+    features.read('ABC')
+    closes[-1] += 5
+    store.append('ABC', make_bars(dates[-1:], closes[-1:]), CLOSED)
+    _, values = features.read('ABC')
+    _, rebuilt = FeatureStore(str(tmp_path / 'rebuilt'), store).read('ABC')
+    assert np.allclose(values, rebuilt, equal_nan=True)
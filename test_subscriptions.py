@@ -0,0 +1,18 @@
+import pytest
+
+from alert_rules import AlertIndex, parse_rules
+from subscriptions import SubscriptionRegistry
+
+
+def test_rule_longer_than_the_index_is_rejected():
+    registry = SubscriptionRegistry()
+    with pytest.raises(ValueError, match='zscore:100:2'):
+        registry.subscribe('+1555', 'AAPL', 'Apple', 'zscore:100:2')
+    assert len(registry) == 0
+    registry.subscribe('+1555', 'AAPL', 'Apple', 'zscore:20:2')
+    AlertIndex().evaluate(registry.rules())
+
+
+def test_default_rules_are_checked():
+    with pytest.raises(ValueError):
+        SubscriptionRegistry(parse_rules('change:70:5'))
@@ -0,0 +1,75 @@
+import csv
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from bars import daily_bars
+from fetch_cache import cached_get_json, daily_outputsize, daily_ttl
+from rate_limit import RateLimiter
+
+STOCK_ENDPOINT = os.getenv('STOCK_ENDPOINT', "https://www.alphavantage.co/query")
+
+# Alpha Vantage calls per minute allowed by the plan behind STOCK_API_KEY
+STOCK_API_RATE = float(os.getenv('STOCK_API_RATE', '5'))
+
+# Seconds a whole watchlist scan may take; symbols not fetched by then are
+# reported as errors instead of holding up the cycle. 0 means no limit.
+CYCLE_DEADLINE = float(os.getenv('CYCLE_DEADLINE', '0'))
+
+
+def cycle_deadline(seconds=CYCLE_DEADLINE):
+    # A time.monotonic() value to pass as `deadline`, None without a limit
+    return time.monotonic() + seconds if seconds else None
+
+
+def load_watchlist(filename):
+    # CSV with "Symbol" and "Company Name" columns
+    watchlist = {}
+    with open(filename, mode='r', newline='') as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            symbol = row['Symbol'].strip().upper()
+            if symbol:
+                watchlist[symbol] = (row.get('Company Name') or symbol).strip()
+    return watchlist
+
+
+def save_watchlist(filename, watchlist):
+    with open(filename + '.tmp', mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Symbol', 'Company Name'])
+        for symbol, company in sorted(watchlist.items()):
+            writer.writerow([symbol, company])
+    os.replace(filename + '.tmp', filename)
+
+
+def fetch_daily(symbol, api_key, limiter=None, endpoint=STOCK_ENDPOINT, store=None, cache=None, deadline=None):
+    # Returns the history as Bars; a refused call raises ValueError, one still
+    # throttled after its retries http_client.ThrottledError
+    params = {
+        "function": "Time_Series_Daily",
+        "symbol": symbol,
+        "outputsize": daily_outputsize(symbol, store),
+        "apikey": api_key,
+    }
+    return cached_get_json(endpoint, params, daily_ttl, cache, limiter, daily_bars, deadline)
+
+
+def scan_watchlist(symbols, api_key, limiter=None, max_workers=8, endpoint=STOCK_ENDPOINT, store=None, cache=None,
+                   deadline=None):
+    # Fetch every symbol at once; the limiter, not the number of symbols, sets the pace
+    if limiter is None:
+        limiter = RateLimiter(STOCK_API_RATE)
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(fetch_daily, symbol, api_key, limiter, endpoint, store, cache, deadline): symbol
+                   for symbol in symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                results[symbol] = future.result()
+            except (requests.RequestException, ValueError) as e:
+                errors[symbol] = e
+    return results, errors